@@ -0,0 +1,63 @@
+"""Compares how long a program takes to start when run through Glorp and when built ahead of time.
+
+Generates a program of many small functions and times, as separate processes, `glorp run` without and
+with the transpile cache, the `glorp build` output (python build/main.pyc) and the `glorp to-py
+--package` output (python dist), which load precompiled bytecode without transpiling or exec'ing
+anything. Each is the best of several runs.
+
+Usage: python benchmarks/aot.py [functions] [runs]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GLORP = os.path.join(ROOT, 'src', 'glorp.py')
+
+FUNCTION = '''
+fn f{i}(x) {{
+    total = 0
+    for k from 1 to 10 {{
+        total = total + x * k + {i}
+    }}
+    => total
+}}
+'''
+
+
+def best_of(command, runs, cwd):
+    times = []
+    for _ in range(runs):
+        begin = time.perf_counter()
+        subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - begin)
+    return min(times)
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with tempfile.TemporaryDirectory() as directory:
+        entry = os.path.join(directory, 'main.glorp')
+        with open(entry, 'w', encoding='utf8') as f:
+            f.write(''.join(FUNCTION.format(i=i) for i in range(functions)))
+            f.write('\nfn Main() {\n    out(f0(1), "\\n")\n}\n')
+        subprocess.run([sys.executable, GLORP, 'build', entry], check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([sys.executable, GLORP, 'to-py', entry, '--package'], check=True, stdout=subprocess.DEVNULL)
+
+        print(f"{functions} functions, best of {runs} runs")
+        cases = (
+            ('glorp run --no-cache', [sys.executable, GLORP, 'run', entry, '--no-cache']),
+            ('glorp run (cached)', [sys.executable, GLORP, 'run', entry]),
+            ('python build/main.pyc', [sys.executable, os.path.join(directory, 'build', 'main.pyc')]),
+            ('python dist', [sys.executable, os.path.join(directory, 'dist')]),
+            ('python -c pass', [sys.executable, '-c', 'pass']),
+        )
+        for label, command in cases:
+            print(f"{label:<24} {best_of(command, runs, tempfile.gettempdir()) * 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Compares waiting on simulated I/O one request at a time with `await each` and `gather(..., limit: N)`.
+
+Each request is an `aio.sleep` of fixed latency, standing in for a network call made through an
+asyncio library. Awaiting them one by one costs requests * latency; awaiting the whole comprehension
+at once costs about one latency, or requests / limit latencies with a limit.
+
+Usage: python benchmarks/async_io.py [requests] [latency_ms]
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import glorp
+from glorp_runtime import run_main
+
+PROGRAM = '''
+use aio for py.asyncio
+
+async fn request(n, latency) {
+    await aio.sleep(latency)
+    => n * 2
+}
+
+async fn one_by_one(count, latency) => [each n in [1, ..., count] => await request(n, latency)]
+
+async fn all_at_once(count, latency) => await each n in [1, ..., count] => request(n, latency)
+
+async fn limited(count, latency, limit) => await gather([each n in [1, ..., count] => request(n, latency)], limit: limit)
+'''
+
+
+def load_program():
+    glorp.immutes.clear()
+    module = glorp.Glorp("Runtime").transform(glorp.parse(PROGRAM))
+    namespace = {}
+    exec(compile(glorp.finish_module(module), '<benchmark>', 'exec'), namespace)
+    return namespace
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    program = load_program()
+
+    cases = [('sequential awaits', program['one_by_one'], (count, latency))]
+    cases += [('await each', program['all_at_once'], (count, latency))]
+    cases += [(f'gather, limit {limit}', program['limited'], (count, latency, limit)) for limit in (10, 50)]
+
+    print(f"{count} requests of {latency * 1000:.0f} ms")
+    print(f"{'variant':<20} {'time':>10} {'requests/s':>12}")
+    expected = None
+    for name, function, args in cases:
+        begin = time.perf_counter()
+        result = run_main(function, *args)
+        elapsed = time.perf_counter() - begin
+        expected = expected or result
+        assert result == expected
+        print(f"{name:<20} {elapsed:>8.3f} s {count / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
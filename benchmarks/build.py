@@ -0,0 +1,74 @@
+"""Times `glorp build` on a generated project of many modules.
+
+Each module imports the two before it and defines a batch of small functions; the entry file imports
+them all. Reports a clean build on one worker process and on one per CPU, a rebuild with nothing
+changed and a rebuild after editing one module, then runs the built program with plain Python.
+
+Usage: python benchmarks/build.py [modules] [functions per module]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import glorp
+
+FUNCTION = '''
+fn f{i}(x) {{
+    total = 0
+    for k from 1 to 10 {{
+        total = total + x * k + {i}
+    }}
+    => [each v in [total, x] => v * 2]
+}}
+'''
+
+
+def write_project(directory, modules, functions):
+    for m in range(modules):
+        imports = ''.join(f'use m{d}\n' for d in (m - 1, m - 2) if d >= 0)
+        body = ''.join(FUNCTION.format(i=i) for i in range(functions))
+        with open(os.path.join(directory, f'm{m}.glorp'), 'w', encoding='utf8') as f:
+            f.write(imports + body)
+    with open(os.path.join(directory, 'main.glorp'), 'w', encoding='utf8') as f:
+        f.write(''.join(f'use m{m}\n' for m in range(modules)))
+        f.write(f'\nfn Main() {{\n    out(m{modules - 1}.f0(1), "\\n")\n}}\n')
+
+
+def timed_build(entry, out_dir, jobs):
+    begin = time.perf_counter()
+    transpiled, total = glorp.build(entry, out_dir, jobs)
+    return time.perf_counter() - begin, transpiled, total
+
+
+def main():
+    modules = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    functions = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    cpus = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as directory:
+        write_project(directory, modules, functions)
+        entry = os.path.join(directory, 'main.glorp')
+        print(f"{modules + 1} modules, {functions} functions each, {cpus} CPUs")
+
+        for label, jobs, out_dir in (('clean build, 1 process', 1, 'serial'), ('clean build, 1 process per CPU', cpus, 'build')):
+            elapsed, transpiled, total = timed_build(entry, os.path.join(directory, out_dir), jobs)
+            print(f"{label:<32} {elapsed:>8.2f} s   ({transpiled} of {total} modules transpiled)")
+
+        elapsed, transpiled, total = timed_build(entry, os.path.join(directory, 'build'), cpus)
+        print(f"{'nothing changed':<32} {elapsed:>8.2f} s   ({transpiled} of {total} modules transpiled)")
+
+        with open(os.path.join(directory, 'm0.glorp'), 'a', encoding='utf8') as f:
+            f.write('\nfn extra(x) => x\n')
+        elapsed, transpiled, total = timed_build(entry, os.path.join(directory, 'build'), cpus)
+        print(f"{'one module edited':<32} {elapsed:>8.2f} s   ({transpiled} of {total} modules transpiled)")
+
+        result = subprocess.run([sys.executable, os.path.join(directory, 'build', 'main.pyc')], capture_output=True, text=True, cwd=tempfile.gettempdir())
+        print(f"built program prints {result.stdout.strip()!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compares regular and `compact` Glorp classes on about a million small instances.
+
+Builds the instances with a Glorp comprehension and reports, for each kind of class, the
+construction time, the memory they take (measured with tracemalloc in a separate pass) and the cost
+of == (against an equal and a different instance), str() and, for compact classes, hashing.
+
+Usage: python benchmarks/classes.py [instances]
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import glorp
+
+PROGRAM = '''
+class Point(x, y, z) {
+}
+
+compact class CompactPoint(x, y, z) {
+}
+
+fn points(n) => [each i in [1, ..., n] => Point(i, i, i)]
+
+fn compact_points(n) => [each i in [1, ..., n] => CompactPoint(i, i, i)]
+'''
+
+
+def load_program():
+    glorp.immutes.clear()
+    module = glorp.Glorp("Runtime").transform(glorp.parse(PROGRAM))
+    namespace = {}
+    exec(compile(glorp.finish_module(module), '<benchmark>', 'exec'), namespace)
+    return namespace
+
+
+def build_time(build, count):
+    gc.collect()
+    begin = time.perf_counter()
+    instances = build(count)
+    elapsed = time.perf_counter() - begin
+    return elapsed, instances
+
+
+def memory(build, count):
+    gc.collect()
+    tracemalloc.start()
+    instances = build(count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The list holding them is the same for both kinds
+    return size - sys.getsizeof(instances), instances
+
+
+def per_op(operation, instances, repeat=200000):
+    sample = instances[:repeat]
+    begin = time.perf_counter()
+    for instance in sample:
+        operation(instance)
+    return (time.perf_counter() - begin) / len(sample)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    program = load_program()
+    print(f"{count:,} instances with three fields")
+    print(f"{'class':<16} {'build':>10} {'memory':>12} {'per object':>12} {'== same':>8} {'== diff':>8} {'str':>8} {'hash':>8}")
+    for name, build in (('class', program['points']), ('compact class', program['compact_points'])):
+        elapsed, instances = build_time(build, count)
+        first = instances[0]
+        same = per_op(lambda instance: instance == instance, instances)
+        different = per_op(lambda instance: instance == first, instances[1:])
+        to_str = per_op(str, instances)
+        hashing = f"{per_op(hash, instances) * 1e9:>5.0f} ns" if type(first).__hash__ is not None else f"{'-':>8}"
+        del instances
+        size, instances = memory(build, count)
+        del instances
+        print(f"{name:<16} {elapsed:>8.3f} s {size / 2**20:>9.1f} MB {size / count:>10.0f} B "
+              f"{same * 1e9:>5.0f} ns {different * 1e9:>5.0f} ns {to_str * 1e9:>5.0f} ns {hashing}")
+
+
+if __name__ == "__main__":
+    main()
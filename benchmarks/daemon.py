@@ -0,0 +1,66 @@
+"""Compares the latency of a cold `glorp run` with a run through a warm `glorp serve` daemon.
+
+Starts a server on a temporary socket, then times complete client invocations (process start to
+exit) of a hello-world program. `python -c pass` is the floor: the interpreter start-up every
+invocation pays either way.
+
+Usage: python benchmarks/daemon.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+
+PROGRAM = '''fn Main() {
+    out("Hello, World!\\n")
+}
+'''
+
+
+def timings(command, runs, env):
+    samples = []
+    for _ in range(runs):
+        begin = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - begin)
+    return samples
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as directory:
+        program = os.path.join(directory, 'hello.glorp')
+        with open(program, 'w') as f:
+            f.write(PROGRAM)
+        env = dict(os.environ, GLORP_SOCKET=os.path.join(directory, 'serve.sock'))
+
+        cases = [
+            ('python -c pass', [sys.executable, '-c', 'pass']),
+            ('glorp run --no-cache', [sys.executable, os.path.join(SRC, 'glorp.py'), 'run', program, '--no-cache']),
+            ('glorp run (cached)', [sys.executable, os.path.join(SRC, 'glorp.py'), 'run', program]),
+        ]
+        results = [(name, timings(command, runs, env)) for name, command in cases]
+
+        server = subprocess.Popen([sys.executable, os.path.join(SRC, 'glorp.py'), 'serve'], env=env,
+                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        try:
+            server.stdout.readline()
+            client = [sys.executable, os.path.join(SRC, 'glorp_client.py'), 'run', program]
+            results.append(('client -> warm daemon', timings(client, runs, env)))
+            results.append(('client -> daemon, --no-cache', timings(client + ['--no-cache'], runs, env)))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'invocation':<30} {'median':>10} {'min':>10} {'max':>10}   ({runs} runs)")
+    for name, samples in results:
+        print(f"{name:<30} " + ' '.join(f"{value * 1000:>7.1f} ms" for value in (statistics.median(samples), min(samples), max(samples))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compares readfile/writefile with the streaming and memory-mapped file builtins on a large log.
+
+Generates a log file, then runs small Glorp programs over it, each in its own process, and reports
+the wall time and the peak memory (maximum resident set size) of each: counting ERROR lines and
+copying them to another file, with readfile/writefile, readlines/writelines, readchunks, mapfile and
+a filewriter. An empty program gives the interpreter's own baseline.
+
+Usage: python benchmarks/files.py [size in MB]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GLORP = os.path.join(ROOT, 'src', 'glorp.py')
+
+CASES = {
+    'empty program': '',
+    'readfile, count': '''
+    count = 0
+    each line in readfile(LOG).split("\\n") {
+        if line.startswith("ERROR") {
+            count = count + 1
+        }
+    }''',
+    'readlines, count': '''
+    count = 0
+    each line in readlines(LOG) {
+        if line.startswith("ERROR") {
+            count = count + 1
+        }
+    }''',
+    'readchunks, count': '''
+    count = 0
+    each chunk in readchunks(LOG, 1048576) {
+        count = count + chunk.count("\\nERROR")
+    }''',
+    'mapfile, count': '''
+    count = mapfile(LOG).count("\\nERROR")''',
+    'readfile + writefile, copy': '''
+    newline = "\\n"
+    writefile(COPY, newline.join([each line in readfile(LOG).split(newline) where line.startswith("ERROR") => line]))''',
+    'readlines + writelines, copy': '''
+    writelines(COPY, each line in readlines(LOG) where line.startswith("ERROR") => line)''',
+    'readlines + filewriter, copy': '''
+    w = filewriter(COPY)
+    each line in readlines(LOG) {
+        if line.startswith("ERROR") {
+            w.writeline(line)
+        }
+    }
+    w.close()''',
+}
+
+
+def write_log(path, size):
+    levels = ('INFO ', 'INFO ', 'DEBUG', 'WARN ', 'INFO ', 'DEBUG', 'INFO ', 'ERROR', 'INFO ', 'DEBUG')
+    with open(path, 'w', encoding='utf8') as f:
+        written, i = 0, 0
+        block = []
+        while written < size:
+            line = f'{levels[i % 10]} 2026-10-18T12:{i // 60 % 60:02}:{i % 60:02} worker-{i % 16} request {i} took {i * 7 % 500} ms — ok\n'
+            block.append(line)
+            written += len(line.encode())
+            i += 1
+            if len(block) == 10000:
+                f.write(''.join(block))
+                block = []
+        f.write(''.join(block))
+
+
+def run(program, cwd):
+    begin = time.perf_counter()
+    process = subprocess.Popen([sys.executable, GLORP, 'run', program], cwd=cwd, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - begin
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise SystemExit(f"{program} failed")
+    # ru_maxrss is in KiB on Linux
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1e6) if len(sys.argv) > 1 else 200_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, 'app.log')
+        write_log(log, size)
+        print(f"{os.path.getsize(log) / 1e6:.0f} MB log")
+        for label, body in CASES.items():
+            program = os.path.join(directory, 'case.glorp')
+            with open(program, 'w', encoding='utf8') as f:
+                f.write(f'LOG = {json.dumps(log)}\nCOPY = {json.dumps(os.path.join(directory, "copy.log"))}\n\nfn Main() {{{body}\n}}\n')
+            run(program, directory)  # fills the transpile cache, so only the file work is timed
+            elapsed, peak = run(program, directory)
+            print(f"{label:<30} {elapsed:>7.2f} s   {peak:>8.1f} MB peak")
+
+
+if __name__ == "__main__":
+    main()
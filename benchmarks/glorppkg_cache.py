@@ -0,0 +1,75 @@
+"""Times `glorppkg get` against a slow local stand-in registry, cold and from the package cache.
+
+Installs a set of modules into an empty project (downloading, caching and pinning each in
+glorp.lock), then installs them again into a fresh checkout of the same project, which only reads
+the cache. Also checks that a module whose server copy no longer matches its pin is refused until
+--update, and that a damaged cache entry is downloaded again.
+
+Usage: python benchmarks/glorppkg_cache.py [modules] [latency in ms]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'glorppkg'))
+sys.path.insert(0, os.path.join(ROOT, 'testing'))
+
+from rich.console import Console
+
+import glorppkg
+from mock_registry import Registry
+
+
+def install(names):
+    begin = time.perf_counter()
+    assert all(glorppkg.get_module(name) for name in names)
+    return time.perf_counter() - begin
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 100) / 1000
+    modules = {f'module{i}': f'fn f{i}(x) => x + {i}\n// é ✓\n'.encode() * 50 for i in range(count)}
+    glorppkg.console = Console(quiet=True)
+
+    with tempfile.TemporaryDirectory() as directory, Registry(modules, latency) as registry:
+        glorppkg.SERVER_URL = registry.url
+        glorppkg.CACHE_DIR = os.path.join(directory, 'cache')
+        project, checkout = os.path.join(directory, 'project'), os.path.join(directory, 'checkout')
+        os.makedirs(project)
+        os.chdir(project)
+        print(f"{count} modules, {latency * 1000:.0f} ms per registry request")
+
+        cold = install(modules)
+        print(f"{'cold install':<28} {cold * 1000:>8.0f} ms   ({registry.requests} requests)")
+
+        # A checkout of the project: the lockfile, none of the modules
+        os.makedirs(checkout)
+        shutil.copy(glorppkg.LOCKFILE, checkout)
+        os.chdir(checkout)
+        before = registry.requests
+        warm = install(modules)
+        print(f"{'install from cache':<28} {warm * 1000:>8.0f} ms   ({registry.requests - before} requests)")
+        assert registry.requests == before
+        assert all(open(f'{name}.glorp', 'rb').read() == content for name, content in modules.items())
+
+        registry.modules['module0'] = b'fn f0(x) => x * 1000\n'
+        os.remove(glorppkg.cache_path(glorppkg.content_hash(modules['module0'])))
+        assert not glorppkg.get_module('module0') and open('module0.glorp', 'rb').read() == modules['module0']
+        assert glorppkg.get_module('module0', update=True) and open('module0.glorp', 'rb').read() == registry.modules['module0']
+
+        digest = glorppkg.read_lock()['modules']['module1']['sha256']
+        with open(glorppkg.cache_path(digest), 'wb') as f:
+            f.write(b'damaged')
+        os.remove('module1.glorp')
+        before = registry.requests
+        assert glorppkg.get_module('module1') and registry.requests == before + 1
+        print("a changed module was refused until --update, a damaged cache entry was downloaded again")
+        os.chdir(ROOT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Times `glorppkg install` resolving a large dependency tree from a slow local stand-in registry.
+
+Generates hundreds of modules that each use a few others, and a project whose source uses a handful
+of them. Installs the project's dependencies (found by scanning its .glorp files) one download at a
+time and with several at once over the pooled session, with the registry failing a share of requests
+so that retries are exercised, then installs again from the cache alone.
+
+Usage: python benchmarks/glorppkg_install.py [modules] [latency in ms] [concurrent downloads]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'glorppkg'))
+sys.path.insert(0, os.path.join(ROOT, 'testing'))
+
+from rich.console import Console
+
+import glorppkg
+from mock_registry import Registry
+
+
+def generate_modules(count):
+    """Module i uses up to three modules after it, so lib0 reaches the whole set."""
+    rng = random.Random(0)
+    modules = {}
+    for i in range(count):
+        uses = sorted({min(count - 1, i + 1)} | {rng.randrange(i, count) for _ in range(2)} - {i})
+        header = ''.join(f'use lib{d}\n' if d % 2 else f'use l{d} = lib{d}\n' for d in uses)
+        modules[f'lib{i}'] = (header + f'use py.math\n\nfn f{i}(x) => x + {i}\n').encode()
+    return modules
+
+
+def timed_install(project, cache, jobs):
+    os.chdir(project)
+    glorppkg.CACHE_DIR = cache
+    begin = time.perf_counter()
+    assert glorppkg.install(jobs=jobs)
+    return time.perf_counter() - begin
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    jobs = int(sys.argv[3]) if len(sys.argv) > 3 else glorppkg.MAX_DOWNLOADS
+    modules = generate_modules(count)
+    glorppkg.console = Console(quiet=True)
+
+    with tempfile.TemporaryDirectory() as directory, Registry(modules, latency, failure_rate=0.05) as registry:
+        glorppkg.SERVER_URL = registry.url
+        print(f"{count} modules, {latency * 1000:.0f} ms per registry request, 5% of downloads fail once or more")
+        for label, name, n in (('one download at a time', 'serial', 1), (f'{jobs} downloads at once', 'concurrent', jobs)):
+            project = os.path.join(directory, name)
+            os.makedirs(project)
+            with open(os.path.join(project, 'main.glorp'), 'w', encoding='utf8') as f:
+                f.write('use lib0\nuse helper\n\nfn Main() {\n    out(lib0.f0(1), "\\n")\n}\n')
+            with open(os.path.join(project, 'helper.glorp'), 'w', encoding='utf8') as f:
+                f.write('use lib1\n')
+            before, failures = registry.requests, registry.failures
+            elapsed = timed_install(project, os.path.join(directory, f'cache-{name}'), n)
+            installed = sorted(name for name in os.listdir(project) if name.startswith('lib'))
+            assert len(installed) == count and len(glorppkg.read_lock()['modules']) == count
+            print(f"{label:<28} {elapsed:>8.2f} s   ({registry.requests - before} requests, {registry.failures - failures} retried)")
+
+        before = registry.requests
+        for name in os.listdir(project):
+            if name.startswith('lib'):
+                os.remove(name)
+        elapsed = timed_install(project, os.path.join(directory, 'cache-concurrent'), jobs)
+        print(f"{'from the cache':<28} {elapsed:>8.2f} s   ({registry.requests - before} requests)")
+        assert registry.requests == before
+        assert all(open(f'{name}.glorp', 'rb').read() == content for name, content in modules.items())
+        os.chdir(ROOT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compares the glorppkg transfer protocols on a large module over a slow local link.
+
+Uploads a generated module of several MB with the legacy protocol (base64 in a JSON body) and as a
+binary stream, plain and gzip-compressed, then downloads it plain and compressed, reporting the time
+and the body bytes on the wire. Then cuts an upload and a download off halfway and checks that each
+resumes where it stopped, and that an old server that only knows the legacy protocol still works.
+The module is full of multibyte characters, which must come back intact whatever the chunk boundaries.
+
+Usage: python benchmarks/glorppkg_transfer.py [size in MB] [bandwidth in MB/s]
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'glorppkg'))
+sys.path.insert(0, os.path.join(ROOT, 'testing'))
+
+from rich.console import Console
+
+import glorppkg
+from mock_registry import Registry
+
+FUNCTION = 'fn größe{i}(wert) => wert * {i} + 1  // Ωμέγα ✓ 数{i}\n'
+
+
+def generate_module(size):
+    lines, total, i = [], 0, 0
+    while total < size:
+        lines.append(FUNCTION.format(i=i).encode())
+        total += len(lines[-1])
+        i += 1
+    return b''.join(lines)
+
+
+def measure(registry, label, action):
+    before_sent, before_received = registry.bytes_sent, registry.bytes_received
+    begin = time.perf_counter()
+    result = action()
+    elapsed = time.perf_counter() - begin
+    wire = registry.bytes_sent - before_sent + registry.bytes_received - before_received
+    print(f"{label:<32} {elapsed:>8.2f} s   {wire / 1e6:>7.2f} MB on the wire")
+    return result
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1e6) if len(sys.argv) > 1 else 4_000_000
+    bandwidth = float(sys.argv[2]) * 1e6 if len(sys.argv) > 2 else 20e6
+    content = generate_module(size)
+    glorppkg.console = Console(quiet=True)
+
+    with tempfile.TemporaryDirectory() as directory, Registry(bandwidth=bandwidth) as registry:
+        glorppkg.SERVER_URL = registry.url
+        glorppkg.CACHE_DIR = os.path.join(directory, 'cache')
+        os.chdir(directory)
+        with open('big.glorp', 'wb') as f:
+            f.write(content)
+        print(f"{len(content) / 1e6:.1f} MB module, {bandwidth / 1e6:.0f} MB/s link")
+
+        for label, options in (('upload, legacy base64 JSON', {'legacy': True}),
+                               ('upload, streamed', {'compress': False}),
+                               ('upload, streamed gzip', {})):
+            registry.modules.clear()
+            measure(registry, label, lambda: glorppkg.upload_file('big', **options))
+            assert registry.modules['big'] == content
+
+        for label, compress in (('download', False), ('download, gzip', True)):
+            registry.compress = compress
+            assert measure(registry, label, lambda: glorppkg.download_file('big')) == content
+
+        registry.interrupt(1, len(content) // 2)
+        registry.compress = False
+        assert measure(registry, 'download cut off halfway', lambda: glorppkg.download_file('big')) == content
+        registry.modules.clear()
+        registry.interrupt(1, len(content) // 2)
+        measure(registry, 'upload cut off halfway', lambda: glorppkg.upload_file('big', compress=False))
+        assert registry.modules['big'] == content
+
+    with tempfile.TemporaryDirectory() as directory, Registry(legacy=True) as registry:
+        glorppkg.SERVER_URL = registry.url
+        glorppkg.CACHE_DIR = os.path.join(directory, 'cache')
+        os.chdir(directory)
+        with open('big.glorp', 'wb') as f:
+            f.write(content)
+        glorppkg.upload_file('big')
+        assert registry.modules['big'] == content and glorppkg.download_file('big') == content
+        print("a server with only the legacy protocol still accepts uploads and serves downloads")
+        os.chdir(ROOT)
+
+
+if __name__ == "__main__":
+    main()
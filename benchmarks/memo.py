@@ -0,0 +1,88 @@
+"""Measures what `memo fn` saves on recursive functions and what a cached call costs.
+
+Times naive recursive Fibonacci with and without `memo`, then the cost of a cache hit for a number
+argument, for a list and for a Glorp class instance (keyed by a frozen copy, since instances are
+unhashable), against functools.lru_cache on the same plain function.
+
+Usage: python benchmarks/memo.py [n]
+"""
+import functools
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import glorp
+
+PROGRAM = '''
+fn fib(n) {
+    if n < 2 {
+        => n
+    }
+    => fib(n - 1) + fib(n - 2)
+}
+
+memo fn memo_fib(n) {
+    if n < 2 {
+        => n
+    }
+    => memo_fib(n - 1) + memo_fib(n - 2)
+}
+
+class Point(x, y) {
+}
+
+fn length(p) => p.x * p.x + p.y * p.y
+
+memo fn memo_length(p) => p.x * p.x + p.y * p.y
+
+memo fn memo_square(x) => x * x
+
+memo fn memo_sum(items) => items[0] + items[1]
+'''
+
+
+def load_program():
+    glorp.immutes.clear()
+    module = glorp.Glorp("Runtime").transform(glorp.parse(PROGRAM))
+    namespace = {}
+    exec(compile(glorp.finish_module(module), '<benchmark>', 'exec'), namespace)
+    return namespace
+
+
+def per_call(function, argument, calls=200000):
+    function(argument)
+    begin = time.perf_counter()
+    for _ in range(calls):
+        function(argument)
+    return (time.perf_counter() - begin) / calls
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 27
+    program = load_program()
+
+    begin = time.perf_counter()
+    expected = program['fib'](n)
+    plain = time.perf_counter() - begin
+    begin = time.perf_counter()
+    assert program['memo_fib'](n) == expected
+    cached = time.perf_counter() - begin
+    print(f"fib({n})          {plain * 1000:>10.2f} ms")
+    print(f"memo fib({n})     {cached * 1000:>10.2f} ms   ({plain / cached:,.0f}x faster, {program['memo_fib'].stats()})")
+    print()
+
+    lru_square = functools.lru_cache(maxsize=128)(lambda x: x * x)
+    point = program['Point'](3, 4)
+    print(f"{'cache hit':<32} {'per call':>10}")
+    print(f"{'functools.lru_cache, number':<32} {per_call(lru_square, 7.0) * 1e9:>7.0f} ns")
+    print(f"{'memo, number':<32} {per_call(program['memo_square'], 7.0) * 1e9:>7.0f} ns")
+    print(f"{'memo, list':<32} {per_call(program['memo_sum'], [1.0, 2.0]) * 1e9:>7.0f} ns")
+    print(f"{'uncached fn, Glorp instance':<32} {per_call(program['length'], point) * 1e9:>7.0f} ns")
+    print(f"{'memo, Glorp instance':<32} {per_call(program['memo_length'], point) * 1e9:>7.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Times arithmetic-heavy Glorp loops compiled at each optimization level (-O0, -O1, -O2).
+
+Usage: python benchmarks/optimizer.py [repeats]
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import glorp
+
+
+PROGRAMS = {
+    'counter loop': '''
+fn Main() {
+    i = 0
+    total = 0
+    while i < 200000 {
+        total = total + i * 2 + 1
+        i = i + 1
+    }
+    => total
+}
+''',
+    'constant expressions': '''
+fn Main() {
+    total = 0
+    for i from 1 to 100000 {
+        total = total + (60 * 60 * 24) / 7 + 2 ^ 10 - 3 % 2
+    }
+    => total
+}
+''',
+    'polynomial': '''
+fn Main() {
+    x = 0
+    acc = 0
+    while x < 100000 {
+        acc = acc + 3 * x ^ 2 - 4 * x + 7
+        x = x + 1
+    }
+    => acc
+}
+''',
+    'literal reset': '''
+fn Main() {
+    count = 0
+    each n in [1, ..., 50000] {
+        step = 1
+        limit = 10
+        if n % limit == 0 {
+            count = count + step
+        }
+    }
+    => count
+}
+''',
+}
+
+
+def compile_program(source, level):
+    glorp.opt_level = level
+    glorp.immutes.clear()
+    module = glorp.Glorp("Runtime").transform(glorp.parse(source))
+    namespace = {}
+    exec(compile(glorp.finish_module(module), '<benchmark>', 'exec'), namespace)
+    return namespace['Main']
+
+
+def best_of(repeats, fn):
+    best = float('inf')
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - begin)
+    return best, result
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    levels = (0, 1, 2)
+
+    print(f"{'program':<24}" + ''.join(f"{f'-O{level}':>13}" for level in levels) + f"{'speedup':>10}")
+    for name, source in PROGRAMS.items():
+        timings, results = [], set()
+        for level in levels:
+            elapsed, result = best_of(repeats, compile_program(source, level))
+            timings.append(elapsed)
+            results.add(str(result))
+        assert len(results) == 1, f"{name}: optimization levels disagree: {results}"
+        print(f"{name:<24}" + ''.join(f"{elapsed * 1000:>10.2f} ms" for elapsed in timings) + f"{timings[0] / timings[-1]:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Times `out()` called many times into a pipe, with the old flush-per-call behaviour and each output mode.
+
+Each run happens in a child process whose stdout is a pipe drained by this script, so the numbers
+include the write syscalls the modes are meant to save.
+
+Usage: python benchmarks/output.py [calls]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import sys, time
+sys.path.insert(0, {src!r})
+from glorp_runtime import out, output_mode
+
+def old_out(*args, sep=""):
+    sys.stdout.write(sep.join(map(str, args)))
+    sys.stdout.flush()
+
+mode = {mode!r}
+write = old_out if mode == "old" else out
+if mode != "old":
+    output_mode(mode)
+begin = time.perf_counter()
+for i in range({calls}):
+    write("row ", i, ": ", i * 2.5, "\\n")
+sys.stdout.flush()
+sys.stderr.write(str(time.perf_counter() - begin))
+'''
+
+
+def run(mode, calls):
+    child = subprocess.run(
+        [sys.executable, '-c', CHILD.format(src=os.path.join(ROOT, 'src'), mode=mode, calls=calls)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
+    )
+    lines = child.stdout.count(b'\n')
+    assert lines == calls, f"{mode}: expected {calls} lines, got {lines}"
+    return float(child.stderr.decode().strip().splitlines()[-1])
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    baseline = None
+    print(f"{'mode':<16} {'time':>10} {'calls/s':>12} {'speedup':>9}   ({calls} out() calls into a pipe)")
+    for mode in ('old', 'unbuffered', 'line', 'buffered', 'auto'):
+        elapsed = run(mode, calls)
+        baseline = baseline or elapsed
+        label = 'flush per call' if mode == 'old' else mode
+        print(f"{label:<16} {elapsed:>8.3f} s {calls / elapsed / 1e6:>10.2f}M {baseline / elapsed:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Shows how `par each` scales with the number of workers on a CPU-bound Glorp function.
+
+Runs the same comprehension serially and with `par(workers: N)` on processes for N = 1, 2, 4, ...
+up to the number of cores (at least 2), plus once on threads, and checks that every variant
+returns the same list.
+
+Usage: python benchmarks/parallel.py [items]
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import glorp
+
+PROGRAM = '''
+fn collatz(n) {
+    steps = 0
+    while n != 1 {
+        if n % 2 == 0 {
+            n = n / 2
+        } else {
+            n = 3 * n + 1
+        }
+        steps = steps + 1
+    }
+    => steps
+}
+
+fn serial(items) => [each n in items => collatz(n)]
+
+fn parallel(items, count) => par(workers: count) each n in items => collatz(n)
+
+fn threaded(items, count) => par(workers: count, pool: "thread") each n in items => collatz(n)
+'''
+
+
+def load_program():
+    glorp.immutes.clear()
+    module = glorp.Glorp("Runtime").transform(glorp.parse(PROGRAM))
+    namespace = {}
+    exec(compile(glorp.finish_module(module), '<benchmark>', 'exec'), namespace)
+    return namespace
+
+
+def timed(fn, *args):
+    begin = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - begin, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    program = load_program()
+    items = list(range(1, count + 1))
+    cores = os.cpu_count() or 1
+
+    baseline, expected = timed(program['serial'], items)
+    print(f"{count} collatz lengths, {cores} core(s)")
+    print(f"{'variant':<24} {'time':>10} {'speedup':>9}")
+    print(f"{'serial each':<24} {baseline:>8.3f} s {1:>8.2f}x")
+
+    workers = 1
+    while True:
+        elapsed, result = timed(program['parallel'], items, workers)
+        assert result == expected
+        print(f"{f'par, {workers} process(es)':<24} {elapsed:>8.3f} s {baseline / elapsed:>8.2f}x")
+        if workers >= max(cores, 2):
+            break
+        workers = min(workers * 2, max(cores, 2))
+
+    elapsed, result = timed(program['threaded'], items, max(cores, 2))
+    assert result == expected
+    print(f"{f'par, {max(cores, 2)} threads':<24} {elapsed:>8.3f} s {baseline / elapsed:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Compares LALR and Earley parse times on the example and testing scripts.
+
+Usage: python benchmarks/parse_modes.py [repeats]
+"""
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import lark
+from lark import Lark
+import glorp
+
+
+def best_of(repeats, fn):
+    best = float('inf')
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - begin)
+    return best
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    earley_build = best_of(1, lambda: Lark(glorp.grammar))
+    # Time the LALR parser built from scratch (which writes the cache) and then loaded from that cache
+    cache = os.path.join(glorp.cache_dir, 'grammar_lalr.cache')
+    if os.path.exists(cache):
+        os.remove(cache)
+    lalr_cold = best_of(1, glorp.load_lalr_parser)
+    lalr_cached = best_of(repeats, glorp.load_lalr_parser)
+    earley = Lark(glorp.grammar)
+    lalr = glorp.load_lalr_parser()
+
+    print(f"{'parser construction':<40} {'earley':>13} {'lalr':>13}")
+    print(f"{'  no cache':<40} {earley_build * 1000:>10.2f} ms {lalr_cold * 1000:>10.2f} ms")
+    print(f"{'  from the grammar cache':<40} {'-':>13} {lalr_cached * 1000:>10.2f} ms")
+    print()
+    print(f"{'script':<40} {'earley':>13} {'lalr':>13}")
+
+    files = sorted(glob.glob(os.path.join(ROOT, 'examples', '*.glorp')) + glob.glob(os.path.join(ROOT, 'testing', '*.glorp')))
+    for path in files:
+        source = open(path, encoding='utf8').read()
+        if not source.strip():
+            continue
+        name = os.path.relpath(path, ROOT)
+
+        try:
+            earley_time = f"{best_of(repeats, lambda: earley.parse(source)) * 1000:>10.2f} ms"
+        except lark.exceptions.LarkError:
+            earley_time = f"{'error':>13}"
+
+        try:
+            lalr_time = f"{best_of(repeats, lambda: lalr.parse(source)) * 1000:>10.2f} ms"
+        except lark.exceptions.LarkError:
+            lalr_time = f"{'fallback':>13}"
+
+        print(f"{name:<40} {earley_time} {lalr_time}")
+
+
+if __name__ == "__main__":
+    main()
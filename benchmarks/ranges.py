@@ -0,0 +1,64 @@
+"""Compares the old float-stepping grange generator with GlorpRange and the literal-bound range() lowering.
+
+Usage: python benchmarks/ranges.py [repeats]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from glorp_runtime import grange, _float_range
+
+
+def best_of(repeats, fn):
+    best = float('inf')
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - begin)
+    return best
+
+
+def consume(iterable):
+    for _ in iterable:
+        pass
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    n = 1_000_000
+
+    cases = [
+        ('for i from 0 to 1000000', lambda: _float_range(0, n, 1), lambda: grange(0, n), lambda: map(float, range(0, n + 1))),
+        ('[0, 0.001, ..., 1000]', lambda: _float_range(0, 1000, 0.001), lambda: grange(0, 1000, 0.001), None),
+    ]
+    print(f"{'iteration':<28} {'old grange':>13} {'GlorpRange':>13} {'range()':>13}")
+    for name, old, new, lowered in cases:
+        timings = [best_of(repeats, lambda: consume(make())) if make else None for make in (old, new, lowered)]
+        print(f"{name:<28}" + ''.join(f"{t * 1000:>10.2f} ms" if t is not None else f"{'-':>13}" for t in timings))
+
+    print()
+    print(f"{'[1, ..., 1000000]':<28} {'list(old)':>13} {'GlorpRange':>13}")
+    for label, op in (('len', len), ('slice [::1000]', lambda r: r[::1000]), ('last element', lambda r: r[-1])):
+        def old_way():
+            return op(list(_float_range(1, n, 1)))
+
+        timings = [best_of(repeats, old_way), best_of(repeats, lambda: op(grange(1, n)))]
+        print(f"{label:<28}" + ''.join(f"{t * 1000:>10.3f} ms" for t in timings))
+
+    tracemalloc.start()
+    values = list(_float_range(1, n, 1))
+    old_peak = tracemalloc.get_traced_memory()[1]
+    del values
+    tracemalloc.reset_peak()
+    lazy = grange(1, n)
+    new_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{'memory':<28} {old_peak / 2**20:>10.2f} MB {new_peak / 2**20:>10.4f} MB  ({len(lazy)} elements)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Measures watch update throughput: the old per-write watcher against sync, batched and deferred delivery.
+
+Every watcher receives 10 writes per round. The old watcher and sync mode call the handler on every
+write; `batch` and deferred mode coalesce them into one notification per watcher.
+
+Usage: python benchmarks/reactivity.py [repeats]
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from glorp_runtime import Watched, Derived, batch, flush_watchers, watch_mode
+
+WRITES = 10
+
+
+class OldWatcher:
+    """The watcher Glorp used before the reactivity engine, kept here as the baseline."""
+    def __init__(self, initial_value, handler_func):
+        self._val = initial_value
+        self._handler = handler_func
+
+    @property
+    def value(self):
+        return self._val
+
+    @value.setter
+    def value(self, new_val):
+        old_val = self._val
+        self._val = new_val
+        if old_val != new_val:
+            self._handler(new_val, old_val)
+
+
+def best_of(repeats, fn):
+    best = float('inf')
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - begin)
+    return best
+
+
+def write_all(watchers):
+    for step in range(WRITES):
+        for watcher in watchers:
+            watcher.value = step
+
+
+def reset(watchers):
+    for watcher in watchers:
+        watcher._value = -1
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    calls = [0]
+
+    def handler(old, new):
+        calls[0] += 1
+
+    def old_handler(new, old):
+        calls[0] += 1
+
+    print(f"{'watchers':>8} {'old watcher':>14} {'sync':>14} {'batch':>14} {'deferred':>14}   (updates/s, handler calls)")
+    for count in (1, 10, 100, 1_000, 10_000):
+        old = [OldWatcher(-1, old_handler) for _ in range(count)]
+        new = [Watched(-1, handler) for _ in range(count)]
+
+        def run_old():
+            for watcher in old:
+                watcher._val = -1
+            write_all(old)
+
+        def run_sync():
+            reset(new)
+            write_all(new)
+
+        def run_batch():
+            reset(new)
+            with batch():
+                write_all(new)
+
+        def run_deferred():
+            reset(new)
+            watch_mode("deferred")
+            write_all(new)
+            flush_watchers()
+            watch_mode("sync")
+
+        row = []
+        for run in (run_old, run_sync, run_batch, run_deferred):
+            calls[0] = 0
+            elapsed = best_of(repeats, run)
+            row.append(f"{count * WRITES / elapsed / 1e6:>6.2f}M {calls[0] // repeats:>6}")
+        print(f"{count:>8} " + ' '.join(f"{cell:>14}" for cell in row))
+
+    print()
+    print(f"{'derived fan-out':<16} {'sync':>12} {'batch':>12}")
+    for count in (10, 100, 1_000):
+        source = Watched(0)
+        derived = [Derived(lambda i=i: source.value + i, handler) for i in range(count)]
+
+        def run_sync():
+            for step in range(WRITES):
+                source.value = step + 1
+            source.value = 0
+
+        def run_batch():
+            with batch():
+                for step in range(WRITES):
+                    source.value = step + 1
+            source.value = 0
+
+        timings = [best_of(repeats, run) for run in (run_sync, run_batch)]
+        print(f"{count:>6} derived   " + ''.join(f"{t * 1000:>9.2f} ms" for t in timings))
+        del derived
+
+
+if __name__ == "__main__":
+    main()
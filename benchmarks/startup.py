@@ -0,0 +1,80 @@
+"""Measures start-up cost for console-only programs, with and without importing rio up front.
+
+Times, as complete processes:
+  * the glorp CLI running a cached console program, as it is now and with `import rio` added in front
+    (what every run used to pay),
+  * the to-py output of that program run with plain Python, with and without the `from rio import *`
+    header every generated file used to start with,
+and lists the slowest top-level imports of the CLI from `python -X importtime`.
+
+Usage: python benchmarks/startup.py [runs]
+"""
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+GLORP = os.path.join(SRC, 'glorp.py')
+
+
+def median_time(command, runs, env):
+    samples = []
+    for _ in range(runs):
+        begin = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - begin)
+    return statistics.median(samples)
+
+
+def slowest_imports(command, env, count=8):
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + command, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    top_level = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\S.*)', line)
+        if match and not match.group(2).startswith(' '):
+            top_level.append((int(match.group(1)), match.group(2)))
+    return sorted(top_level, reverse=True)[:count]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    env = dict(os.environ, PYTHONPATH=SRC)
+    with tempfile.TemporaryDirectory() as directory:
+        program = os.path.join(directory, 'fizzbuzz.glorp')
+        shutil.copy(os.path.join(ROOT, 'examples', 'fizzbuzz.glorp'), program)
+        subprocess.run([sys.executable, GLORP, 'run', program], env=env, check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([sys.executable, GLORP, 'to-py', program], env=env, check=True, stdout=subprocess.DEVNULL)
+        generated = os.path.join(directory, 'fizzbuzz.py')
+        with open(generated) as f:
+            code = f.read()
+        eager = os.path.join(directory, 'fizzbuzz_eager.py')
+        with open(eager, 'w') as f:
+            f.write('from rio import *\n' + code)
+
+        run_cli = "import runpy, sys; sys.argv = ['glorp', 'run', %r]; runpy.run_path(%r, run_name='__main__')"
+        cases = [
+            ('python -c pass', [sys.executable, '-c', 'pass']),
+            ('glorp run (lazy rio)', [sys.executable, GLORP, 'run', program]),
+            ('glorp run + import rio', [sys.executable, '-c', 'import rio; ' + run_cli % (program, GLORP)]),
+            ('generated .py (lazy rio)', [sys.executable, generated]),
+            ('generated .py + rio header', [sys.executable, eager]),
+        ]
+        print(f"{'console-only fizzbuzz':<30} {'median':>10}   ({runs} runs)")
+        for name, command in cases:
+            print(f"{name:<30} {median_time(command, runs, env) * 1000:>7.1f} ms")
+
+        print()
+        print("slowest top-level imports of `glorp run` (cumulative):")
+        for microseconds, module in slowest_imports([GLORP, 'run', program], env):
+            print(f"  {module:<28} {microseconds / 1000:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
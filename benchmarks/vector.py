@@ -0,0 +1,103 @@
+"""Times `each` comprehensions over NumPy arrays, vectorized and as the Python loop, across array sizes.
+
+Compiles a few element-wise comprehensions at the default -O1, where they run as NumPy array
+expressions, and runs each on arrays of growing size, then runs them again with the vector path
+turned off so that every element goes through the Python loop. Checks that both give the same
+result. The last row feeds a `[1, ..., n]` range instead of an array.
+
+Usage: python benchmarks/vector.py [largest size] [repeats]
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import numpy
+
+import glorp
+import glorp_runtime
+from glorp_runtime import vector
+
+SOURCE = '''
+use np for py.numpy
+
+fn affine(data, k) => [each a in data => a * k + 1]
+fn clipped(data) => [each a in data where a > 0.5 => a else => 0]
+fn filtered(data) => [each a in data where a > 0.25 and a < 0.75 => np.sqrt(a)]
+fn energy(data) => sum(each a in data => a ^ 2)
+fn count(data) => sum(each a in data => a > 0.9)
+fn doubled(data) => [each x in data => x * 2]
+'''
+
+CASES = (
+    ('a * k + 1', 'affine', (3,)),
+    ('where/else', 'clipped', ()),
+    ('where, np.sqrt', 'filtered', ()),
+    ('sum(a ^ 2)', 'energy', ()),
+    ('sum(a > 0.9)', 'count', ()),
+)
+
+
+def compile_program(source):
+    glorp.opt_level = 1
+    glorp.immutes.clear()
+    module = glorp.Glorp("Runtime").transform(glorp.parse(source))
+    namespace = {}
+    exec(compile(glorp.finish_module(module), '<benchmark>', 'exec'), namespace)
+    return namespace
+
+
+def best_of(repeats, fn):
+    best = float('inf')
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - begin)
+    return best, result
+
+
+def compare(repeats, fn, *args):
+    vectorized, expected = best_of(repeats, lambda: fn(*args))
+    limits = vector.MIN_ARRAY_SIZE, vector.MIN_RANGE_SIZE
+    vector.MIN_ARRAY_SIZE = vector.MIN_RANGE_SIZE = float('inf')
+    try:
+        looped, result = best_of(repeats, lambda: fn(*args))
+    finally:
+        vector.MIN_ARRAY_SIZE, vector.MIN_RANGE_SIZE = limits
+    assert result == expected, (result, expected)
+    return looped, vectorized
+
+
+def main():
+    largest = int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    program = compile_program(SOURCE)
+    sizes = [10 ** e for e in range(1, 10) if 10 ** e <= largest]
+    rng = numpy.random.default_rng(0)
+
+    print(f"{'':<18}" + ''.join(f"{size:>20,}" for size in sizes))
+    print(f"{'':<18}" + ''.join(f"{'loop / vector':>20}" for _ in sizes))
+    for label, name, extra in CASES:
+        cells = []
+        for size in sizes:
+            looped, vectorized = compare(repeats, program[name], rng.random(size), *extra)
+            cells.append(f"{format_time(looped)} / {format_time(vectorized)}")
+        print(f"{label:<18}" + ''.join(f"{cell:>20}" for cell in cells))
+
+    cells = []
+    for size in sizes:
+        looped, vectorized = compare(repeats, program['doubled'], glorp_runtime.grange(1, size))
+        cells.append(f"{format_time(looped)} / {format_time(vectorized)}")
+    print(f"{'[1, ..., n] * 2':<18}" + ''.join(f"{cell:>20}" for cell in cells))
+
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.0f}µs"
+    return f"{seconds * 1e3:.1f}ms"
+
+
+if __name__ == "__main__":
+    main()
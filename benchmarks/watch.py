@@ -0,0 +1,74 @@
+"""Compares what an edit costs in `glorp watch` against transpiling the whole file again.
+
+Generates a program of many small functions, then edits one of them at a time and times the full
+pipeline (parse, transform, optimize and compile of the whole file) against WatchSession.update,
+which redoes only the edited item and swaps the new function into the loaded module.
+
+Usage: python benchmarks/watch.py [functions]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import glorp
+
+FUNCTION = '''
+fn step_{i}(x) {{
+    total = 0
+    for k from 1 to 10 {{
+        if k % 2 == 0 {{
+            total = total + x * k + {i}
+        }} else {{
+            total = total - k
+        }}
+    }}
+    => [each v in [total, x, k] => v * {scale}]
+}}
+'''
+
+
+def program(count, edited=None, scale=2):
+    functions = [FUNCTION.format(i=i, scale=scale if i == edited else 2) for i in range(count)]
+    return ''.join(functions) + '\nfn Main() {\n    out(step_0(1), "\\n")\n}\n'
+
+
+def full_pipeline(source_code):
+    glorp.immutes.clear()
+    module = glorp.Glorp("Runtime").transform(glorp.parse(source_code))
+    return compile(glorp.finish_module(module), '<benchmark>', 'exec')
+
+
+def timed(function, *args):
+    begin = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - begin, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    source_code = program(count)
+    print(f"{count} functions, {source_code.count(chr(10)):,} lines")
+
+    session = glorp.WatchSession(os.path.join(tempfile.gettempdir(), 'watch_benchmark.glorp'))
+    first, _ = timed(session.update, source_code)
+    full, incremental = [], []
+    for edit, function in enumerate(range(0, count, max(count // 10, 1))):
+        edited = program(count, edited=function, scale=edit + 3)
+        full.append(timed(full_pipeline, edited)[0])
+        elapsed, transpiled = timed(session.update, edited)
+        assert transpiled == 2 or (transpiled == 1 and edit == 0), transpiled
+        incremental.append(elapsed)
+
+    print(f"{'first load (watch)':<28} {first * 1000:>9.1f} ms")
+    print(f"{'full pipeline per edit':<28} {statistics.median(full) * 1000:>9.1f} ms")
+    print(f"{'watch update per edit':<28} {statistics.median(incremental) * 1000:>9.1f} ms"
+          f"   ({statistics.median(full) / statistics.median(incremental):,.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,188 +1,601 @@
-from lark import Lark, Transformer
+import time
+# Taken before the imports below, so -o can report how long loading lark and the runtime took
+started_at = time.perf_counter()
+
+from lark import Lark, Transformer, Token, v_args
+import ast
+import copy
 import sys
 import types
 import linecache
-import time
+from contextlib import nullcontext
 import random
 import string
 import random
+import re
 import os
-from rio import *
+import hashlib
+import marshal
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import atexit
+import builtins
 
 import lark
+import glorp_runtime
 
-start = time.time()
-
-line = 1
+imported_at = time.perf_counter()
 
 VERSION = "Glorp Programming Language release 1.3"
 
 gui = False
 
-py_prefix = r"""
-from rio import *
-from math import floor
-from itertools import islice
-import linecache
-from types import SimpleNamespace
-import sys
-import subprocess
-import os
+rio_exports = None
 
-def take(n, iterable):
-    def generator():
-        count = 0
-        for item in iterable:
-            if count >= n:
-                break
-            yield item
-            count += 1
-    return list(generator())
-
-class _GlorpWatcher:
-    def __init__(self, initial_value, handler_func):
-        self._val = initial_value
-        self._handler = handler_func
-
-    @property
-    def value(self):
-        return self._val
-
-    @value.setter
-    def value(self, new_val):
-        old_val = self._val
-        self._val = new_val
-        if old_val != new_val:
-            self._handler(new_val, old_val)
-
-def out(*args, sep=""):
-    output_string = sep.join(map(str, args))
-    sys.stdout.write(output_string)
-    sys.stdout.flush()
-
-def clear():
-    sys.stdout.write("\033[H\033[2J")
-    sys.stdout.flush()
-
-def readfile(filename):
-    with open(filename, 'r', encoding='utf8') as f:
-        return f.read()
-
-def writefile(filename, content):
-    with open(filename, 'w', encoding='utf8') as f:
-        f.write(content)
-
-def read(prompt=""):
-    return input(prompt)
-
-def read_str(prompt=""):
-    return input(prompt)
-
-def read_int(prompt=""):
-    while True:
-        s = input(prompt)
-        try:
-            return int(s)
-        except ValueError:
-            out("Invalid input. Please enter a whole number (integer).\n")
+def uses_rio(free):
+    """Whether any of these otherwise undefined names comes from rio. Importing rio takes over a second, so
+    this only happens while transpiling a program that needs it; the result is cached with the code."""
+    global rio_exports
+    if not free:
+        return False
+    if rio_exports is None:
+        import rio
+        rio_exports = set(getattr(rio, '__all__', None) or (name for name in dir(rio) if not name.startswith('_')))
+    return bool(free & rio_exports)
+
+def free_names(module):
+    """Names the module reads but never binds, imports or gets from builtins."""
+    loaded, bound = set(), set(dir(builtins))
+    for node in ast.walk(module):
+        if isinstance(node, ast.Name):
+            (loaded if isinstance(node.ctx, ast.Load) else bound).add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, ast.alias):
+            bound.add((node.asname or node.name).split('.')[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+    return loaded - bound
+
+def runtime_header(module, defined=()):
+    """Imports for the glorp_runtime helpers that the generated module actually refers to, and rio for
+    programs that use it (a `render` block, or rio components in plain functions). defined names the ones
+    that the module gets from elsewhere in the program, when it is only a part of one."""
+    names = {node.id for node in ast.walk(module) if isinstance(node, ast.Name)}
+    used = sorted(set(glorp_runtime.__all__) & names)
+    header = []
+    if uses_rio(free_names(module) - set(glorp_runtime.__all__) - set(defined)):
+        header.append(ast.ImportFrom(module='rio', names=[ast.alias(name='*')], level=0))
+    if used:
+        header.append(ast.ImportFrom(module='glorp_runtime', names=[ast.alias(name=name) for name in used], level=0))
+    return header
+
+class PhaseTimer:
+    """Wall-clock time of each transpiler phase, for -o.
+
+    Phases nest: a phase's `self` time excludes the phases opened inside it (a module import contains
+    that module's parse, transform and compile), while `total` includes them.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.rules = {}
+        self.stack = []
+
+    def phase(self, name):
+        return self._Phase(self, name)
+
+    class _Phase:
+        __slots__ = ('timer', 'name', 'begin', 'nested')
+
+        def __init__(self, timer, name):
+            self.timer, self.name = timer, name
+
+        def __enter__(self):
+            self.nested = 0.0
+            self.timer.stack.append(self)
+            self.begin = time.perf_counter()
+
+        def __exit__(self, *exc_info):
+            elapsed = time.perf_counter() - self.begin
+            stack = self.timer.stack
+            stack.pop()
+            if stack:
+                stack[-1].nested += elapsed
+            self.timer.record(self.name, elapsed, elapsed - self.nested)
+
+    def record(self, name, elapsed, own=None):
+        stats = self.phases.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += elapsed if own is None else own
+
+    def instrument(self, transformer):
+        """Times every rule and token callback of a Lark transformer. Children are transformed before their parent's callback runs, so each time is the rule's own."""
+        rules = self.rules
+        call_rule, call_token = transformer._call_userfunc, transformer._call_userfunc_token
+
+        def timed_rule(tree, new_children=None):
+            begin = time.perf_counter()
+            try:
+                return call_rule(tree, new_children)
+            finally:
+                stats = rules.setdefault(tree.data, [0, 0.0])
+                stats[0] += 1
+                stats[1] += time.perf_counter() - begin
+
+        def timed_token(token):
+            begin = time.perf_counter()
+            try:
+                return call_token(token)
+            finally:
+                stats = rules.setdefault(token.type, [0, 0.0])
+                stats[0] += 1
+                stats[1] += time.perf_counter() - begin
+
+        transformer._call_userfunc, transformer._call_userfunc_token = timed_rule, timed_token
+        return transformer
+
+    def report(self, source_file, cached):
+        total = time.perf_counter() - started_at
+        return {
+            'glorp': VERSION,
+            'python': sys.version.split()[0],
+            'source': source_file,
+            'parse_mode': parse_mode,
+            'opt_level': opt_level,
+            'cached': cached,
+            'total': total,
+            'phases': [{'name': name, 'calls': calls, 'total': elapsed, 'self': own}
+                       for name, (calls, elapsed, own) in self.phases.items()],
+            'rules': [{'rule': rule, 'calls': calls, 'total': elapsed}
+                      for rule, (calls, elapsed) in sorted(self.rules.items(), key=lambda item: -item[1][1])],
+        }
 
-def read_float(prompt=""):
-    while True:
-        s = input(prompt)
+    def text(self, report, rule_limit=15):
+        lines = [f"Timing for {report['source']} ({report['total'] * 1000:.2f} ms in total"
+                 f"{', transpiled code loaded from the cache' if report['cached'] else ''})",
+                 f"  {'phase':<20} {'calls':>6} {'total ms':>10} {'self ms':>10}"]
+        for phase in report['phases']:
+            lines.append(f"  {phase['name']:<20} {phase['calls']:>6} {phase['total'] * 1000:>10.2f} {phase['self'] * 1000:>10.2f}")
+        if report['rules']:
+            lines.append(f"  {'transform rule':<20} {'calls':>6} {'total ms':>10} {'avg us':>10}")
+            for rule in report['rules'][:rule_limit]:
+                lines.append(f"  {rule['rule']:<20} {rule['calls']:>6} {rule['total'] * 1000:>10.2f} {rule['total'] / rule['calls'] * 1e6:>10.1f}")
+            if len(report['rules']) > rule_limit:
+                lines.append(f"  ... {len(report['rules']) - rule_limit} more rules in the JSON report (-o=json)")
+        return '\n'.join(lines)
+
+# Set by -o; every phase below is timed only while it exists
+timer = None
+
+def timed(name):
+    return timer.phase(name) if timer else nullcontext()
+
+GLORP_DIR = os.path.dirname(os.path.abspath(__file__))
+cache_dir = os.environ.get('GLORP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.glorp'))
+
+grammar = open(os.path.join(GLORP_DIR, 'grammar.lark'), encoding='utf8').read()
+lalr_grammar = open(os.path.join(GLORP_DIR, 'grammar_lalr.lark'), encoding='utf8').read()
+
+class BracketNewlines:
+    """Postlexer for the LALR grammar: inside (...) and [...] a newline is plain whitespace, not a statement separator."""
+    always_accept = ()
+
+    def process(self, stream):
+        depth = 0
+        for token in stream:
+            if token.type in ('LPAR', 'LSQB'):
+                depth += 1
+            elif token.type in ('RPAR', 'RSQB'):
+                depth = max(depth - 1, 0)
+            elif token.type == '_NL' and depth:
+                continue
+            yield token
+
+def load_lalr_parser():
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache = os.path.join(cache_dir, 'grammar_lalr.cache')
+    except OSError:
+        cache = False
+    return Lark(lalr_grammar, parser='lalr', postlex=BracketNewlines(), propagate_positions=True, cache=cache)
+
+parser = None
+earley_parser = None
+parse_mode = 'lalr'
+opt_level = 1
+
+def parse(source):
+    """Parses with the LALR grammar, retrying with Earley for constructs only the ambiguous grammar accepts."""
+    global parser, earley_parser
+    if parse_mode == 'lalr':
+        if parser is None:
+            with timed('grammar load'):
+                parser = load_lalr_parser()
         try:
-            return float(s)
-        except ValueError:
-            out("Invalid input. Please enter a number (e.g., 123 or 45.67).\n")
-
-def read_bool(prompt=""):
-    while True:
-        s = input(prompt).lower().strip()
-        if s in ('true', 't', 'yes', 'y', '1'):
-            return True
-        elif s in ('false', 'f', 'no', 'n', '0'):
-            return False
-        else:
-            out("Invalid input. Please enter 'true' or 'false'.\n")
+            return parser.parse(source)
+        except lark.exceptions.UnexpectedInput:
+            pass
+    if earley_parser is None:
+        with timed('grammar load'):
+            earley_parser = Lark(grammar, propagate_positions=True)
+    return earley_parser.parse(source)
+
+cache_limit = int(os.environ.get('GLORP_CACHE_LIMIT', 256))
+cache_magic = b'GLORPC' + importlib.util.MAGIC_NUMBER
+
+# Flags that only change what gets printed, never the generated code
+display_flags = {'-o', '-d', '-t', '--no-cache', '--output', '--output-buffer'}
+
+def cache_key(source_code, source_file, flags):
+    """Hashes everything the generated code depends on. Imported Glorp modules are cached under their own keys."""
+    try:
+        transpiler = open(os.path.abspath(__file__), 'rb').read()
+    except OSError:
+        transpiler = b''
+    digest = hashlib.sha256()
+    for part in (VERSION, sys.version, grammar, lalr_grammar, ' '.join(sorted(flags)), os.getcwd(), source_file, source_code):
+        digest.update(part.encode('utf8') + b'\0')
+    digest.update(transpiler)
+    return digest.hexdigest()
+
+def cache_path(key):
+    return os.path.join(cache_dir, 'transpiled', f'{key}.glorpc')
+
+def load_cached(key):
+    """Returns the cached entry for key, or None if it is missing or corrupt."""
+    path = cache_path(key)
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(cache_magic)) != cache_magic:
+                return None
+            entry = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
 
-def tuple(*args):
-    return (args)
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
 
-def grange(start, end, step=None):
-    if step is None:
-        step = 1 if end >= start else -1
+def store_cached(key, entry):
+    path = cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(cache_magic)
+            marshal.dump(entry, f)
+        os.replace(temp_path, path)
+        evict_cache()
+    except OSError:
+        pass
+
+def evict_cache():
+    """Removes the least recently used entries once there are more than cache_limit of them."""
+    directory = os.path.join(cache_dir, 'transpiled')
+    entries = [entry for entry in os.scandir(directory) if entry.name.endswith('.glorpc')]
+    if len(entries) <= cache_limit:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - cache_limit]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
 
-    if step == 0:
-        raise ValueError("grange() step argument must not be zero")
+use_cache = True
+module_search_path = [os.getcwd()]
+# `use util` imports _glorp_modules.util, so a Glorp module never meets a Python module of the same name in sys.modules
+module_package = '_glorp_modules'
 
-    current = float(start)
-    end = float(end)
-    
-    if step > 0:
-        while current <= end + 1e-9:
-            yield round(current, 10)
-            current += step
-    else: # step < 0
-        while current >= end - 1e-9:
-            yield round(current, 10)
-            current += step
-
-def pow(a, b):
-    return a ** b
-
-class NullType:
-    def __repr__(self):
-        return "Null"
-    def __bool__(self):
+def is_module_package(directory):
+    """A directory is a package of modules when it holds a .glorp file, directly or in a package below it."""
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
         return False
-    def __eq__(self, other):
-        return other is None or isinstance(other, NullType)
-
-class BaseMeta(type):
-    def __repr__(cls):
-        return f"Glorp.ClassObject({cls.__name__})"
-
-class Container_Meta(type):
-    def __repr__(cls):
-        return f"Container {cls.__name__}"
-
-class Field_Meta(type):
-    def __repr__(cls):
-        container = cls.__module__
-        if hasattr(cls, '__qualname__') and '.' in cls.__qualname__:
-            container = cls.__qualname__.split('.')[0]
-        return f"Fied {cls.__name__} of container {container}"
-
-class num(float, metaclass = BaseMeta):
-    def __init__(self, value) -> None:
-        self.value = value
-    
-    def __truediv__(self, other) -> float:
-        if other.value == 0:
-            return num("inf")
-        return self.value / other.value
-    
-    def __str__(self):
-        val = str(self.value)
-        if val.endswith(".0"):
-            return val.rstrip(".0")
-        return val 
-
-true = True
-false = False
-Null = NullType()
-null = NullType()
-"""
-
-glorp_prefix = r'''
-'''
-
-grammar = open('src/grammar.lark', encoding='utf8').read()
+    if any(entry.name.endswith('.glorp') and entry.is_file() for entry in entries):
+        return True
+    return any(entry.is_dir() and is_module_package(entry.path) for entry in entries)
+
+def find_module_file(dotted_name, search_path=None):
+    """Returns the .glorp file (or the directory, for a package of modules) that dotted_name refers to, or None."""
+    *package, name = dotted_name.split('.')
+    for directory in search_path or module_search_path:
+        base = os.path.join(directory, *package, name)
+        if os.path.isfile(base + '.glorp'):
+            return base + '.glorp'
+        if os.path.isdir(base) and not os.path.isfile(os.path.join(base, '__init__.py')) and is_module_package(base):
+            return base
+    return None
+
+def parse_source(source_code):
+    try:
+        with timed('parse'):
+            return parse(source_code)
+    except Exception as e:
+        context = e.get_context(source_code, 40) if hasattr(e, 'get_context') else '' # type: ignore
+        error_details = str(e)
+        message = f"Invalid syntax.\n> {context}\nDetails: {error_details}"
+        raise GlorpParseError(message, line=getattr(e, 'line', None), column=getattr(e, 'column', None))
+
+def generate_module(source_code, module_context_name):
+    """Transpiles Glorp source to a located ast.Module, returning it with the Glorp modules it imports."""
+    tree = parse_source(source_code)
+    transformer = Glorp(module_context_name)
+    if timer: timer.instrument(transformer)
+    with timed('transform'):
+        module = transformer.transform(tree)
+    return module, transformer.imports
+
+def finish_module(module, defined=()):
+    if opt_level:
+        with timed('optimize'):
+            module = Optimizer(opt_level).optimize(module)
+    with timed('runtime prefix'):
+        module.body[:0] = runtime_header(module, defined)
+        return ast.fix_missing_locations(locate(module, 1))
+
+# Filename that generated code is compiled under -> the .glorp file it came from
+source_files = {}
+
+def register_source(fake_filename, source_code, source_file):
+    """Puts the Glorp source into linecache, so tracebacks through generated code show Glorp lines."""
+    lines = [line + '\n' for line in source_code.splitlines()]
+    linecache.cache[fake_filename] = (len(source_code), None, lines, fake_filename)
+    source_files[fake_filename] = source_file
+
+def transpile_module(filename, fullname):
+    """Returns the cache entry for a Glorp module, transpiling and compiling it only if the cache has no copy."""
+    with open(filename, encoding='utf8') as f:
+        source_code = f.read()
+
+    fake_filename = f"<glorp_{fullname.replace('.', '/')}_module>"
+    key = cache_key(source_code, filename, ['module', fullname, parse_mode, f'-O{opt_level}'])
+    with timed('cache'):
+        entry = load_cached(key) if use_cache else None
+
+    if entry is None:
+        module, imports = generate_module(source_code, fullname.rpartition('.')[2])
+        module = finish_module(module)
+        with timed('compile'):
+            entry = {'code': compile(module, fake_filename, 'exec'), 'imports': imports}
+        if use_cache:
+            with timed('cache'):
+                store_cached(key, entry)
+
+    register_source(fake_filename, source_code, filename)
+    return entry
+
+class GlorpLoader(importlib.abc.Loader):
+    def __init__(self, filename):
+        self.filename = filename
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        with timed('module import'):
+            entry = transpile_module(self.filename, module.__name__.removeprefix(module_package + '.'))
+            exec(entry['code'], module.__dict__)
+
+class GlorpFinder(importlib.abc.MetaPathFinder):
+    """Lets generated code import .glorp modules with a plain import, so each one is compiled once and shared via sys.modules.
+
+    It only answers for names under module_package, whose modules are looked up along module_search_path,
+    so neither Python modules nor directories named like them get in the way of each other.
+    """
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname == module_package:
+            spec = importlib.machinery.ModuleSpec(fullname, None, is_package=True)
+            spec.submodule_search_locations = module_search_path
+            return spec
+        if not fullname.startswith(module_package + '.'):
+            return None
+        found = find_module_file(fullname.rpartition('.')[2], path)
+        if found is None:
+            return None
+        if os.path.isdir(found):
+            spec = importlib.machinery.ModuleSpec(fullname, None, is_package=True)
+            spec.submodule_search_locations = [found]
+            return spec
+        return importlib.util.spec_from_file_location(fullname, found, loader=GlorpLoader(found))
+
+def install_module_finder():
+    if not any(isinstance(finder, GlorpFinder) for finder in sys.meta_path):
+        sys.meta_path.insert(0, GlorpFinder())
 
-parser = Lark(grammar)
 mainargs = False
+async_main = False
 
 immutes = {}
 
+class Infix(list):
+    """Operands and operator strings of an arithmetic chain, turned into nodes by `to_expr` once the chain is complete."""
+
+binary_operators = {
+    '+': (ast.Add, 1), '-': (ast.Sub, 1),
+    '*': (ast.Mult, 2), '/': (ast.Div, 2), '%': (ast.Mod, 2), '//': (ast.FloorDiv, 2),
+    '**': (ast.Pow, 3),
+}
+
+comparison_operators = {
+    '==': ast.Eq, '!=': ast.NotEq, '>': ast.Gt, '<': ast.Lt, '>=': ast.GtE, '<=': ast.LtE,
+}
+
+def to_expr(value):
+    """Resolves an Infix chain with Python's operator precedence, the way the chain reads when written out flat."""
+    if not isinstance(value, Infix):
+        return value
+    operands, operators = value[0::2], value[1::2]
+    position = 0
+
+    def climb(min_precedence):
+        nonlocal position
+        left = operands[position]
+        while position < len(operators):
+            op_class, precedence = binary_operators[operators[position]]
+            if precedence < min_precedence:
+                break
+            position += 1
+            # ** is right-associative and binds tighter than a unary sign on its left: -a ^ 2 is -(a ** 2)
+            right = climb(precedence if op_class is ast.Pow else precedence + 1)
+            if op_class is ast.Pow and isinstance(left, ast.UnaryOp) and isinstance(left.op, (ast.USub, ast.UAdd)):
+                power = span(ast.BinOp(left=left.operand, op=op_class(), right=right), left.operand, right)
+                left = span(ast.UnaryOp(op=left.op, operand=power), left, right)
+            else:
+                left = span(ast.BinOp(left=left, op=op_class(), right=right), left, right)
+        return left
+
+    node = climb(0)
+    # Remembered so an enclosing chain (a / b + c parses as safe_div(a, b + c) with Earley) can be re-flattened
+    node.glorp_infix = value
+    return node
+
+def span(node, first, last):
+    """Places node from the start of `first` to the end of `last`, when both are placed."""
+    if getattr(first, 'lineno', None) is not None and getattr(last, 'end_lineno', None) is not None:
+        node.lineno, node.col_offset = first.lineno, first.col_offset
+        node.end_lineno, node.end_col_offset = last.end_lineno, last.end_col_offset
+    return node
+
+def load(name):
+    return ast.Name(id=name, ctx=ast.Load())
+
+def call(func, *args, keywords=()):
+    return ast.Call(func=load(func) if isinstance(func, str) else func, args=list(args), keywords=list(keywords))
+
+def store(target):
+    if isinstance(target, (ast.Name, ast.Attribute, ast.Subscript)):
+        target = copy.copy(target)
+        target.ctx = ast.Store()
+        return target
+    raise GlorpSemanticError(f"Cannot assign to '{ast.unparse(target)}'")
+
+def identifier(node):
+    return node.id if isinstance(node, ast.Name) else ast.unparse(node)
+
+def awaits(node):
+    """The `await` expressions in node that belong to it, skipping those inside nested functions and classes."""
+    found = []
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, ast.Await):
+            found.append(child)
+        if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+            found.extend(awaits(child))
+    return found
+
+def statements(items):
+    result = []
+    for item in items:
+        if item is None:
+            continue
+        if isinstance(item, list):
+            result.extend(statements(item))
+        elif isinstance(item, ast.expr):
+            result.append(ast.Expr(value=item))
+        else:
+            result.append(item)
+    return result
+
+def block(items):
+    return statements(items) or [ast.Pass()]
+
+def locate(node, line, column=0):
+    """Gives `node` and the unplaced nodes under it the given position; subtrees that already have one are kept as they are."""
+    pending = [node]
+    while pending:
+        child = pending.pop()
+        if child._attributes:
+            if getattr(child, 'lineno', None) is None:
+                child.lineno, child.col_offset = line, column
+            elif child is not node:
+                continue
+            if getattr(child, 'end_lineno', None) is None or (child.end_lineno, child.end_col_offset) < (child.lineno, child.col_offset):
+                child.end_lineno, child.end_col_offset = child.lineno, child.col_offset
+        for field in child._fields:
+            value = getattr(child, field, None)
+            if isinstance(value, list):
+                pending.extend(item for item in value if isinstance(item, ast.AST))
+            elif isinstance(value, ast.AST):
+                pending.append(value)
+    return node
+
+def at(token, *nodes):
+    """Places nodes on the source span of a Lark token."""
+    for node in nodes:
+        node.lineno, node.col_offset = token.line, token.column - 1
+        node.end_lineno, node.end_col_offset = token.end_line, token.end_column - 1
+    return nodes[0]
+
+def clear_locations(node):
+    """Marks parsed template code as unplaced, so `locate` moves it to the Glorp line it stands for."""
+    for child in ast.walk(node):
+        if child._attributes:
+            child.lineno = child.end_lineno = None
+    return node
+
+plain_class_methods = r'''
+def __init__(self):
+    pass
+def __eq__(self, other):
+    return isinstance(other, type(self))
+def __is__(self, label):
+    return label in self.state or self.type == label
+'''
+
+# __init__ and __eq__ are filled in per class from its fields
+field_class_methods = r'''
+def __init__(self):
+    pass
+def __eq__(self, other):
+    if not isinstance(other, type(self)): return False
+def __is__(self, other):
+    if self == other: return True
+    if isinstance(other, type):
+        return isinstance(self, other)
+    return any(value == other for value in self.__dict__.values())
+def __str__(self):
+    args = ', '.join(map(str, self.__dict__.values()))
+    return f"{self.__class__.__name__}({args})"
+__repr__ = __str__
+@property
+def this(self):
+    return self
+'''
+
+# For `compact class`: fields live in __slots__ instead of a per-instance __dict__, and FIELDS becomes
+# the tuple of them. __init__ and __eq__ are filled in as for other classes; comparing field by field
+# stops at the first difference and measured faster than comparing two tuples.
+compact_class_methods = r'''
+__slots__ = ()
+def __init__(self):
+    pass
+def __eq__(self, other):
+    if not isinstance(other, type(self)): return False
+def __hash__(self):
+    return hash(FIELDS)
+def __is__(self, other):
+    if self == other: return True
+    if isinstance(other, type):
+        return isinstance(self, other)
+    return other in FIELDS
+def __str__(self):
+    args = ', '.join(map(str, FIELDS))
+    return f"{self.__class__.__name__}({args})"
+__repr__ = __str__
+@property
+def this(self):
+    return self
+'''
+
 class Glorp(Transformer):
     def __init__(self, module_context_name=None):
         super().__init__()
@@ -190,416 +603,511 @@ class Glorp(Transformer):
         self.declared_symbols = {
             "out", "clear",
             "read", "read_str", "read_int", "read_float", "read_bool",
-            "readfile", "writefile", "str", "int", "this"
+            "readfile", "writefile", "readlines", "readchunks", "mapfile", "filewriter", "writelines",
+            "str", "int", "this"
         }
         self.private_vars = {}
+        self.imports = []
         self.module_context_name = module_context_name
         self.ops = {
             "^" : "pow"
         }
 
+    def _call_userfunc(self, tree, new_children=None):
+        node = super()._call_userfunc(tree, new_children)
+        # Expressions get the exact span of their rule, so errors and profiles can point inside a line
+        if isinstance(node, ast.expr) and getattr(node, 'lineno', None) is None and not tree.meta.empty:
+            meta = tree.meta
+            node.lineno, node.col_offset = meta.line, meta.column - 1
+            node.end_lineno, node.end_col_offset = meta.end_line, meta.end_column - 1
+        return node
+
     def _generate_mangled_name(self, original_name, context):
         suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
         return f"_{self.module_context_name}_{context}_{original_name}_{suffix}"
-    
-    def _generate_type_prefix(self, arg_string: str) -> str:
-        arg_string = arg_string.strip()
-        if not arg_string:
-            return (
-                "def __init__(self):\n"
-                "    pass\n\n"
-                "def __eq__(self, other):\n"
-                "    return isinstance(other, type(self))\n\n"
-                "def __is__(self, label):\n"
-                "   return label in self.state or self.type == label\n\n"
-            )
-
-        parts = [part.strip() for part in arg_string.split(",") if part.strip()]
-
-        init_args = []
-        assignments = []
-        arg_names = []
-
-        for part in parts:
-            if "=" in part:
-                var, default = part.split("=", 1)
-                var = var.strip()
-                default = default.strip()
-                init_args.append(f"{var}={default}")
-            else:
-                var = part
-                init_args.append(var)
-            assignments.append(f"self.{var} = {var}")
-            arg_names.append(var)
-
-        header = f"def __init__(self, {', '.join(init_args)}):"
-        body = "\n".join(f"    {line}" for line in assignments)
-        init_block = f"{header}\n{body}"
-
-        eq_conditions = " and ".join([f"self.{var} == other.{var}" for var in arg_names])
-        eq_block = (
-            "def __eq__(self, other):\n"
-            "    if not isinstance(other, type(self)): return False\n"
-            f"    return {eq_conditions}"
-        )
-        is_block = (
-            "def __is__(self, other):\n"
-            "   if self == other: return True\n"
-            "   if isinstance(other, type):\n"
-            "       return isinstance(self, other)\n"
-            "   return any(value == other for value in self.__dict__.values())\n"
-        )
-        repr_str = (
-            "def __str__(self):\n"
-            "   args = ', '.join(map(str, self.__dict__.values()))\n"
-            "   return f\"{self.__class__.__name__}({args})\"\n"
-            "__repr__ = __str__"
-        )
-        this_property = (
-            "@property\n"
-            "def this(self):\n"
-            "    return self\n"
-        )
-
-        return f"{init_block}\n\n{eq_block}\n\n{is_block}\n\n{repr_str}\n\n{this_property}"
 
+    def _generate_type_prefix(self, params: ast.arguments | None) -> list[ast.stmt]:
+        methods = clear_locations(ast.parse(field_class_methods if params is not None else plain_class_methods)).body
+        if params is None:
+            return methods
+
+        init, eq = methods[0], methods[1]
+        init.args, init.body = self._generate_init(params)
+        self._generate_eq(eq, params)
+        return methods
+
+    def _generate_eq(self, eq, params):
+        conditions = [
+            ast.Compare(left=ast.Attribute(value=load('self'), attr=arg.arg, ctx=ast.Load()), ops=[ast.Eq()], comparators=[ast.Attribute(value=load('other'), attr=arg.arg, ctx=ast.Load())])
+            for arg in params.args
+        ] or [ast.Constant(value=True)]
+        eq.body.append(ast.Return(value=conditions[0] if len(conditions) == 1 else ast.BoolOp(op=ast.And(), values=conditions)))
+
+    def _generate_init(self, params):
+        args = ast.arguments(posonlyargs=[], args=[ast.arg(arg='self')] + params.args, kwonlyargs=[], kw_defaults=[], defaults=params.defaults)
+        body = [
+            ast.Assign(targets=[ast.Attribute(value=load('self'), attr=arg.arg, ctx=ast.Store())], value=load(arg.arg))
+            for arg in params.args
+        ]
+        return args, body or [ast.Pass()]
+
+    def _generate_compact_prefix(self, params: ast.arguments | None) -> list[ast.stmt]:
+        fields = [arg.arg for arg in params.args] if params is not None else []
+        methods = clear_locations(ast.parse(compact_class_methods)).body
+        methods[0].value = ast.Tuple(elts=[ast.Constant(value=field) for field in fields], ctx=ast.Load())
+        params = params or self.parameters([])
+        methods[1].args, methods[1].body = self._generate_init(params)
+        self._generate_eq(methods[2], params)
+
+        def fill(value):
+            if isinstance(value, ast.Name) and value.id == 'FIELDS':
+                return ast.Tuple(elts=[ast.Attribute(value=load('self'), attr=field, ctx=ast.Load()) for field in fields], ctx=ast.Load())
+            return value
+
+        for node in ast.walk(ast.Module(body=methods, type_ignores=[])):
+            for name, value in ast.iter_fields(node):
+                setattr(node, name, [fill(item) for item in value] if isinstance(value, list) else fill(value))
+        return methods
+
+    def _attach(self, base, part):
+        """Hangs a name part (a bare NAME, an element or a call) off the end of an attribute chain."""
+        if isinstance(part, str):
+            return ast.Attribute(value=base, attr=str(part), ctx=ast.Load())
+        if isinstance(part, ast.Name):
+            return ast.Attribute(value=base, attr=part.id, ctx=ast.Load())
+        if isinstance(part, ast.Attribute):
+            return ast.Attribute(value=self._attach(base, part.value), attr=part.attr, ctx=ast.Load())
+        if isinstance(part, ast.Call):
+            return ast.Call(func=self._attach(base, part.func), args=part.args, keywords=part.keywords)
+        if isinstance(part, ast.Subscript):
+            return ast.Subscript(value=self._attach(base, part.value), slice=part.slice, ctx=ast.Load())
+        raise GlorpSemanticError(f"Unexpected '{ast.unparse(part)}' in a name")
+
+    def _mangle(self, name):
+        if name in self.private_vars:
+            return self.private_vars[name]
+        if name in immutes:
+            return immutes[name]
+        return name
 
     def name(self, n):
-        if n == []: return '__glorp_last__'
-        def get_value(item):
-            if hasattr(item, 'value'):
-                return item.value
-            return str(item)
+        if n == []: return load('__glorp_last__')
 
-        first_part_name = get_value(n[0])
-        
-        mangled_first_part = None
-
-        if first_part_name in self.private_vars or first_part_name in immutes:
-            if first_part_name in self.private_vars: mangled_name = self.private_vars[first_part_name]
-            else: mangled_name = immutes[first_part_name]
-            
-            if self.module_context_name:
-                mangled_first_part = f"{mangled_name}"
-            else:
-                mangled_first_part = mangled_name
+        first = n[0]
+        if isinstance(first, str):
+            node = load(self._mangle(str(first)))
+            if isinstance(first, Token):
+                at(first, node)
         else:
-            mangled_first_part = first_part_name
-            
-        rest_parts = [get_value(part) for part in n[1:]]
-        full_name = ".".join([mangled_first_part] + rest_parts)
-        
-        return full_name
+            node = first
+
+        for part in n[1:]:
+            node = self._attach(node, part)
+        return node
 
     def private(self, items):
-        var_name, expression_str = items
+        var_name, expression = items
+        var_name = identifier(var_name)
         if var_name in self.private_vars:
             print(f"Warning: Private variable '{var_name}' is being redefined.")
         mangled_name = self._generate_mangled_name(var_name, "private")
         self.private_vars[var_name] = mangled_name
-        return f"{mangled_name} = {expression_str}"
-    
+        return ast.Assign(targets=[ast.Name(id=mangled_name, ctx=ast.Store())], value=expression)
+
     def immute(self, items):
-        var_name, expression_str = items
+        var_name, expression = items
+        var_name = identifier(var_name)
         if var_name in self.private_vars:
             print(f"Warning: Private variable '{var_name}' is being redefined.")
         mangled_name = self._generate_mangled_name(var_name, "constant")
         immutes[var_name] = mangled_name
-        return f"{mangled_name} = {expression_str}"
-    
-    def lambda_call(self, items):
-        expr_str = items[0]
-        arg_str = items[1]
-        
-        arg_count = len(arg_str.split(','))
-        arg_names = [chr(97 + i) for i in range(arg_count)]
+        return ast.Assign(targets=[ast.Name(id=mangled_name, ctx=ast.Store())], value=expression)
 
-        fn_code = f"(lambda {', '.join(arg_names)}: {expr_str})({arg_str})"
+    def lambda_call(self, items):
+        expression, arguments = items
+        arguments = arguments or []
+        arg_names = [chr(97 + i) for i in range(max(len(arguments), 1))]
 
-        return fn_code
+        function = ast.Lambda(
+            args=ast.arguments(posonlyargs=[], args=[ast.arg(arg=name) for name in arg_names], kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=expression,
+        )
+        return self.call([function, arguments])
 
     def import_stmt(self, items):
-        path = items[-1].split('.')
-        module_path = "/".join(path)
-        module_name = path[-1] if len(items) == 1 else items[0]
+        dotted_name = identifier(items[-1])
+        module_name = dotted_name.split('.')[-1] if len(items) == 1 else identifier(items[0])
         self.declared_symbols.add(module_name)
-        
-        module_fake_filename = f"<glorp_{module_path}_module>"
-
-        try:
-            with open(f"{module_path}.glorp", "r", encoding="utf8") as f:
-                module_source = f.read()
-        except FileNotFoundError:
-            raise GlorpError(f"Module '{'/'.join(items)}' not found.")
-        
-        module_transformer = Glorp(module_context_name=module_name)
-        tree = parser.parse(module_source)
-        module_py_code = module_transformer.transform(tree)
-
-        escaped_module_code = repr(module_py_code)
-
-        return f"""
-{module_name} = SimpleNamespace()
-_glorp_module_code = {escaped_module_code}
-
-_glorp_exec_dict = globals().copy()
-_glorp_initial_keys = set(_glorp_exec_dict.keys())
 
-_glorp_module_lines = [line + '\\n' for line in _glorp_module_code.splitlines()]
-linecache.cache['{module_fake_filename}'] = (len(_glorp_module_code), None, _glorp_module_lines, '{module_fake_filename}')
+        if find_module_file(dotted_name) is None:
+            raise GlorpError(f"Module '{'/'.join(map(identifier, items))}' not found.")
+        self.imports.append(dotted_name)
 
-exec(compile(_glorp_module_code, '{module_fake_filename}', 'exec'), _glorp_exec_dict)
+        return ast.Import(names=[ast.alias(name=f'{module_package}.{dotted_name}', asname=module_name)])
 
-for key, value in _glorp_exec_dict.items():
-    if key not in _glorp_initial_keys:
-        setattr({module_name}, key, value)
-
-del _glorp_module_code, _glorp_exec_dict, _glorp_initial_keys, _glorp_module_lines
-"""
-    
     def py_import(self, items):
-        self.declared_symbols.add(items[0])
-        if len(items) == 1:
-            return f'import {items[0]}'
-        return f'import {items[1]} as {items[0]}'
+        names = [identifier(item) for item in items]
+        self.declared_symbols.add(names[0])
+        if len(names) == 1:
+            return ast.Import(names=[ast.alias(name=names[0])])
+        return ast.Import(names=[ast.alias(name=names[1], asname=names[0])])
 
     def named_arg(self, items):
-        return f'{items[0]} = {items[1]}'
-    
+        return ast.keyword(arg=identifier(items[0]), value=items[1])
+
     def default_param(self, items):
-        return f'{items[0]} = {items[1]}'
-    
-    def _indent(self, text_block, indent_str="    "):
-        return "\n".join(indent_str + line for line in text_block.split('\n'))
+        return (ast.arg(arg=identifier(items[0])), items[1])
 
     def num_range(self, items):
         if len(items) == 2:
-            start_expr = str(items[0])
-            end_expr = str(items[1])
-            return f"grange({start_expr}, {end_expr})"
-        elif len(items) == 3:
-            start_expr = str(items[0])
-            mid_expr = str(items[1])
-            end_expr = str(items[2])
-            return f"grange({start_expr}, {end_expr}, {mid_expr} - {start_expr})"
-        
+            return call('grange', items[0], items[1])
+        start, second, end = items
+        return call('grange', start, end, ast.BinOp(left=second, op=ast.Sub(), right=copy.deepcopy(start)))
+
     def list_comprehension(self, items):
-        generator_expression = items[0]
-        return f'list({generator_expression})'
-    
+        # list() over a generator that awaits would be handed an async generator; a list comprehension awaits in place
+        if isinstance(items[0], ast.GeneratorExp) and awaits(items[0]):
+            return ast.ListComp(elt=items[0].elt, generators=items[0].generators)
+        return call('list', items[0])
+
     def int_div(self, items):
-        return f'{items[0]} % {items[1]}'
+        return Infix([*self._chain(items[0]), '%', *self._chain(items[1])])
 
     def watch_stmt(self, items):
-        var_name, initial_value, handler_code = items
+        var_name, initial_value, handler_body = items
+        var_name = identifier(var_name)
         self.watched_vars.add(var_name)
 
-        handler_code_block = "\n".join(handler_code) if isinstance(handler_code, list) else handler_code
         handler_func_name = f"_glorp_handler_for_{var_name}"
-
-        handler_func = f"def {handler_func_name}(old, new):\n{self._indent(handler_code_block)}"
-        watcher_instance = f"{var_name} = _GlorpWatcher({initial_value}, {handler_func_name})"
-        return f"{handler_func}\n{watcher_instance}"
+        handler_body = block(handler_body)
+        # A handler that awaits becomes a coroutine, which the runtime runs as a task on the event loop
+        function_type = ast.AsyncFunctionDef if any(awaits(statement) for statement in handler_body) else ast.FunctionDef
+        handler = function_type(
+            name=handler_func_name,
+            args=ast.arguments(posonlyargs=[], args=[ast.arg(arg='old'), ast.arg(arg='new')], kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=handler_body, decorator_list=[], type_params=[],
+        )
+        # An initial value that reads other watched values becomes a Derived, recomputed when they change
+        if any(isinstance(node, ast.Attribute) and node.attr == 'value' for node in ast.walk(initial_value)):
+            no_args = ast.arguments(posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[], defaults=[])
+            watcher = call('Derived', ast.Lambda(args=no_args, body=initial_value), load(handler_func_name))
+        else:
+            watcher = call('Watched', initial_value, load(handler_func_name))
+        return [handler, ast.Assign(targets=[ast.Name(id=var_name, ctx=ast.Store())], value=watcher)]
 
     def start(self, items):
-        return "\n\n".join(items)
-
-    def global_statement(self, items):
-        global line
-        line += 2
-        return items[0]
+        module = ast.Module(body=statements(items), type_ignores=[])
+        # Python would only refuse these when compiling the whole module, without naming the Glorp line
+        for scope in ast.walk(module):
+            if isinstance(scope, (ast.Module, ast.FunctionDef, ast.Lambda, ast.ClassDef)) and awaits(scope):
+                if isinstance(scope, ast.FunctionDef):
+                    raise GlorpSemanticError(f"'await' used in '{scope.name}', which is not an async fn (declare it with 'async fn {scope.name}')")
+                if isinstance(scope, ast.Lambda):
+                    raise GlorpSemanticError("'await' cannot be used inside a lambda or a par each body")
+                raise GlorpSemanticError("'await' can only be used inside an async fn")
+        return module
+
+    @v_args(meta=True)
+    def global_statement(self, meta, items):
+        return self._locate_statement(meta, items[0])
 
     def var_decl(self, items):
-        if items[0] in immutes.values(): raise GlorpSemanticError("Trying to change immutable " + items[0].split('_')[-2])
-        self.declared_symbols.add(items[0])
-        return f'{items[0]}: any = {items[1]}'
-    
+        target, value = items
+        if isinstance(target, ast.Name) and target.id in immutes.values():
+            raise GlorpSemanticError("Trying to change immutable " + target.id.split('_')[-2])
+        self.declared_symbols.add(identifier(target))
+        return ast.Assign(targets=[store(target)], value=value)
+
     def try_stmt(self, items):
-        return f"try:\n{self._format_block(items[0])}\nexcept Exception as exception:\n{self._format_block(items[1])}"
+        handler = ast.ExceptHandler(type=load('Exception'), name='exception', body=block(items[1]))
+        return ast.Try(body=block(items[0]), handlers=[handler], orelse=[], finalbody=[])
 
     def throw(self, items):
-        return f'raise Exception({items[0]})'
+        return ast.Raise(exc=call('Exception', items[0]), cause=None)
 
     def yield_stmt(self, items):
-        return f'yield {items[0]}'
+        return ast.Expr(value=ast.Yield(value=items[0]))
 
     def func(self, items):
         func_name, *rest = items
+        func_name = identifier(func_name)
         if func_name in self.declared_symbols:
             print(f"Warning: Redefining function '{func_name}'")
         self.declared_symbols.add(func_name)
-        
-        params_str = (rest[0]) if len(rest) > 1 else ""
-        body_statements = rest[-1]
-        indented_body = "\n".join(self._indent(s) for s in body_statements) if body_statements else "    pass"
+
+        params = rest[0] if len(rest) > 1 else self.parameters([])
         global mainargs
 
-        if func_name == "Main" and params_str != "": mainargs = True
-        
-        return f"\ndef {func_name}({params_str}):\n{indented_body}"
-    
+        if func_name == "Main" and params.args: mainargs = True
+
+        return ast.FunctionDef(name=func_name, args=params, body=block(rest[-1]), decorator_list=[], type_params=[])
+
+    def async_func(self, items):
+        function = items[0]
+        if function.name == "Main":
+            global async_main
+            async_main = True
+        return ast.AsyncFunctionDef(name=function.name, args=function.args, body=function.body, decorator_list=[], type_params=[])
+
+    def memo_func(self, items):
+        options, function = items
+        keywords = self._keywords(options, 'memo(size: 1000, ttl: 60)')
+        function.decorator_list = [call('memo', keywords=keywords) if keywords else load('memo')]
+        return function
+
+    def await_expr(self, items):
+        value = to_expr(items[0])
+        # Awaiting a whole list of awaitables waits for all of them at once
+        if isinstance(value, ast.GeneratorExp) or (isinstance(value, ast.Call) and isinstance(value.func, ast.Name)
+                                                   and value.func.id == 'list' and len(value.args) == 1 and isinstance(value.args[0], ast.GeneratorExp)):
+            value = call('gather', value if isinstance(value, ast.GeneratorExp) else value.args[0])
+        elif isinstance(value, ast.List):
+            value = call('gather', *value.elts)
+        return ast.Await(value=value)
+
     def render(self, items):
         global gui
         gui = True
-        code = ''
-        for i in items[0]: code += self._indent(i)
-        return f'''
-class Render(Component):
-{code}'''
-    
+        return ast.ClassDef(name='Render', bases=[load('Component')], keywords=[], body=block(items[0]), decorator_list=[], type_params=[])
+
     def inherit(self, items):
-        return f':{items[0]}'
-    
-    def class_def(self, items):
-        if len(items) == 3:
-            if not ':' in items[1]:
-                name, args, body_lines = items
-                parent = ''
-            else:
-                name, parent, body_lines = items
-                args = ''
-        elif len(items) == 4:
-            name, parent, args, body_lines = items
-        else:
-            name, body_lines = items
-            args = parent = ''
+        return ('inherit', items[0])
 
-        parent = parent.strip(':')
+    def class_def(self, items):
+        compact, name, *middle, body_lines = items
+        name = identifier(name)
+        parent = next((item[1] for item in middle if isinstance(item, tuple)), None)
+        params = next((item for item in middle if isinstance(item, ast.arguments)), None)
 
         self.declared_symbols.add(name)
+        body = statements(body_lines)
+        if compact:
+            self._check_compact(name, params, body, inherits=parent is not None)
+            # Without fields of its own a compact subclass keeps its parent's constructor and comparisons
+            prefix = self._generate_compact_prefix(params) if params is not None or parent is None else self._generate_compact_prefix(params)[:1]
+        else:
+            prefix = self._generate_type_prefix(params)
+
+        return ast.ClassDef(
+            name=name,
+            bases=[parent] if parent is not None else [],
+            keywords=[ast.keyword(arg='metaclass', value=load('BaseMeta'))],
+            body=prefix + body,
+            decorator_list=[], type_params=[],
+        )
+
+    def _check_compact(self, name, params, body, inherits):
+        """A compact instance has room for its constructor fields only, so anything else assigned to it would fail at run time."""
+        fields = {arg.arg for arg in params.args} if params is not None else set()
+        for statement in body:
+            targets = statement.targets if isinstance(statement, ast.Assign) else []
+            clash = next((target.id for target in targets if isinstance(target, ast.Name) and target.id in fields), None)
+            if clash:
+                raise GlorpSemanticError(f"compact class '{name}' cannot have both a field and a class variable named '{clash}'")
+        if inherits:
+            return  # fields of a parent class are not known here
+        members = {statement.name for statement in body if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        for node in ast.walk(ast.Module(body=body, type_ignores=[])):
+            if (isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store) and isinstance(node.value, ast.Name)
+                    and node.value.id == 'this' and node.attr not in fields | members):
+                raise GlorpSemanticError(f"compact class '{name}' has no field '{node.attr}'; add it to the constructor parameters")
 
-        return f'class {name}({f'{parent},' if parent else ''} metaclass = BaseMeta):\n{self._format_block(self._generate_type_prefix(args).split('\n'))}\n{self._format_block(body_lines)}'
-    
     def container_def(self, items):
-        name, *params = items
-        res = (f'class {name}(metaclass = Container_Meta):\n')
-        for param in params:
-            res += f'\n    class {param}(metaclass = Field_Meta): pass'
-        return res
-    
+        name, *params = map(identifier, items)
+        fields = [
+            ast.ClassDef(name=param, bases=[], keywords=[ast.keyword(arg='metaclass', value=load('Field_Meta'))], body=[ast.Pass()], decorator_list=[], type_params=[])
+            for param in params
+        ]
+        return ast.ClassDef(name=name, bases=[], keywords=[ast.keyword(arg='metaclass', value=load('Container_Meta'))], body=fields or [ast.Pass()], decorator_list=[], type_params=[])
+
     def prop_stmt(self, items):
-        return f'@property\ndef {items[0]}(this):\n{self._format_block(items[1])}'
-    
+        args = ast.arguments(posonlyargs=[], args=[ast.arg(arg='this')], kwonlyargs=[], kw_defaults=[], defaults=[])
+        return ast.FunctionDef(name=identifier(items[0]), args=args, body=block(items[1]), decorator_list=[load('property')], type_params=[])
+
     def verb_stmt(self, items):
-        return f'def {items[0]}(this, {items[1]}):\n{self._format_block(items[2])}'
-    
+        args = ast.arguments(posonlyargs=[], args=[ast.arg(arg='this'), ast.arg(arg=identifier(items[1]))], kwonlyargs=[], kw_defaults=[], defaults=[])
+        return ast.FunctionDef(name=identifier(items[0]), args=args, body=block(items[2]), decorator_list=[], type_params=[])
+
     def varb_call(self, items):
-        return f'{items[0]}.{items[1]}({items[2]})'
+        return call(ast.Attribute(value=items[0], attr=identifier(items[1]), ctx=ast.Load()), items[2])
 
     def body(self, items):
-        return items
+        return statements(items)
 
-    def local_statement(self, items):
-        global line
-        line += 1
-        return f'{items[0]} #Expected line in your glorp file: {line} (This feature is experimental and might not work with multiline comments and empty lines)'
+    @v_args(meta=True)
+    def local_statement(self, meta, items):
+        return self._locate_statement(meta, items[0])
 
+    def _locate_statement(self, meta, statement):
+        if isinstance(statement, ast.expr):
+            statement = ast.Expr(value=statement)
+        if meta.empty:
+            return statement
+        for node in statement if isinstance(statement, list) else [statement]:
+            locate(node, meta.line, meta.column - 1)
+        return statement
 
     def empty_line(self, n):
-        return ''
+        return None
 
     def return_stmnt(self, items):
-        return f'return {items[0]}'
-    
-    def switch_case(self, items: list[str]):
+        return ast.Return(value=items[0])
+
+    def switch_case(self, items):
         exp = items[0]
         items = items[1:]
-        code = [f"_val = {exp}", f"match _val:"]
+        code = [ast.Assign(targets=[ast.Name(id='_val', ctx=ast.Store())], value=exp)]
+        cases = []
         count = len(items)
         has_default = count % 2 == 1
         limit = count - 1 if has_default else count
 
         for i in range(0, limit, 2):
             condition, body = items[i], items[i+1]
-            if 'grange' in condition or '[' in condition:
-                code.append(
-                    f"    case _ if _val in {condition} or _val == {condition}:\n   {self._format_block(body)}"
-                )
-            else:
-                code.append(
-                    f"    case _ if _val == {condition}:\n   {self._format_block(body)}"
-                )
+            guard = ast.Compare(left=load('_val'), ops=[ast.Eq()], comparators=[condition])
+            if any(isinstance(node, (ast.List, ast.Subscript)) or (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'grange') for node in ast.walk(condition)):
+                guard = ast.BoolOp(op=ast.Or(), values=[
+                    ast.Compare(left=load('_val'), ops=[ast.In()], comparators=[copy.deepcopy(condition)]),
+                    guard,
+                ])
+            cases.append(ast.match_case(pattern=ast.MatchAs(), guard=guard, body=block(body)))
 
         if has_default:
-            code.append(f"    case _:\n {self._format_block(items[-1])}")
-        return "\n".join(code)
+            cases.append(ast.match_case(pattern=ast.MatchAs(), body=block(items[-1])))
+        if cases:
+            code.append(ast.Match(subject=load('_val'), cases=cases))
+        return code
 
     def map_stmt(self, items):
-        return f'''{items[1]}[{items[0]}]'''
+        return ast.Subscript(value=items[1], slice=items[0], ctx=ast.Load())
 
     def if_stmnt(self, items):
-        code = []
         count = len(items)
         has_else = count % 2 == 1
+        orelse = block(items[-1]) if has_else else []
         limit = count - 1 if has_else else count
-        for i in range(0, limit, 2):
+        for i in range(limit - 2, -1, -2):
             condition, body = items[i], items[i+1]
-            keyword = "if" if i == 0 else "elif"
-            code.append(f"{keyword} {condition}:\n{self._format_block(body)}")
-        if has_else:
-            code.append(f"else:\n{self._format_block(items[-1])}")
-        return "\n".join(code)
-
-    def _format_block(self, body_statements):
-        return "\n".join(self._indent(s) for s in body_statements) if body_statements else "    pass"
+            orelse = [ast.If(test=condition, body=block(body), orelse=orelse)]
+        return orelse[0]
 
     def while_stmnt(self, items):
         condition, body_statements = items
-        return f"while {condition}:\n{self._format_block(body_statements)}"
+        return ast.While(test=condition, body=block(body_statements), orelse=[])
 
     def for_loop(self, items):
-        var_name_token, start, end, body_statements = items
-        var_name = var_name_token
-        return f"for {var_name} in grange({start}, {end}):\n{self._format_block(body_statements)}"
+        var_name, start, end, body_statements = items
+        return ast.For(target=store(var_name), iter=call('grange', start, end), body=block(body_statements), orelse=[])
 
     def for_each(self, items):
-        var_name, object_name, body_statements = items
-        self.declared_symbols.add(var_name)
-        return f'for {var_name} in {object_name}:\n{self._format_block(body_statements)}'
+        var_name, iterable, body_statements = items
+        self.declared_symbols.add(identifier(var_name))
+        return ast.For(target=store(var_name), iter=iterable, body=block(body_statements), orelse=[])
+
+    def _body_value(self, body):
+        """The expression a one-line body (`=> expr` or `-> call(...)`) stands for inside a comprehension."""
+        if len(body) == 1 and isinstance(body[0], (ast.Return, ast.Expr)) and body[0].value is not None:
+            return body[0].value
+        raise GlorpSemanticError("A comprehension body must be a single expression, e.g. [each x in items => x * 2]")
 
     def quick_foreach(self, items):
-        if len(items) == 3:
-            var_name, object_name, statement = items
-            return f'({statement} for {var_name} in {object_name})'
-        elif len(items) == 4:
-            var_name, object_name, if_block, statement = items
-            return f'({statement} for {var_name} in {object_name} if {if_block})'
+        var_name, iterable, *rest = items
+        target = store(var_name)
+        if len(rest) == 1:
+            return ast.GeneratorExp(elt=self._body_value(rest[0]), generators=[ast.comprehension(target=target, iter=iterable, ifs=[], is_async=0)])
+        elif len(rest) == 2:
+            condition, statement = rest
+            return ast.GeneratorExp(elt=self._body_value(statement), generators=[ast.comprehension(target=target, iter=iterable, ifs=[condition], is_async=0)])
         else:
-            var_name, object_name, if_block, statement, else_block = items
-            return f'(({statement} if {if_block} else {else_block}) for {var_name} in {object_name})'
+            condition, statement, else_block = rest
+            element = ast.IfExp(test=condition, body=self._body_value(statement), orelse=self._body_value(else_block))
+            return ast.GeneratorExp(elt=element, generators=[ast.comprehension(target=target, iter=iterable, ifs=[], is_async=0)])
+
+    def options(self, items):
+        return items[0] or []
+
+    def _keywords(self, options, example):
+        keywords = [option for option in options or [] if isinstance(option, ast.keyword)]
+        if len(keywords) != len(options or []):
+            raise GlorpSemanticError(f"{example.split('(')[0]} settings are named, e.g. {example}")
+        return keywords
+
+    def par_each(self, items):
+        options, var_name, iterable, *rest = items
+        arguments = ast.arguments(posonlyargs=[], args=[ast.arg(arg=identifier(var_name))], kwonlyargs=[], kw_defaults=[], defaults=[])
+        keywords = self._keywords(options, 'par(workers: 4, chunk: 100, ordered: false, pool: "thread")')
+        if len(rest) == 2:
+            keywords.append(ast.keyword(arg='where', value=ast.Lambda(args=arguments, body=rest[0])))
+        # Both functions become lambdas over the loop variable; par_map ships them to the workers
+        return call('par_map', ast.Lambda(args=arguments, body=self._body_value(rest[-1])), iterable, keywords=keywords)
 
     def parameters(self, items):
-        return ", ".join(map(str, items))
+        args, defaults = [], []
+        for item in items:
+            if isinstance(item, tuple):
+                arg, default = item
+                defaults.append(default)
+            else:
+                if defaults:
+                    raise GlorpSemanticError(f"Parameter '{identifier(item)}' without a default follows one with a default")
+                arg = ast.arg(arg=identifier(item))
+            args.append(arg)
+        return ast.arguments(posonlyargs=[], args=args, kwonlyargs=[], kw_defaults=[], defaults=defaults)
 
     def call(self, items):
-        func_name: str = items[0]
-        args_str = items[1] if len(items) > 1 else ""
-        return f"{func_name}({args_str})"
-    
-    def neg(self, n): return f"-{n[0]}"
-    def pos(self, n): return str(n[0])
-        
-    def safe_div(self, items): return f"{items[0]} / {items[1]}"
-    def globalise(self, items): return f'global {items[0]}'
+        func_name = items[0]
+        arguments = items[1] if len(items) > 1 and items[1] is not None else []
+        if not isinstance(arguments, list):
+            arguments = [arguments]
+        args = [argument for argument in arguments if not isinstance(argument, ast.keyword)]
+        keywords = [argument for argument in arguments if isinstance(argument, ast.keyword)]
+        return call(func_name, *args, keywords=keywords)
+
+    def neg(self, n): return ast.UnaryOp(op=ast.USub(), operand=to_expr(n[0]))
+    def pos(self, n): return to_expr(n[0])
+
+    def _chain(self, item):
+        if isinstance(item, Infix):
+            return item
+        return getattr(item, 'glorp_infix', None) or [item]
+
+    def safe_div(self, items): return Infix([*self._chain(items[0]), '/', *self._chain(items[1])])
+    def globalise(self, items): return ast.Global(names=[identifier(items[0])])
     def symbol(self, items): return items[0]
-    def expression(self, items: list[str]):  return f'{items[0]}'
-    def logic_is(self, items): return f'Object({items[0]}).__is__({items[1]})'
-    def logic_or(self, items): return f"({f' or '.join(items)})" if len(items) > 1 else items[0]
-    def logic_and(self, items): return f"({f' and '.join(items)})" if len(items) > 1 else items[0]
+    def expression(self, items): return to_expr(items[0])
+    def logic_is(self, items): return call(ast.Attribute(value=call('Object', to_expr(items[0])), attr='__is__', ctx=ast.Load()), to_expr(items[1]))
+    def logic_or(self, items): return ast.BoolOp(op=ast.Or(), values=items) if len(items) > 1 else items[0]
+    def logic_and(self, items): return ast.BoolOp(op=ast.And(), values=items) if len(items) > 1 else items[0]
     def logic_not(self, items): return items[0]
-    def logic_unary_not(self, items): return f"(not ({items[0]}))"
-    def comparison(self, items): return f"({items[0]} {items[1]} {items[2]})" if len(items) > 1 else items[0]
-    def arith_exp(self, items): return " ".join(str(i) for i in items)
-    def term(self, items): return " ".join(str(i) for i in items)
-    def factor(self, items): return f"({items[0]})" if isinstance(items[0], str) and ' ' in items[0] else items[0]
-    def arguments(self, items): return ", ".join(map(str, items))
-    def array(self, items): return f"[{', '.join(map(str, items[0]))}]" if items else "[]"
-    def take_stmt(self, items): return f'take({items[0]}, {items[1]})'
-    def dictionary(self, items): return "{" + ', '.join(map(str, items[0])) + "}" if items else "{}"
-    def array_elements(self, items): return items
-    def dictionary_elements(self, items): return items
-    def dictionary_element(self, items): return f"{items[0]}: {items[1]}"
-    def element(self, items): return f'{items[0]}[{items[1].lstrip('num')}]'
+    def logic_unary_not(self, items): return ast.UnaryOp(op=ast.Not(), operand=items[0])
+    def comparison(self, items):
+        if len(items) == 1:
+            return to_expr(items[0])
+        return ast.Compare(left=to_expr(items[0]), ops=[comparison_operators[items[1]]()], comparators=[to_expr(items[2])])
+    def arith_exp(self, items): return Infix([part for item in items for part in self._chain(item)]) if len(items) > 1 else items[0]
+    def term(self, items): return Infix([part for item in items for part in self._chain(item)]) if len(items) > 1 else items[0]
+    def factor(self, items):
+        node = to_expr(items[0])
+        if hasattr(node, 'glorp_infix'):
+            del node.glorp_infix  # parenthesised, so it stays grouped
+        return node
+    def arguments(self, items): return list(items)
+    def array(self, items): return ast.List(elts=items[0] if items and items[0] is not None else [], ctx=ast.Load())
+    def take_stmt(self, items): return call('take', items[0], items[1])
+    def dictionary(self, items):
+        elements = items[0] if items and items[0] is not None else []
+        return ast.Dict(keys=[key for key, _ in elements], values=[value for _, value in elements])
+    def array_elements(self, items): return list(items)
+    def dictionary_elements(self, items): return list(items)
+    def dictionary_element(self, items): return (items[0], items[1])
+    def element(self, items):
+        index = items[1]
+        # Literal indexes are written as plain ints, a num() would be rejected as a list index
+        if isinstance(index, ast.Call) and isinstance(index.func, ast.Name) and index.func.id == 'num':
+            index = index.args[0]
+        elif isinstance(index, ast.UnaryOp) and isinstance(index.operand, ast.Call) and isinstance(index.operand.func, ast.Name) and index.operand.func.id == 'num':
+            index = ast.UnaryOp(op=index.op, operand=index.operand.args[0])
+        return ast.Subscript(value=self.name([items[0]]), slice=index, ctx=ast.Load())
     def op_bool(self, items): return items[0]
     def op_exp(self, items): return items[0]
     def op_term(self, items): return items[0]
@@ -615,12 +1123,357 @@ class Render(Component):
     def OP_GE(self, token): return token.value
     def OP_LE(self, token): return token.value
     def NAME(self, n): return n
-    def INF(self, _): return 'float("inf")'
-    def pos_inf(self, _): return 'float("inf")'
-    def neg_inf(self, _): return 'float("-inf")'
-    def NUMBER(self, num): return f'num({num.value})'
-    def STRING(self, s): return s.value
-    def format_string(self, s): return f"f{s[0]}"
+    def INF(self, _): return call('float', ast.Constant(value='inf'))
+    def pos_inf(self, _): return call('float', ast.Constant(value='inf'))
+    def neg_inf(self, _): return call('float', ast.Constant(value='-inf'))
+    def NUMBER(self, token):
+        value = ast.Constant(value=float(token.value) if any(c in token.value for c in '.eE') else int(token.value))
+        number = call('num', value)
+        return at(token, number, number.func, value)
+    def STRING(self, token): return at(token, ast.Constant(value=ast.literal_eval(token.value)))
+    def format_string(self, s):
+        joined = clear_locations(ast.parse('f' + repr(s[0].value), mode='eval').body)
+        return locate(joined, s[0].lineno, s[0].col_offset)
+
+folding_operators = {
+    ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b, ast.Mult: lambda a, b: a * b,
+    ast.Mod: lambda a, b: a % b, ast.FloorDiv: lambda a, b: a // b, ast.Pow: lambda a, b: a ** b,
+    ast.Eq: lambda a, b: a == b, ast.NotEq: lambda a, b: a != b, ast.Lt: lambda a, b: a < b,
+    ast.LtE: lambda a, b: a <= b, ast.Gt: lambda a, b: a > b, ast.GtE: lambda a, b: a >= b,
+}
+
+# Operators that NumPy applies element-wise with the same result as Python applies them to each number
+vector_operators = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+vector_comparisons = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+# Calls over an `each` that glorp_runtime.vector can run on a whole array, when they are the builtins
+vector_collectors = ('list', 'sum', 'min', 'max', 'any', 'all')
+
+def imported_modules(module):
+    """The names that only ever hold a module imported with `use`, which nothing in the module rebinds."""
+    imported, rebound = set(), set()
+    for node in ast.walk(module):
+        if isinstance(node, ast.Import):
+            imported.update(alias.asname or alias.name.partition('.')[0] for alias in node.names)
+        elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            rebound.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            rebound.add(node.name)
+        elif isinstance(node, ast.arg):
+            rebound.add(node.arg)
+        elif isinstance(node, ast.ImportFrom):
+            rebound.update(alias.asname or alias.name for alias in node.names)
+    return imported - rebound
+
+def is_number(value):
+    return type(value) in (int, float)
+
+def chain_op(values, op):
+    """values[0] op values[1] op ..., as a left-nested BinOp."""
+    result = values[0]
+    for value in values[1:]:
+        result = ast.BinOp(left=result, op=op(), right=value)
+    return result
+
+def num_literal(node):
+    """The literal inside a `num(<literal>)` call, or None for any other node."""
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'num'
+            and len(node.args) == 1 and not node.keywords and isinstance(node.args[0], ast.Constant)
+            and type(node.args[0].value) in (int, float)):
+        return node.args[0].value
+    return None
+
+class Optimizer(ast.NodeTransformer):
+    """Rewrites a generated module between transform and compile.
+
+    Level 1 folds constant expressions, unboxes `num(...)` literals that only feed arithmetic or
+    comparisons, where num's __str__ and __truediv__ can never be reached, runs `for` loops with
+    literal whole-number bounds on a plain range, and lets element-wise `each` comprehensions run as
+    NumPy array expressions when their data is an array (see glorp_runtime.vector). Level 2 also hoists the
+    num literals that are left out of loops, so they are built once instead of on every iteration.
+    """
+
+    def __init__(self, level):
+        self.level = level
+        self.hoisted = 0
+        self.modules = set()
+
+    def optimize(self, module):
+        self.modules = imported_modules(module)
+        module = self.visit(module)
+        if self.level >= 2:
+            module.body = self.hoist(module.body)
+        return module
+
+    def _value(self, node):
+        """(True, value) for operands whose value is known at compile time; num literals act as the float they subclass."""
+        literal = num_literal(node)
+        if literal is not None:
+            return True, float(literal)
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float, str, bool):
+            return True, node.value
+        return False, None
+
+    def _constant(self, value, like):
+        if type(value) not in (int, float, str, bool) or (isinstance(value, str) and len(value) > 4096):
+            return None
+        return ast.copy_location(ast.Constant(value=value), like)
+
+    def _unbox(self, node):
+        literal = num_literal(node)
+        if literal is None:
+            return node
+        return ast.copy_location(ast.Constant(value=float(literal)), node)
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Div):
+            # num.__truediv__ divides the raw values and turns x / 0 into num("inf"), so only exact literal pairs fold
+            left, right = num_literal(node.left), num_literal(node.right)
+            if left is not None and right is not None and right != 0:
+                return self._constant(left / right, node) or node
+            # A plain float on the left divides with float semantics, so the divisor's box is never looked at
+            if isinstance(node.left, ast.Constant) and type(node.left.value) in (int, float):
+                (known, divisor) = self._value(node.right)
+                if known and type(divisor) in (int, float) and divisor != 0:
+                    return self._constant(node.left.value / divisor, node) or node
+                node.right = self._unbox(node.right)
+            return node
+
+        operator = folding_operators.get(type(node.op))
+        if operator is None:
+            return node
+        (left_known, left), (right_known, right) = self._value(node.left), self._value(node.right)
+        left_number, right_number = left_known and is_number(left), right_known and is_number(right)
+        # Only numbers fold: "%s" % 5 formats num(5) through num.__str__, which a folded 5.0 would skip
+        if left_number and right_number:
+            try:
+                folded = self._constant(operator(left, right), node)
+            except (ArithmeticError, TypeError, ValueError):
+                folded = None
+            if folded is not None:
+                return folded
+        if isinstance(node.op, ast.Mod):
+            # x % 5 may be string formatting, so a box only goes when the other side is known to be a number
+            if right_number:
+                node.left = self._unbox(node.left)
+            if left_number:
+                node.right = self._unbox(node.right)
+            return node
+        node.left, node.right = self._unbox(node.left), self._unbox(node.right)
+        return node
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        known, value = self._value(node.operand)
+        if not known:
+            return node
+        try:
+            if isinstance(node.op, ast.USub):
+                return self._constant(-value, node) or node
+            if isinstance(node.op, ast.Not):
+                return self._constant(not value, node) or node
+        except TypeError:
+            pass
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if not all(type(op) in folding_operators for op in node.ops):
+            return node
+        operands = [node.left, *node.comparators]
+        values = [self._value(operand) for operand in operands]
+        if all(known for known, _ in values):
+            try:
+                result = all(folding_operators[type(op)](a[1], b[1]) for op, a, b in zip(node.ops, values, values[1:]))
+                return self._constant(result, node)
+            except TypeError:
+                pass
+        node.left = self._unbox(node.left)
+        node.comparators = [self._unbox(operand) for operand in node.comparators]
+        return node
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        values = [self._value(operand) for operand in node.values]
+        if not all(known for known, _ in values):
+            return node
+        # and/or evaluate to one of their operands, which keeps its own (possibly boxed) form
+        for operand, (_, value) in zip(node.values, values):
+            if bool(value) == isinstance(node.op, ast.Or):
+                return operand
+        return node.values[-1]
+
+    def visit_For(self, node):
+        self.generic_visit(node)
+        # for i from 1 to 10 with literal whole-number bounds runs on a C range; values stay floats like grange's
+        if isinstance(node.iter, ast.Call) and isinstance(node.iter.func, ast.Name) and node.iter.func.id == 'grange' and len(node.iter.args) == 2 and not node.iter.keywords:
+            start, end = (num_literal(arg) for arg in node.iter.args)
+            if isinstance(start, int) and isinstance(end, int):
+                step = 1 if end >= start else -1
+                bounds = [ast.Constant(value=start), ast.Constant(value=end + step)] + ([ast.Constant(value=step)] if step < 0 else [])
+                node.iter = ast.copy_location(call('map', load('float'), call('range', *bounds)), node.iter)
+        return node
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        return self._vectorize(node) or node
+
+    def _vectorize(self, node):
+        """vector_each(...) for list(...), sum(...), min(...), max(...), any(...) or all(...) of an `each`
+        whose body and condition are element-wise, or None for any other call."""
+        if not (isinstance(node.func, ast.Name) and node.func.id in vector_collectors and len(node.args) == 1
+                and not node.keywords and isinstance(node.args[0], ast.GeneratorExp)):
+            return None
+        generator = node.args[0]
+        loop = generator.generators[0]
+        if len(generator.generators) != 1 or loop.is_async or not isinstance(loop.target, ast.Name) or len(loop.ifs) > 1 or awaits(generator):
+            return None
+        var, operands = loop.target.id, []
+        element = self._vector_expr(generator.elt, var, operands)
+        condition = self._vector_expr(loop.ifs[0], var, operands) if loop.ifs else None
+        if element is None or (loop.ifs and condition is None) or not any(isinstance(n, ast.Name) and n.id == var for n in ast.walk(generator.elt)):
+            return None
+
+        def arguments(*names):
+            return ast.arguments(posonlyargs=[], args=[ast.arg(arg=name) for name in names], kwonlyargs=[], kw_defaults=[], defaults=[])
+        values = [f'_glorp_v{i}' for i in range(len(operands))]
+        fallback = copy.deepcopy(node)
+        fallback.args[0].generators[0].iter = load('_glorp_items')
+        # The same loop reading the operand values vector_each has already evaluated, instead of evaluating them again
+        with_values = copy.deepcopy(fallback)
+        replacer = OperandValues(operands)
+        with_values.args[0].elt = replacer.visit(with_values.args[0].elt)
+        with_values.args[0].generators[0].ifs = [replacer.visit(test) for test in with_values.args[0].generators[0].ifs]
+        lowered = call('vector_each', load(node.func.id), loop.iter,
+                       ast.Lambda(args=arguments(), body=ast.Tuple(elts=operands, ctx=ast.Load())),
+                       ast.Lambda(args=arguments(var, '_glorp_where', *values), body=element),
+                       ast.Lambda(args=arguments(var, '_glorp_where', *values), body=condition) if condition else ast.Constant(value=None),
+                       ast.Lambda(args=arguments('_glorp_items', *values), body=with_values),
+                       ast.Lambda(args=arguments('_glorp_items'), body=fallback))
+        return ast.copy_location(lowered, node)
+
+    def _vector_expr(self, node, var, operands):
+        """node with the loop variable standing for the whole array, or None if it is not element-wise.
+        Other names, functions of imported modules and num literals become operands: evaluated once, checked at run time."""
+        def lower(child):
+            return self._vector_expr(child, var, operands)
+
+        if isinstance(node, ast.Name) and node.id == var:
+            return load(var)
+        if isinstance(node, (ast.Name, ast.Attribute)) or num_literal(node) is not None:
+            return self._operand(node, var, operands)
+        if isinstance(node, ast.Constant):
+            return copy.deepcopy(node) if type(node.value) in (int, float, bool) else None
+        if isinstance(node, ast.BinOp) and isinstance(node.op, vector_operators):
+            left, right = lower(node.left), lower(node.right)
+            return None if left is None or right is None else ast.BinOp(left=left, op=node.op, right=right)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = lower(node.operand)
+            return None if operand is None else ast.UnaryOp(op=node.op, operand=operand)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not) and isinstance(node.operand, ast.Compare):
+            operand = lower(node.operand)
+            return None if operand is None else ast.UnaryOp(op=ast.Invert(), operand=operand)
+        if isinstance(node, ast.Compare) and all(isinstance(op, vector_comparisons) for op in node.ops):
+            # a < b < c is (a < b) & (b < c); the operands cannot have side effects, so b may be evaluated twice
+            values = [lower(value) for value in (node.left, *node.comparators)]
+            if None in values:
+                return None
+            pairs = [ast.Compare(left=left, ops=[op], comparators=[right]) for op, left, right in zip(node.ops, values, values[1:])]
+            return chain_op(pairs, ast.BitAnd)
+        if isinstance(node, ast.BoolOp) and all(isinstance(value, ast.Compare) for value in node.values):
+            # and/or of comparisons only ever combine booleans, which & and | do element-wise
+            values = [lower(value) for value in node.values]
+            if None in values:
+                return None
+            return chain_op(values, ast.BitAnd if isinstance(node.op, ast.And) else ast.BitOr)
+        if isinstance(node, ast.IfExp):
+            parts = [lower(part) for part in (node.test, node.body, node.orelse)]
+            return None if None in parts else call('_glorp_where', *parts)
+        if isinstance(node, ast.Call) and not node.keywords and isinstance(node.func, (ast.Name, ast.Attribute)):
+            function = self._operand(node.func, var, operands)
+            args = [lower(arg) for arg in node.args]
+            return None if function is None or None in args else ast.Call(func=function, args=args, keywords=[])
+        return None
+
+    def _operand(self, node, var, operands):
+        # Reading a name has no side effects, and neither has looking up a function such as np.sqrt in an
+        # imported module. Any other attribute may be a property, which the loop reads once per element.
+        if isinstance(node, ast.Attribute):
+            if not (isinstance(node.value, ast.Name) and node.value.id in self.modules and node.value.id != var):
+                return None
+        elif not (isinstance(node, ast.Name) and node.id != var) and num_literal(node) is None:
+            return None
+        key = ast.dump(node)
+        for i, operand in enumerate(operands):
+            if ast.dump(operand) == key:
+                return load(f'_glorp_v{i}')
+        operands.append(copy.deepcopy(node))
+        return load(f'_glorp_v{len(operands) - 1}')
+
+    def hoist(self, body):
+        """Moves the num literals of each outermost loop in a statement list in front of that loop."""
+        result = []
+        for statement in body:
+            if isinstance(statement, (ast.For, ast.While)):
+                literals = {}
+                LiteralHoister(self, literals).visit_loop(statement)
+                for name, literal in literals.values():
+                    result.append(ast.copy_location(ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=literal), statement))
+            elif isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                statement.body = self.hoist(statement.body)
+            elif isinstance(statement, ast.ClassDef):
+                for member in statement.body:
+                    if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        member.body = self.hoist(member.body)
+            elif isinstance(statement, ast.Match):
+                for case in statement.cases:
+                    case.body = self.hoist(case.body)
+            else:
+                for field in ('body', 'orelse', 'finalbody'):
+                    if isinstance(getattr(statement, field, None), list):
+                        setattr(statement, field, self.hoist(getattr(statement, field)))
+                for handler in getattr(statement, 'handlers', []):
+                    handler.body = self.hoist(handler.body)
+            result.append(statement)
+        return result
+
+class LiteralHoister(ast.NodeTransformer):
+    """Replaces the num literals evaluated on every pass of one loop with names bound before it."""
+
+    def __init__(self, optimizer, literals):
+        self.optimizer = optimizer
+        self.literals = literals
+
+    def visit_loop(self, loop):
+        if isinstance(loop, ast.While):
+            loop.test = self.visit(loop.test)
+        loop.body = [self.visit(statement) for statement in loop.body]
+        loop.orelse = [self.visit(statement) for statement in loop.orelse]
+
+    def visit_Call(self, node):
+        literal = num_literal(node)
+        if literal is None:
+            return self.generic_visit(node)
+        key = (type(literal), literal)
+        if key not in self.literals:
+            self.literals[key] = (f"_glorp_num_{self.optimizer.hoisted}", node)
+            self.optimizer.hoisted += 1
+        return ast.copy_location(ast.Name(id=self.literals[key][0], ctx=ast.Load()), node)
+
+    # Nested scopes do not run once per iteration
+    def visit_FunctionDef(self, node): return node
+    def visit_AsyncFunctionDef(self, node): return node
+    def visit_ClassDef(self, node): return node
+
+class OperandValues(ast.NodeTransformer):
+    """Replaces the operands of a vectorized comprehension with the names their values are passed in as."""
+
+    def __init__(self, operands):
+        self.names = {ast.dump(operand): f'_glorp_v{i}' for i, operand in enumerate(operands)}
+
+    def visit(self, node):
+        name = self.names.get(ast.dump(node)) if isinstance(node, ast.expr) else None
+        return super().visit(node) if name is None else ast.copy_location(load(name), node)
 
 class GlorpError(Exception):
     def __init__(self, message, line=None, column=None):
@@ -649,25 +1502,37 @@ def handle_runtime_error(e: Exception, fake_filename: str, source_file: str):
     import traceback
     tb = e.__traceback__
     
+    # The innermost frame in any Glorp file, so errors inside imported modules point into that module
     last_glorp_frame = None
     for frame in traceback.extract_tb(tb):
-        if frame.filename == fake_filename:
+        if frame.filename in source_files:
             last_glorp_frame = frame
+    if last_glorp_frame is not None:
+        fake_filename, source_file = last_glorp_frame.filename, source_files[last_glorp_frame.filename]
 
     error_type = type(e).__name__
     error_msg = str(e)
 
-    if last_glorp_frame:
-        line_num: int | None = last_glorp_frame.lineno
-        code_line: str = linecache.getline(fake_filename, line_num if line_num else 0).strip()
-
+    line_num: int | None = last_glorp_frame.lineno if last_glorp_frame else None
+    raw_line: str = linecache.getline(fake_filename, line_num if line_num else 0).rstrip()
+    code_line = raw_line.strip()
+
+    if code_line:
+        location = f"  [{line_num}] > "
+        marker = ''
+        # Generated code carries the column span of the Glorp expression, so the failing part can be underlined
+        if last_glorp_frame.colno is not None and last_glorp_frame.end_lineno == line_num and last_glorp_frame.end_colno:
+            indent = len(raw_line) - len(code_line)
+            begin, end = last_glorp_frame.colno - indent, min(last_glorp_frame.end_colno - indent, len(code_line))
+            if 0 <= begin < end and (begin, end) != (0, len(code_line)):
+                marker = ' ' * (len(location) + begin) + '^' * (end - begin) + '\n'
         friendly_message = (
             f"Runtime Error in '{source_file}'\n\n"
             f"  Error Type: {error_type}\n"
             f"  Details: {error_msg}\n\n"
             f"The error occurred while executing the logic from your script.\n"
-            f"The problematic operation in the generated Python code was:\n"
-            f"  [{line_num}] > {'\n'.join(code_line.split('#'))}\n\n"
+            f"The problematic line in your Glorp code was:\n"
+            f"{location}{code_line}\n{marker}\n"
             f"Common causes for this error include division by zero, accessing a list element that doesn't exist, or type mismatches during an operation."
         )
         raise GlorpRuntimeError(friendly_message) from None
@@ -681,13 +1546,819 @@ def handle_runtime_error(e: Exception, fake_filename: str, source_file: str):
         )
         raise GlorpRuntimeError(friendly_message) from None
 
+def add_epilogue(module, source_file, source_code):
+    """Appends the code that runs Main (and opens the window of a render block) to a program's module."""
+    main_args = "sys.argv" if mainargs else ""
+    # An async Main gets an event loop of its own
+    main_call = f"run_main(Main{', ' + main_args if main_args else ''})" if async_main else f"Main({main_args})"
+    epilogue = ast.parse(f'''
+try:
+    res = {main_call}
+    {f'''app = App(build=Render, name = "{os.path.splitext(os.path.basename(source_file))[0]}")
+
+    app.run_in_window()''' if gui else ''}
+    if res: out("Programm finished with the result of ", res, "\\n")
+except KeyboardInterrupt:
+    out("Interrupted by user.\\n")
+    sys.exit(1)
+''')
+    # Past the last Glorp line, so errors raised by the epilogue itself are not pinned on user code
+    module.body += clear_locations(epilogue).body
+    locate(module, source_code.count('\n') + 2)
+
+def write_imported_modules(imports, out_dir, written=None):
+    """Writes each imported Glorp module as a .py file under out_dir/_glorp_modules, so to-py output runs with plain Python imports."""
+    written = set() if written is None else written
+    for dotted_name in imports:
+        filename = find_module_file(dotted_name)
+        if dotted_name in written or filename is None or os.path.isdir(filename):
+            continue
+        written.add(dotted_name)
+        with open(filename, encoding='utf8') as f:
+            module, module_imports = generate_module(f.read(), dotted_name.rpartition('.')[2])
+        path = os.path.join(out_dir, module_package, *dotted_name.split('.')) + '.py'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf8') as f:
+            f.write(ast.unparse(finish_module(module)) + '\n')
+        write_imported_modules(module_imports, out_dir, written)
+
+def build_module(dotted_name, filename, entry, settings, sources=False):
+    """Transpiles and compiles one module of a `glorp build`, returning its marshalled code (with sources, the
+    Python source too, which the code is then compiled from) and the Glorp modules it imports.
+
+    Runs in a worker process, so the transformer's global state is reset and settings carries the
+    project root, parser and optimization level for workers that did not fork from the build.
+    """
+    global mainargs, async_main, gui, parse_mode, opt_level
+    module_search_path[:], parse_mode, opt_level = settings
+    mainargs = async_main = gui = False
+    immutes.clear()
+    with open(filename, encoding='utf8') as f:
+        source_code = f.read()
+    try:
+        module, imports = generate_module(source_code, "Runtime" if entry else dotted_name.rpartition('.')[2])
+        if entry:
+            add_epilogue(module, filename, source_code)
+        module = finish_module(module)
+        if sources:
+            python_source = ast.unparse(module) + '\n'
+            return (python_source, marshal.dumps(compile(python_source, filename, 'exec'))), imports
+        code = compile(module, filename, 'exec')
+    except lark.exceptions.VisitError as e:
+        if isinstance(e.orig_exc, GlorpError):
+            raise GlorpError(f"{filename}: {e.orig_exc}") from None
+        raise
+    except GlorpError as e:
+        raise GlorpError(f"{filename}: {e}") from None
+    return marshal.dumps(code), imports
+
+def find_cycle(graph):
+    """An import cycle in graph (module -> the modules it imports), as the modules along it, or None."""
+    state = {}
+    def visit(name, path):
+        state[name] = 'open'
+        path.append(name)
+        for dependency in graph.get(name, ()):
+            if state.get(dependency) == 'open':
+                return path[path.index(dependency):] + [dependency]
+            if dependency not in state:
+                cycle = visit(dependency, path)
+                if cycle:
+                    return cycle
+        path.pop()
+        state[name] = 'done'
+        return None
+
+    for name in sorted(graph):
+        if name not in state:
+            cycle = visit(name, [])
+            if cycle:
+                return cycle
+    return None
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def write_pyc(path, code, source=None):
+    """Writes marshalled code as a .pyc. Without source, Python imports (or runs) it with no source file next to
+    it; with source, it is that source's cached bytecode, hash-based and unchecked, so Python loads it without
+    reading the source or comparing timestamps (which copying a package into a container changes)."""
+    if source is None:
+        # Flags and the source mtime and size, which are not checked for a .pyc without a source
+        header = bytes(12)
+    else:
+        header = (1).to_bytes(4, 'little') + importlib.util.source_hash(source)
+    write_file(path, importlib.util.MAGIC_NUMBER + header + code)
+
+def copy_runtime(out_dir):
+    """Copies glorp_runtime into out_dir with its bytecode, leaving files that are already up to date alone."""
+    runtime = os.path.join(GLORP_DIR, 'glorp_runtime')
+    for name in sorted(os.listdir(runtime)):
+        if not name.endswith('.py'):
+            continue
+        target = os.path.join(out_dir, 'glorp_runtime', name)
+        with open(os.path.join(runtime, name), 'rb') as f:
+            source = f.read()
+        try:
+            with open(target, 'rb') as f:
+                if f.read() == source:
+                    continue
+        except OSError:
+            pass
+        write_file(target, source)
+        write_pyc(importlib.util.cache_from_source(target), marshal.dumps(compile(source, target, 'exec')), source)
+
+def job_count(args):
+    """The process count a -j=/--jobs= option in args asks for, or None (one per CPU) without one."""
+    value = next((arg.partition('=')[2] for arg in args if arg.startswith(('-j=', '--jobs='))), None)
+    if value is None:
+        return None
+    try:
+        jobs = int(value)
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        raise GlorpError(f"-j takes a whole number of processes, at least 1, not '{value}'")
+    return jobs
+
+def build(entry_file, out_dir=None, jobs=None, sources=False):
+    """`glorp build`: compiles a program and every Glorp module it imports into a directory of .pyc files.
+    With sources (`glorp to-py --package`) the directory holds a Python module per Glorp module instead, the
+    program's own module being __main__.py, each with its bytecode in __pycache__.
+
+    The import graph is discovered from the entry file while its modules are transpiled, each in a worker
+    process as soon as the module that imports it has been. A module is only transpiled again when its
+    source (or the file one of its imports resolves to) changed since the last build into out_dir.
+    Returns the number of modules transpiled and the number in the program.
+    """
+    import json, multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    global parser
+    root = os.path.dirname(os.path.abspath(entry_file))
+    out_dir = os.path.abspath(out_dir or os.path.join(root, 'dist' if sources else 'build'))
+    module_search_path[:] = [root]
+    settings = ([root], parse_mode, opt_level)
+    manifest_path = os.path.join(out_dir, '.glorp-build.json')
+    try:
+        with open(manifest_path, encoding='utf8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    records, compiled, futures = {}, {}, {}
+    entry_name = os.path.splitext(os.path.basename(entry_file))[0]
+
+    def output_paths(name):
+        base = os.path.join(out_dir, name) if name == entry_name else os.path.join(out_dir, module_package, *name.split('.'))
+        if not sources:
+            return [base + '.pyc']
+        path = os.path.join(out_dir, '__main__.py') if name == entry_name else base + '.py'
+        return [path, importlib.util.cache_from_source(path)]
+    if parse_mode == 'lalr' and parser is None:
+        # Loaded before the workers fork, so each of them has it already
+        parser = load_lalr_parser()
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        def schedule(name, filename, entry):
+            with open(filename, encoding='utf8') as f:
+                source_code = f.read()
+            flags = [parse_mode, f'-O{opt_level}'] + (['entry'] if entry else []) + (['sources'] if sources else [])
+            key = cache_key(source_code, filename, flags)
+            record = previous.get(name)
+            if (record and record['key'] == key and all(map(os.path.isfile, output_paths(name)))
+                    and all(find_module_file(dotted) == path for dotted, path in record['imports'].items())):
+                records[name] = record
+                discover(record['imports'])
+            else:
+                futures[executor.submit(build_module, name, filename, entry, settings, sources)] = (name, key)
+
+        def discover(imports):
+            for dotted in imports:
+                filename = find_module_file(dotted)
+                # A directory is a package of modules, which Python imports as a namespace package
+                if dotted not in records and filename and os.path.isfile(filename):
+                    records[dotted] = None
+                    schedule(dotted, filename, False)
+
+        records[entry_name] = None
+        schedule(entry_name, os.path.abspath(entry_file), True)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, key = futures.pop(future)
+                try:
+                    code, imports = future.result()
+                except BaseException:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                compiled[name] = code
+                records[name] = {'key': key, 'imports': {dotted: find_module_file(dotted) for dotted in imports}}
+                discover(imports)
+
+    cycle = find_cycle({name: [dotted for dotted in record['imports'] if dotted in records] for name, record in records.items()})
+    if cycle:
+        raise GlorpError(f"Import cycle: {' -> '.join(cycle)}")
+
+    for name, payload in compiled.items():
+        if sources:
+            python_source, code = payload
+            path, cached = output_paths(name)
+            write_file(path, python_source.encode('utf8'))
+            write_pyc(cached, code, python_source.encode('utf8'))
+        else:
+            write_pyc(output_paths(name)[0], payload)
+    for name in set(previous) - set(records):
+        for path in output_paths(name):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    # The generated code imports its helpers from glorp_runtime, so the build carries a copy of it
+    copy_runtime(out_dir)
+    with open(manifest_path, 'w', encoding='utf8') as f:
+        json.dump(records, f, indent=2, sort_keys=True)
+    return len(compiled), len(records)
+
+class GlorpProfiler:
+    """Time and call counts per Glorp function and source line, for `glorp profile`.
+
+    Generated code is compiled under the Glorp file's own line numbers, so the profile needs no
+    translation back from Python. sys.monitoring (Python 3.12+) gives per-line numbers and is switched
+    off for code outside Glorp files after its first event; older Pythons fall back to cProfile, which
+    only reports functions. A line's time leaves out the Glorp functions it calls, which report their
+    own lines, so recursion is not counted twice.
+    """
+
+    def __init__(self):
+        self.functions = {}
+        self.lines = {}
+        self.stack = []
+        self.active = {}
+        self.backend = None
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.begin = time.perf_counter()
+        monitoring = getattr(sys, 'monitoring', None)
+        if monitoring is None:
+            import cProfile
+            self.backend = cProfile.Profile()
+            self.backend.enable()
+            return self
+        try:
+            monitoring.use_tool_id(monitoring.PROFILER_ID, 'glorp profile')
+        except ValueError:
+            # cProfile would need the same tool id, so there is nothing to fall back to
+            raise GlorpError("glorp profile cannot run while another profiler is active") from None
+
+        self.backend = monitoring
+        events = monitoring.events
+        for event, callback in ((events.PY_START, self._start), (events.PY_RESUME, self._resume),
+                                (events.PY_RETURN, self._return), (events.PY_YIELD, self._return),
+                                (events.PY_UNWIND, self._unwind), (events.LINE, self._line)):
+            monitoring.register_callback(monitoring.PROFILER_ID, event, callback)
+        monitoring.set_events(monitoring.PROFILER_ID, events.PY_START | events.PY_RESUME | events.PY_RETURN
+                              | events.PY_YIELD | events.PY_UNWIND | events.LINE)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.begin
+        if self.backend is getattr(sys, 'monitoring', None):
+            monitoring = self.backend
+            monitoring.set_events(monitoring.PROFILER_ID, 0)
+            monitoring.free_tool_id(monitoring.PROFILER_ID)
+            monitoring.restart_events()
+            now = time.perf_counter()
+            while self.stack:
+                self._leave(self.stack[-1][0], now)
+        else:
+            import pstats
+            self.backend.disable()
+            for (filename, line, name), (_, calls, own, total, _) in pstats.Stats(self.backend).stats.items():
+                if filename in source_files:
+                    self.functions[(filename, line, name)] = [calls, total, own]
+
+    def _enter(self, code, call):
+        if code.co_filename not in source_files:
+            return sys.monitoring.DISABLE
+        now = time.perf_counter()
+        # [code, current line, when that line started, when the frame was entered, time spent in callees,
+        #  time spent in callees since the current line started]
+        self.stack.append([code, None, now, now, 0.0, 0.0])
+        self.active[code] = self.active.get(code, 0) + 1
+        if call:
+            self.functions.setdefault(code, [0, 0.0, 0.0])[0] += 1
+
+    def _start(self, code, offset):
+        return self._enter(code, True)
+
+    def _resume(self, code, offset):
+        return self._enter(code, False)
+
+    def _line(self, code, line):
+        if code.co_filename not in source_files:
+            return sys.monitoring.DISABLE
+        now = time.perf_counter()
+        if not self.stack or self.stack[-1][0] is not code:
+            self._enter(code, False)
+        frame = self.stack[-1]
+        if frame[1] is not None:
+            self.lines[(code.co_filename, frame[1])][1] += now - frame[2] - frame[5]
+        self.lines.setdefault((code.co_filename, line), [0, 0.0])[0] += 1
+        frame[1], frame[2], frame[5] = line, now, 0.0
+
+    def _return(self, code, offset, value):
+        if code.co_filename not in source_files:
+            return sys.monitoring.DISABLE
+        self._leave(code, time.perf_counter())
+
+    def _unwind(self, code, offset, exception):
+        if code.co_filename in source_files:
+            self._leave(code, time.perf_counter())
+
+    def _leave(self, code, now):
+        if not self.stack or self.stack[-1][0] is not code:
+            return
+        _, line, line_begin, entered, in_callees, line_in_callees = self.stack.pop()
+        if line is not None:
+            self.lines[(code.co_filename, line)][1] += now - line_begin - line_in_callees
+        elapsed = now - entered
+        stats = self.functions.setdefault(code, [0, 0.0, 0.0])
+        self.active[code] -= 1
+        # Recursive calls are inside the outermost one, whose time already covers them
+        if not self.active[code]:
+            stats[1] += elapsed
+        stats[2] += elapsed - in_callees
+        if self.stack:
+            self.stack[-1][4] += elapsed
+            self.stack[-1][5] += elapsed
+
+    def report(self, limit=20):
+        def function_name(filename, name):
+            if name == '<module>':
+                return '(module body)'
+            if name.startswith('_glorp_handler_for_'):
+                return f"watch {name[len('_glorp_handler_for_'):]}"
+            return name
+
+        functions = []
+        for key, (calls, total, own) in self.functions.items():
+            if isinstance(key, tuple):
+                filename, line, name = key
+            else:
+                filename, line, name = key.co_filename, key.co_firstlineno, key.co_qualname
+            functions.append((total, own, calls, f"{source_files[filename]}:{line}", function_name(filename, name)))
+        functions.sort(reverse=True)
+
+        lines = [f"Profile ({self.elapsed * 1000:.2f} ms in total, "
+                 f"{'per line' if self.lines else 'per function only, per-line numbers need Python 3.12+'})",
+                 f"  {'function':<28} {'location':<28} {'calls':>8} {'total ms':>10} {'self ms':>10}"]
+        for total, own, calls, location, name in functions[:limit]:
+            lines.append(f"  {name[:28]:<28} {location[-28:]:<28} {calls:>8} {total * 1000:>10.2f} {own * 1000:>10.2f}")
+
+        if self.lines:
+            # Lines past the end of the file belong to the code that calls Main
+            hot = sorted(((key, stats) for key, stats in self.lines.items() if linecache.getline(*key).strip()),
+                         key=lambda item: -item[1][1])[:limit]
+            lines.append(f"  {'line':<28} {'hits':>8} {'total ms':>10}   code")
+            for (filename, line), (hits, total) in hot:
+                location = f"{source_files[filename]}:{line}"
+                code = linecache.getline(filename, line).strip()
+                lines.append(f"  {location[-28:]:<28} {hits:>8} {total * 1000:>10.2f}   {code[:60]}")
+        return '\n'.join(lines)
+
+def write_timing_report(destination, source_file, cached):
+    """Prints the -o report as text (-o), as JSON (-o=json), or writes the JSON to a file (-o=<file>)."""
+    import json
+    report = timer.report(source_file, cached)
+    if destination == 'text':
+        print('\n' + timer.text(report))
+    elif destination == 'json':
+        print(json.dumps(report, indent=2))
+    else:
+        with open(destination, 'w', encoding='utf8') as f:
+            json.dump(report, f, indent=2)
+
+def socket_path():
+    return os.environ.get('GLORP_SOCKET', os.path.join(cache_dir, 'serve.sock'))
+
+def handle_client(connection):
+    """Runs one client request, in a process forked from the warm server.
+
+    The client sends a JSON line with its argv, working directory and environment, together with its
+    stdin, stdout and stderr file descriptors, so the program reads and writes the client's terminal
+    directly. The worker answers with its pid (for forwarding Ctrl-C) and, once done, the exit status.
+    """
+    import json, socket, traceback
+    global started_at, imported_at
+    message, fds, _, _ = socket.recv_fds(connection, 1 << 20, 3)
+    request = json.loads(message)
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdin = open(0, encoding='utf8', closefd=False)
+    sys.stdout = open(1, 'w', encoding='utf8', closefd=False)
+    sys.stderr = open(2, 'w', encoding='utf8', closefd=False, buffering=1)
+    os.chdir(request['cwd'])
+    # The server imported glorp in its own directory, but `use` looks in the client's
+    search_path = module_search_path[:]
+    module_search_path[:] = [request['cwd']]
+    os.environ.clear()
+    os.environ.update(request['env'])
+    sys.argv = ['glorp'] + request['argv']
+    # Nothing was loaded for this run, so -o reports no import time
+    started_at = imported_at = time.perf_counter()
+    connection.sendall(json.dumps({'pid': os.getpid()}).encode() + b'\n')
+
+    status = 0
+    try:
+        main()
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        module_search_path[:] = search_path
+    # The forking server leaves with os._exit, which would skip the output flush and other exit hooks
+    atexit._run_exitfuncs()
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except OSError:
+            # e.g. the client's output was piped into `head`, which has exited
+            pass
+    connection.sendall(json.dumps({'status': status}).encode() + b'\n')
+
+def serve(options):
+    """`glorp serve`: keeps the parsers and runtime loaded and runs each client request in a fresh fork."""
+    import signal, socket, socketserver
+    global parser, earley_parser
+    if not hasattr(socket, 'AF_UNIX') or not hasattr(os, 'fork'):
+        raise GlorpError("glorp serve needs Unix sockets and fork(), which this system does not have")
+    path = next((option.partition('=')[2] for option in options if option.startswith('--socket=')), socket_path())
+
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.remove(path)
+        else:
+            raise GlorpError(f"A Glorp server is already listening on {path}")
+        finally:
+            probe.close()
+
+    parser = load_lalr_parser()
+    earley_parser = Lark(grammar, propagate_positions=True)
+    # Loaded once here, so programs with a render block start as quickly as console ones
+    uses_rio({'App'})
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Whoever can connect can run code as this user, so the socket is private
+    previous_umask = os.umask(0o177)
+    class Worker(socketserver.BaseRequestHandler):
+        def handle(self):
+            handle_client(self.request)
+
+    class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+        pass
+
+    try:
+        server = Server(path, Worker)
+    finally:
+        os.umask(previous_umask)
+
+    print(f"Glorp server listening on {path} (pid {os.getpid()}); stop it with Ctrl-C", flush=True)
+    # `kill` should clean up the socket too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+
+# Strings, comments and brackets, and the start of each line that could begin a top-level item (code in
+# column 0 other than a closing bracket or an else, elif or catch continuing the item above)
+item_tokens = re.compile(r'"(?:\\.|[^"\\\n])*"|//[^\n]*|/\*.*?(?:\*/|\Z)|([(\[{])|([)\]}])|^(?=[^\s/)\]}])(?!(?:else|elif|catch)\b)', re.M | re.S)
+
+def split_items(source_code):
+    """Splits Glorp source into its top-level items, as (first line, text) pairs: an item starts on a line
+    that begins in column 0 outside any bracket. Comments and blank lines stay with the item before them;
+    those at the top of the file go with the first item."""
+    starts, depth = [], 0
+    for token in item_tokens.finditer(source_code):
+        if token.group(1):
+            depth += 1
+        elif token.group(2):
+            depth = max(depth - 1, 0)
+        elif not token.group() and depth == 0:
+            starts.append(token.start())
+    if not starts:
+        return []
+    starts[0] = 0
+    items, line = [], 1
+    for begin, end in zip(starts, starts[1:] + [len(source_code)]):
+        items.append((line, source_code[begin:end]))
+        line += source_code.count('\n', begin, end)
+    return items
+
+def shift_lines(code, offset):
+    """A copy of code (and the functions and classes nested in it) that reports lines offset further down."""
+    consts = tuple(shift_lines(const, offset) if isinstance(const, types.CodeType) else const for const in code.co_consts)
+    return code.replace(co_firstlineno=code.co_firstlineno + offset, co_consts=consts)
+
+def functions_of(value):
+    """The plain functions a top-level value runs: itself, the one a memo wraps, or a class's methods."""
+    value = getattr(value, '__wrapped__', value)
+    if isinstance(value, types.FunctionType):
+        return [value]
+    if isinstance(value, type):
+        members = [getattr(member, 'fget', member) for member in vars(value).values()]
+        return [member for member in members if isinstance(member, types.FunctionType)]
+    return []
+
+# Class attributes that belong to the class object itself rather than to its Glorp definition
+class_internals = {'__dict__', '__weakref__', '__module__', '__qualname__', '__doc__'}
+
+def hot_swap(old, new):
+    """Moves new's behaviour into old where that is possible, so whatever still holds old (watch handlers,
+    instances, other functions' closures) runs the edited code. Returns the object the name should be bound to."""
+    if type(old) is types.FunctionType and type(new) is types.FunctionType and old.__code__.co_freevars == new.__code__.co_freevars:
+        old.__code__, old.__defaults__, old.__kwdefaults__ = new.__code__, new.__defaults__, new.__kwdefaults__
+        return old
+    if (isinstance(old, type) and isinstance(new, type) and type(old) is type(new) and old.__bases__ == new.__bases__
+            and vars(old).get('__slots__') == vars(new).get('__slots__')):
+        for name in set(vars(old)) - set(vars(new)) - class_internals:
+            if not isinstance(vars(old)[name], types.MemberDescriptorType):
+                delattr(old, name)
+        for name, value in vars(new).items():
+            if name not in class_internals and not isinstance(value, types.MemberDescriptorType):
+                setattr(old, name, value)
+        return old
+    return new
+
+def bound_names(statements):
+    """The module-level names a list of generated statements assigns."""
+    names = []
+    for statement in statements:
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.append(statement.name)
+        elif isinstance(statement, ast.Assign):
+            names += [target.id for target in statement.targets if isinstance(target, ast.Name)]
+        elif isinstance(statement, (ast.Import, ast.ImportFrom)):
+            names += [alias.asname or alias.name.partition('.')[0] for alias in statement.names]
+    return names
+
+class WatchedItem:
+    """One top-level item of a watched file with what was generated for it."""
+
+    def __init__(self, text, line, module, names, symbols, declares):
+        self.text = text
+        self.line = line
+        # The generated ast.Module until the item is compiled, then its code object
+        self.module = module
+        self.code = None
+        # Module-level names it binds, the symbols the transformer saw it declare and its private and
+        # immutable declarations (which every other item's code depends on)
+        self.names = names
+        self.symbols = symbols
+        self.declares = declares
+
+class WatchSession:
+    """Keeps a Glorp program loaded and applies edits to it, for `glorp watch`.
+
+    Each top-level item is parsed, transformed and compiled on its own and kept keyed by its text, so an
+    edit costs the items it touched, not the whole file. Changed functions are swapped into the running
+    module in place, so anything still holding the old function runs the new code. Editing a private or
+    immutable declaration changes the names every other item was generated with, so that (and editing an
+    imported Glorp module) rebuilds everything.
+    """
+
+    def __init__(self, source_file):
+        self.source_file = source_file
+        self.fake_filename = f"<{source_file}>"
+        self.items = []
+        self.private_vars = {}
+        self.module = None
+
+    def _transpile(self, transformer, text, line):
+        private_before, immutes_before = dict(transformer.private_vars), dict(immutes)
+        symbols_before = set(transformer.declared_symbols)
+        try:
+            tree = parse(text)
+            with timed('transform'):
+                module = transformer.transform(tree)
+        except lark.exceptions.VisitError as e:
+            if isinstance(e.orig_exc, GlorpError):
+                e.orig_exc.line = e.orig_exc.line and e.orig_exc.line + line - 1
+                raise e.orig_exc from None
+            raise
+        except GlorpError:
+            raise
+        except Exception:
+            return None
+        declares = {name for name, mangled in transformer.private_vars.items() if private_before.get(name) != mangled}
+        declares |= {name for name, mangled in immutes.items() if immutes_before.get(name) != mangled}
+        return WatchedItem(text, line, module, bound_names(module.body), transformer.declared_symbols - symbols_before, declares)
+
+    def _transpile_all(self, transformer, chunks):
+        items = [self._transpile(transformer, text, line) for line, text in chunks]
+        return None if None in items else items
+
+    def _compile(self, items, defined):
+        # Names the other items define are not free names of this one (which would make it import rio)
+        for item in items:
+            module = finish_module(item.module, defined)
+            ast.increment_lineno(module, item.line - 1)
+            with timed('compile'):
+                item.code = compile(module, self.fake_filename, 'exec')
+            item.module = None
+
+    def rebuild(self, source_code):
+        """Transpiles and runs every item into a fresh module."""
+        global gui
+        self.module = None
+        gui = False
+        immutes.clear()
+        transformer = Glorp("Runtime")
+        items = self._transpile_all(transformer, split_items(source_code))
+        if items is None:
+            # An item that does not parse alone: report the error against the whole file, or take the file as one item
+            immutes.clear()
+            transformer = Glorp("Runtime")
+            parse_source(source_code)
+            items = self._transpile_all(transformer, [(1, source_code)])
+        if gui:
+            raise GlorpError("glorp watch runs console programs; a program with a render block needs glorp run")
+        self._compile(items, {name for item in items for name in item.names})
+
+        self.items, self.private_vars = items, transformer.private_vars
+        self.module = types.ModuleType("glorp_runtime_module")
+        self.module.__file__ = self.fake_filename
+        sys.modules[self.module.__name__] = self.module
+        register_source(self.fake_filename, source_code, self.source_file)
+        try:
+            for item in items:
+                exec(item.code, self.module.__dict__)
+        except BaseException:
+            self.module = None
+            raise
+
+    def update(self, source_code):
+        """Applies a new version of the source, returning how many items were transpiled (None after a full rebuild)."""
+        if self.module is None:
+            self.rebuild(source_code)
+            return None
+
+        unchanged = {}
+        for item in self.items:
+            unchanged.setdefault(item.text, []).append(item)
+        chunks = split_items(source_code)
+        matched = [unchanged[text].pop(0) if unchanged.get(text) else None for _, text in chunks]
+        removed = [item for queue in unchanged.values() for item in queue]
+        if any(item.declares for item in removed):
+            self.rebuild(source_code)
+            return None
+
+        transformer = Glorp("Runtime")
+        transformer.private_vars = dict(self.private_vars)
+        transformer.declared_symbols |= {symbol for item in matched if item for symbol in item.symbols}
+        global gui
+        gui = False
+        items = []
+        for (line, text), item in zip(chunks, matched):
+            if item is None:
+                item = self._transpile(transformer, text, line)
+                if item is None or item.declares or gui:
+                    self.rebuild(source_code)
+                    return None
+            items.append(item)
+        self._compile([item for item in items if item.code is None], {name for item in items for name in item.names})
+
+        register_source(self.fake_filename, source_code, self.source_file)
+        namespace = self.module.__dict__
+        kept = {name for item in items for name in item.names}
+        for name in {name for item in removed for name in item.names} - kept:
+            namespace.pop(name, None)
+
+        self.items = items
+        # An item runs again when its text changed, or when its module-level code (a value, a parent class,
+        # a default argument) reads a name that an item run by this update defines
+        rebound = {name for item in removed for name in item.names} - kept
+        try:
+            for (line, _), item, old in zip(chunks, items, matched):
+                if old is not None and line != item.line:
+                    # Moved but unchanged: its live code has to report the lines it is on now
+                    for name in item.names:
+                        for function in functions_of(namespace.get(name)):
+                            function.__code__ = shift_lines(function.__code__, line - item.line)
+                    item.code, item.line = shift_lines(item.code, line - item.line), line
+                if old is None or rebound.intersection(item.code.co_names):
+                    previous = {name: namespace[name] for name in item.names if name in namespace}
+                    exec(item.code, namespace)
+                    for name, value in previous.items():
+                        namespace[name] = hot_swap(value, namespace[name])
+                    rebound.update(item.names)
+        except BaseException:
+            # The module is now between two versions, so the next save starts it over
+            self.module = None
+            raise
+        return sum(item is None for item in matched)
+
+    def modules(self):
+        """The Glorp modules the program has imported, directly or not, by name with the file each one came from."""
+        return {name: module.__spec__.origin for name, module in list(sys.modules.items())
+                if isinstance(getattr(getattr(module, '__spec__', None), 'loader', None), GlorpLoader)}
+
+    def forget_modules(self):
+        """Drops the imported Glorp modules, so the next rebuild loads their current source."""
+        for name in self.modules():
+            del sys.modules[name]
+        self.module = None
+
+    def run_main(self):
+        import inspect
+        main = self.module.__dict__.get('Main')
+        if main is None:
+            return
+        code = getattr(main, '__wrapped__', main).__code__
+        args = (sys.argv,) if code.co_argcount else ()
+        result = glorp_runtime.run_main(main, *args) if code.co_flags & inspect.CO_COROUTINE else main(*args)
+        if result: glorp_runtime.out("Programm finished with the result of ", result, "\n")
+
+def file_stamp(filename):
+    try:
+        status = os.stat(filename)
+        return status.st_mtime_ns, status.st_size
+    except OSError:
+        return None
+
+def watch(source_file, interval=0.2):
+    """`glorp watch`: runs a program, then applies each saved edit to it and runs Main again."""
+    session = WatchSession(source_file)
+    install_module_finder()
+    stamps = {}
+    while True:
+        current = {filename: file_stamp(filename) for filename in [source_file, *filter(None, session.modules().values())]}
+        if current == stamps:
+            time.sleep(interval)
+            continue
+        if any(current[filename] != stamps.get(filename) for filename in current if filename != source_file):
+            session.forget_modules()
+        stamps = current
+
+        try:
+            begin = time.perf_counter()
+            try:
+                with open(source_file, encoding='utf8') as f:
+                    source_code = f.read()
+            except FileNotFoundError:
+                raise GlorpError(f"File '{source_file}' not found.")
+            transpiled = session.update(source_code)
+            elapsed = (time.perf_counter() - begin) * 1000
+            what = 'loaded all' if transpiled is None else f"transpiled {transpiled} of"
+            print(f"[glorp watch] {what} {len(session.items)} items in {elapsed:.1f} ms", file=sys.stderr)
+            session.run_main()
+        except GlorpError as e:
+            print(f"--- Glorp Error ---\n{e}", file=sys.stderr)
+        except KeyboardInterrupt:
+            glorp_runtime.out("Interrupted by user.\n")
+        except Exception as e:
+            try:
+                handle_runtime_error(e, session.fake_filename, source_file)
+            except GlorpRuntimeError as error:
+                glorp_runtime.flush_output()
+                print(f"--- Glorp Error ---\n{error}", file=sys.stderr)
+        finally:
+            glorp_runtime.flush_output()
+        # Modules first imported by this run are watched from the version it loaded
+        for filename in filter(None, session.modules().values()):
+            stamps.setdefault(filename, file_stamp(filename))
+        print(f"[glorp watch] watching {source_file}, stop with Ctrl-C", file=sys.stderr)
+
 def main():
-    source_code = glorp_prefix
+    if sys.argv[1:2] == ['serve']:
+        try:
+            serve(sys.argv[2:])
+        except GlorpError as e:
+            print(f"--- Glorp Error ---\n{e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
     match len(sys.argv):
         case 2:
             source_file = sys.argv[1]
         case 1:
-            print("Usage: glorp [run | to-py] <source_file.glorp> (you may use some additional flags)")
+            print("Usage: glorp [run | to-py | profile | watch | build] <source_file.glorp> (you may use some additional flags), or glorp serve")
             return
         case _:
             source_file = sys.argv[2]
@@ -696,68 +2367,119 @@ def main():
         print(VERSION)
         return
 
+    global parse_mode, use_cache, opt_level, timer
+    if '--earley' in sys.argv: parse_mode = 'earley'
+    if '--no-cache' in sys.argv: use_cache = False
+    timing_output = None
+    for arg in sys.argv[2:]:
+        if arg.startswith('-O') and arg[2:] in ('', '0', '1', '2'):
+            opt_level = int(arg[2:] or 2)
+        elif arg == '-o' or arg.startswith('-o='):
+            timing_output = arg.partition('=')[2] or 'text'
+            timer = PhaseTimer()
+            timer.record('import runtime', imported_at - started_at)
+        elif arg.startswith(('--output=', '--output-buffer=')):
+            option, _, value = arg.partition('=')
+            try:
+                if option == '--output': glorp_runtime.output_mode(value)
+                else: glorp_runtime.output_mode(buffer_size=int(value))
+            except ValueError as e:
+                print(f"--- Glorp Error ---\n{option}: {e}", file=sys.stderr)
+                sys.exit(1)
+    module_search_path.append(os.path.dirname(os.path.abspath(source_file)))
+
+    package = next((arg.partition('=')[2] for arg in sys.argv[3:] if arg.partition('=')[0] == '--package'), None)
+    if sys.argv[1] == 'build' or (sys.argv[1] == 'to-py' and package is not None):
+        out_dir = package or next((arg.partition('=')[2] for arg in sys.argv[3:] if arg.startswith('--out=')), None)
+        try:
+            jobs = job_count(sys.argv[3:])
+            begin = time.perf_counter()
+            transpiled, total = build(source_file, out_dir, jobs, sources=sys.argv[1] == 'to-py')
+            print(f"Transpiled {transpiled} of {total} modules in {time.perf_counter() - begin:.2f} s")
+        except GlorpError as e:
+            print(f"--- Glorp Error ---\n{e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if sys.argv[1] == 'watch':
+        try:
+            watch(source_file)
+        except KeyboardInterrupt:
+            pass
+        return
+
     try:
         try:
-            source_code += open(source_file, encoding='utf8').read()
+            source_code = open(source_file, encoding='utf8').read()
             if not source_code.strip():
                 return
         except FileNotFoundError:
             raise GlorpError(f"File '{source_file}' not found.")
 
-        try:
-            tree = parser.parse(source_code)
-        except Exception as e:
-            context = e.get_context(source_code, 40) if hasattr(e, 'get_context') else '' # type: ignore
-            error_details = str(e)
-            message = f"Invalid syntax.\n> {context}\nDetails: {error_details}"
-            raise GlorpParseError(message, line=getattr(e, 'line', None), column=getattr(e, 'column', None))
-            
-        transformer = Glorp("Runtime")
-        py_code = py_prefix + transformer.transform(tree)
-        
-        py_code += f'''
+        flags = [arg for arg in sys.argv[2:] if arg.startswith('-') and arg.partition('=')[0] not in display_flags]
+        # -t, -d and to-py need the parse tree or the generated source, which the cache does not keep
+        cache_main = use_cache and sys.argv[1] != 'to-py' and not {'-t', '-d'} & set(sys.argv)
+        key = cache_key(source_code, source_file, flags)
+        with timed('cache'):
+            entry = load_cached(key) if cache_main else None
+        cached = entry is not None
 
-try:
-    res = {"Main(sys.argv)" if mainargs else "Main()"}
-    {f'''app = App(build=Render, name = "{source_file.split('/')[-1].strip('.glorp')}")
+        module_name = "glorp_runtime_module"
+        fake_filename = f"<{source_file}>"
 
-    app.run_in_window()''' if gui else ''}
-    if res: print("Programm finished with the result of", res)
-except KeyboardInterrupt:
-    print("Interrupted by user.")
-    sys.exit(1)
-'''
+        if entry is None:
+            tree = parse_source(source_code)
 
-        print(f'Took {time.time() - start} seconds to transpile\n' if '-o' in sys.argv else '', end='')
+            transformer = Glorp("Runtime")
+            if timer: timer.instrument(transformer)
+            with timed('transform'):
+                module = transformer.transform(tree)
 
-        start2 = time.time()
+            add_epilogue(module, source_file, source_code)
+            module = finish_module(module)
 
-        module_name = "glorp_runtime_module"
-        fake_filename = f"<{source_file}>"
+            entry = {'code': None, 'imports': transformer.imports}
 
         glorp_module = types.ModuleType(module_name)
         glorp_module.__file__ = fake_filename
 
-        lines = [line + '\n' for line in py_code.splitlines()]
-        linecache.cache[fake_filename] = (len(py_code), None, lines, fake_filename)
+        register_source(fake_filename, source_code, source_file)
         sys.modules[module_name] = glorp_module
         
         try:
-            print(py_code if '-d' in sys.argv else '', end = '')
+            print(ast.unparse(module) + '\n' if '-d' in sys.argv else '', end = '')
             print(tree.pretty(' ') if '-t' in sys.argv else '', end = '')
             match sys.argv[1]:
                 case 'to-py':
-                    with open(source_file.rstrip('.glorp') + '.py', 'w') as f:
-                        f.write(py_code)
+                    with open(os.path.splitext(source_file)[0] + '.py', 'w', encoding='utf8') as f:
+                        f.write(ast.unparse(module) + '\n')
+                    write_imported_modules(entry['imports'], os.path.dirname(os.path.abspath(source_file)))
                 case _:
-                    compiled_code = compile(py_code, fake_filename, 'exec')
-                    exec(compiled_code, glorp_module.__dict__)
+                    compiled_code = entry['code']
+                    if compiled_code is None:
+                        with timed('compile'):
+                            compiled_code = entry['code'] = compile(module, fake_filename, 'exec')
+                        if cache_main:
+                            with timed('cache'):
+                                store_cached(key, entry)
+                    install_module_finder()
+                    profiler = GlorpProfiler() if sys.argv[1] == 'profile' else nullcontext()
+                    try:
+                        with timed('execute Main'), profiler:
+                            exec(compiled_code, glorp_module.__dict__)
+                    finally:
+                        if sys.argv[1] == 'profile' and profiler.backend is not None:
+                            glorp_runtime.flush_output()
+                            print('\n' + profiler.report())
             
+        except GlorpError:
+            raise
         except Exception as e:
             handle_runtime_error(e, fake_filename, source_file)
-        
-        print(f'\nTook {time.time() - start2} seconds to execute' if '-o' in sys.argv else '', end='')
-        print(f'\nTook {time.time() - start} seconds in total' if '-o' in sys.argv else '', end='')
+        finally:
+            # Program output comes before any error report or timing line
+            glorp_runtime.flush_output()
+            if timer: write_timing_report(timing_output, source_file, cached)
 
     except GlorpError as e:
         print(f"--- Glorp Error ---", file=sys.stderr)
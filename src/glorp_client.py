@@ -0,0 +1,54 @@
+"""Thin client for `glorp serve`.
+
+Takes the same arguments as glorp (`glorp_client.py run hello.glorp`), but hands the request to the
+running server instead of importing lark and rio itself, so a short script starts in milliseconds.
+The program runs in a process forked from the server and uses this terminal directly. Without a
+running server the client runs glorp in-process, as if it had been called directly.
+
+Only the standard library is imported here, which is the whole point.
+"""
+import json
+import os
+import signal
+import socket
+import sys
+
+
+def socket_path():
+    cache_dir = os.environ.get('GLORP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.glorp'))
+    return os.environ.get('GLORP_SOCKET', os.path.join(cache_dir, 'serve.sock'))
+
+
+def run_locally(argv):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import glorp
+    sys.argv = ['glorp'] + argv
+    glorp.main()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    connection = socket.socket(socket.AF_UNIX)
+    try:
+        connection.connect(socket_path())
+    except (FileNotFoundError, ConnectionRefusedError):
+        connection.close()
+        return run_locally(argv)
+
+    sys.stdout.flush()
+    request = {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}
+    socket.send_fds(connection, [json.dumps(request).encode()], [0, 1, 2])
+
+    replies = connection.makefile('rb')
+    worker = json.loads(replies.readline())['pid']
+    # Ctrl-C reaches this process, not the worker, which runs in the server's process group
+    signal.signal(signal.SIGINT, lambda signum, frame: os.kill(worker, signal.SIGINT))
+    reply = replies.readline()
+    if not reply:
+        print("--- Glorp Error ---\nThe Glorp server closed the connection before the program finished", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(json.loads(reply)['status'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Runtime helpers for transpiled Glorp programs.
+
+Generated code imports only the names it uses from here, e.g.
+``from glorp_runtime import num, out``.
+"""
+from math import floor, isfinite, lcm
+from itertools import islice, repeat
+from collections.abc import Sequence
+from operator import truediv
+import linecache
+from types import SimpleNamespace
+import sys
+import os
+
+from .reactive import Watched, Derived, batch, flush_watchers, watch_mode
+from .output import _output, output_mode, output_to, flush_output
+from .parallel import par_map
+
+__all__ = [
+    "take", "_GlorpWatcher", "Watched", "Derived", "batch", "flush_watchers", "watch_mode",
+    "out", "output_mode", "output_to", "flush_output", "par_map", "gather", "run_main", "memo", "clear", "readfile", "writefile",
+    "readlines", "readchunks", "mapfile", "filewriter", "writelines", "vector_each",
+    "read", "read_str", "read_int", "read_float", "read_bool", "tuple",
+    "grange", "GlorpRange", "pow", "NullType", "BaseMeta", "Container_Meta", "Field_Meta",
+    "num", "true", "false", "Null", "null",
+    "floor", "islice", "linecache", "SimpleNamespace", "sys", "subprocess", "os",
+]
+
+def __getattr__(name):
+    # Modules only some programs need are imported on first use instead of with the runtime
+    if name == "subprocess":
+        import subprocess
+        return subprocess
+    if name in ("gather", "run_main"):
+        from . import asynchronous
+        return getattr(asynchronous, name)
+    if name == "memo":
+        from .caching import memo
+        return memo
+    if name == "vector_each":
+        from .vector import vector_each
+        return vector_each
+    if name in ("readlines", "readchunks", "mapfile", "filewriter", "writelines"):
+        from . import files
+        return getattr(files, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def take(n, iterable):
+    def generator():
+        count = 0
+        for item in iterable:
+            if count >= n:
+                break
+            yield item
+            count += 1
+    return list(generator())
+
+# Older generated code constructs watchers through this name
+_GlorpWatcher = Watched
+
+def out(*args, sep=""):
+    _output.write(sep.join(map(str, args)))
+
+def clear():
+    _output.write("\033[H\033[2J")
+    _output.flush()
+
+def readfile(filename, binary=False):
+    if binary:
+        with open(filename, 'rb') as f:
+            return f.read()
+    with open(filename, 'r', encoding='utf8') as f:
+        return f.read()
+
+def writefile(filename, content, append=False):
+    # bytes (from readfile(binary: true) or mapfile) are written as they are
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        with open(filename, 'ab' if append else 'wb') as f:
+            f.write(content)
+        return
+    with open(filename, 'a' if append else 'w', encoding='utf8') as f:
+        f.write(content)
+
+def _input(prompt):
+    # Whatever `out` is holding back (usually the question) has to be visible before waiting for an answer
+    _output.flush()
+    return input(prompt)
+
+def read(prompt=""):
+    return _input(prompt)
+
+def read_str(prompt=""):
+    return _input(prompt)
+
+def read_int(prompt=""):
+    while True:
+        s = _input(prompt)
+        try:
+            return int(s)
+        except ValueError:
+            out("Invalid input. Please enter a whole number (integer).\n")
+
+def read_float(prompt=""):
+    while True:
+        s = _input(prompt)
+        try:
+            return float(s)
+        except ValueError:
+            out("Invalid input. Please enter a number (e.g., 123 or 45.67).\n")
+
+def read_bool(prompt=""):
+    while True:
+        s = _input(prompt).lower().strip()
+        if s in ('true', 't', 'yes', 'y', '1'):
+            return True
+        elif s in ('false', 'f', 'no', 'n', '0'):
+            return False
+        else:
+            out("Invalid input. Please enter 'true' or 'false'.\n")
+
+def tuple(*args):
+    return (args)
+
+class GlorpRange(Sequence):
+    """The inclusive range behind `for` loops and `[a, b, ..., c]` lists.
+
+    Element i is (first + i * step) / scale, computed over integers from the decimal values the range
+    was written with, so fractional steps never accumulate rounding error and any element, slice or
+    length is available without building the list.
+    """
+    __slots__ = ('_first', '_step', '_scale', '_length')
+
+    def __init__(self, first, step, scale, length):
+        self._first = first
+        self._step = step
+        self._scale = scale
+        self._length = length
+
+    @classmethod
+    def between(cls, start, end, step):
+        if all(float(value).is_integer() for value in (start, end, step)):
+            start, end, step = int(start), int(end), int(step)
+            return cls(start, step, 1, max((end - start) // step + 1, 0))
+
+        from fractions import Fraction
+        start, end, step = (Fraction(repr(float(value))) for value in (start, end, step))
+        # Same 1e-9 tolerance on the end bound as the float loop this replaces
+        length = max(floor((end - start) / step + Fraction(1, 10**9) / abs(step)) + 1, 0)
+        scale = lcm(start.denominator, step.denominator)
+        return cls(int(start * scale), int(step * scale), scale, length)
+
+    def _indexes(self):
+        return range(self._first, self._first + self._length * self._step, self._step)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        if self._scale == 1:
+            return map(float, self._indexes())
+        return map(truediv, self._indexes(), repeat(self._scale))
+
+    def __reversed__(self):
+        return iter(self[::-1])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            picked = range(self._length)[index]
+            return GlorpRange(self._first + picked.start * self._step, self._step * picked.step, self._scale, len(picked))
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("range index out of range")
+        return (self._first + index * self._step) / self._scale
+
+    def __contains__(self, value):
+        try:
+            index = round((value * self._scale - self._first) / self._step)
+        except (TypeError, ValueError, OverflowError):
+            return False
+        return any(0 <= i < self._length and self[i] == value for i in (index - 1, index, index + 1))
+
+    def __repr__(self):
+        # Printed like the list it stands for, every element included
+        return repr(list(self))
+
+    def array(self):
+        """The range as a NumPy float64 array, built without a Python-level loop."""
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("GlorpRange.array() needs NumPy, install it with `pip install numpy`") from None
+        last = self._first + max(self._length - 1, 0) * self._step
+        if max(abs(self._first), abs(last), self._scale) < 2**53:
+            # Every integer here converts to float64 exactly, so the division rounds like the Python one
+            return (self._first + numpy.arange(self._length, dtype=numpy.int64) * self._step) / self._scale
+        return numpy.fromiter(self, dtype=numpy.float64, count=self._length)
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.array()
+        return values if dtype is None else values.astype(dtype)
+
+def grange(start, end, step=None):
+    if step is None:
+        step = 1 if end >= start else -1
+
+    if step == 0:
+        raise ValueError("grange() step argument must not be zero")
+
+    if not all(isfinite(value) for value in (start, end, step)):
+        # Unbounded loops such as `for i from 0 to Inf` have no length, so they keep the float generator
+        return _float_range(start, end, step)
+    return GlorpRange.between(start, end, step)
+
+def _float_range(start, end, step):
+    current = float(start)
+    end = float(end)
+    
+    if step > 0:
+        while current <= end + 1e-9:
+            yield round(current, 10)
+            current += step
+    else: # step < 0
+        while current >= end - 1e-9:
+            yield round(current, 10)
+            current += step
+
+def pow(a, b):
+    return a ** b
+
+class NullType:
+    def __repr__(self):
+        return "Null"
+    def __bool__(self):
+        return False
+    def __eq__(self, other):
+        return other is None or isinstance(other, NullType)
+
+class BaseMeta(type):
+    def __new__(mcls, name, bases, namespace, **kwargs):
+        # A compact class only needs slots for the fields its base classes do not already store
+        if namespace.get('__slots__') and bases:
+            inherited = {slot for base in bases for cls in base.__mro__ for slot in getattr(cls, '__slots__', ())}
+            namespace['__slots__'] = tuple(slot for slot in namespace['__slots__'] if slot not in inherited)
+        return super().__new__(mcls, name, bases, namespace, **kwargs)
+
+    def __repr__(cls):
+        return f"Glorp.ClassObject({cls.__name__})"
+
+class Container_Meta(type):
+    def __repr__(cls):
+        return f"Container {cls.__name__}"
+
+class Field_Meta(type):
+    def __repr__(cls):
+        container = cls.__module__
+        if hasattr(cls, '__qualname__') and '.' in cls.__qualname__:
+            container = cls.__qualname__.split('.')[0]
+        return f"Fied {cls.__name__} of container {container}"
+
+class num(float, metaclass = BaseMeta):
+    def __init__(self, value) -> None:
+        self.value = value
+    
+    def __truediv__(self, other) -> float:
+        if other.value == 0:
+            return num("inf")
+        return self.value / other.value
+    
+    def __str__(self):
+        val = str(self.value)
+        if val.endswith(".0"):
+            return val.rstrip(".0")
+        return val 
+
+true = True
+false = False
+Null = NullType()
+null = NullType()
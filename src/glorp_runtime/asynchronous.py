@@ -0,0 +1,66 @@
+"""Runtime behind `async fn` and `await`.
+
+An async `Main` runs through `run_main`, on an event loop of its own. ``await [a, b]`` and
+``await each x in items => fetch(x)`` become ``await gather(...)``, which runs the awaitables
+concurrently and returns their results in order. Watch handlers that await are started as tasks on the
+running loop; `run_main` waits for the ones still running before it returns, so they are not cut off
+when `Main` ends.
+"""
+import asyncio
+from collections.abc import Awaitable, Iterable
+
+__all__ = ["gather", "run_main", "start_handler"]
+
+_handler_tasks = set()
+
+
+async def gather(*awaitables, limit=None):
+    """Awaits every awaitable concurrently and returns their results as a list, in the given order.
+
+    Takes the awaitables as arguments or as a single list (or other iterable). With `limit`, at most
+    that many run at the same time.
+    """
+    if len(awaitables) == 1 and not isinstance(awaitables[0], Awaitable) and isinstance(awaitables[0], Iterable):
+        awaitables = tuple(awaitables[0])
+    if limit is None:
+        return list(await asyncio.gather(*awaitables))
+    if int(limit) < 1:
+        raise ValueError(f"gather limit must be positive, not {limit}")
+
+    semaphore = asyncio.Semaphore(int(limit))
+
+    async def limited(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return list(await asyncio.gather(*map(limited, awaitables)))
+
+
+def _handler_done(task):
+    # Failed handlers are kept until run_main collects them, so their errors are not lost
+    if task.cancelled() or task.exception() is None:
+        _handler_tasks.discard(task)
+
+
+def start_handler(coroutine):
+    """Runs a coroutine returned by a watch handler: as a task on the running loop, or to completion without one."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    task = loop.create_task(coroutine)
+    _handler_tasks.add(task)
+    task.add_done_callback(_handler_done)
+
+
+def run_main(main, *args):
+    """Runs an async `Main` to completion, together with any watch handlers it started, and returns its result."""
+    async def program():
+        result = await main(*args)
+        while _handler_tasks:
+            tasks = tuple(_handler_tasks)
+            _handler_tasks.difference_update(tasks)
+            await asyncio.gather(*tasks)
+        return result
+
+    return asyncio.run(program())
@@ -0,0 +1,165 @@
+"""Runtime behind `memo fn`.
+
+``memo(size: 1000, ttl: 60) fn f(x) {...}`` becomes ``@memo(size=1000, ttl=60)`` on the generated
+function. Results are kept per argument list in a least-recently-used cache of at most `size` entries
+(128 by default, ``size: null`` for no limit), each for at most `ttl` seconds if given.
+
+Arguments are compared by value. Lists, dictionaries and instances of Glorp classes (whose generated
+``__eq__`` leaves them unhashable) are keyed by a frozen copy of their contents, taken at call time.
+Calls with arguments that cannot be frozen run uncached.
+
+The cache takes no lock: the dictionary operations it relies on are atomic, so calls from `par`
+threads are safe, although the statistics may then miss a few counts.
+"""
+from collections import OrderedDict, namedtuple
+from functools import update_wrapper
+from inspect import iscoroutinefunction
+from time import monotonic
+from types import MethodType
+
+from . import NullType, num
+
+__all__ = ["memo", "CacheStats"]
+
+CacheStats = namedtuple("CacheStats", "hits misses evictions expired uncached size limit")
+
+_MISSING = object()
+# Types whose values are their own keys
+_ATOMIC = frozenset({int, float, complex, str, bytes, bool, type(None), num})
+_CONTAINERS = frozenset({list, tuple, set, frozenset, dict})
+_KEYWORDS = object()
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def _fields(value):
+    if hasattr(value, "__dict__"):
+        return vars(value).items()
+    names = [name for cls in type(value).__mro__ for name in getattr(cls, "__slots__", ())]
+    if not names:
+        raise _Uncacheable
+    return [(name, getattr(value, name, _MISSING)) for name in names]
+
+
+def _freeze(value, active):
+    kind = type(value)
+    if kind in _ATOMIC:
+        return value
+    if kind.__hash__ is not None and kind not in _CONTAINERS:
+        # Compact class instances are their own keys, unless they hold lists
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            pass
+    if id(value) in active:
+        raise _Uncacheable
+    active.add(id(value))
+    try:
+        if kind is list or kind is tuple:
+            return (kind, tuple([_freeze(item, active) for item in value]))
+        if kind is set or kind is frozenset:
+            return (kind, frozenset([_freeze(item, active) for item in value]))
+        if kind is dict:
+            return (dict, frozenset([(_freeze(key, active), _freeze(item, active)) for key, item in value.items()]))
+        return (kind, tuple([(name, _freeze(item, active)) for name, item in _fields(value)]))
+    finally:
+        active.discard(id(value))
+
+
+class Memoized:
+    """A function whose results are cached; `stats()` reports how well, `clear()` empties the cache."""
+
+    def __init__(self, function, size=128, ttl=None):
+        # Glorp's null means no limit, like None
+        size = None if isinstance(size, NullType) else size
+        ttl = None if isinstance(ttl, NullType) else ttl
+        if size is not None and int(size) < 1:
+            raise ValueError(f"memo size must be positive or null, not {size}")
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f"memo ttl must be a positive number of seconds, not {ttl}")
+        update_wrapper(self, function)
+        self.function = function
+        self.limit = None if size is None else int(size)
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = self.expired = self.uncached = 0
+
+    def _find(self, args, kwargs):
+        """The cache key for a call and the cached result, or _MISSING for either."""
+        key = args + (_KEYWORDS,) + tuple(sorted(kwargs.items())) if kwargs else args
+        try:
+            entry = self.entries.get(key, _MISSING)
+        except TypeError:
+            try:
+                key = _freeze(key, set())
+            except _Uncacheable:
+                self.uncached += 1
+                return _MISSING, _MISSING
+            entry = self.entries.get(key, _MISSING)
+        if entry is not _MISSING:
+            value, expires = entry
+            if expires is None or monotonic() < expires:
+                try:
+                    self.entries.move_to_end(key)
+                except KeyError:
+                    pass  # evicted by another thread in the meantime
+                self.hits += 1
+                return key, value
+            self.entries.pop(key, None)
+            self.expired += 1
+        self.misses += 1
+        return key, _MISSING
+
+    def _store(self, key, value):
+        self.entries[key] = (value, None if self.ttl is None else monotonic() + self.ttl)
+        if self.limit is not None and len(self.entries) > self.limit:
+            try:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            except KeyError:
+                pass
+
+    def __call__(self, *args, **kwargs):
+        key, value = self._find(args, kwargs)
+        if value is _MISSING:
+            # Nothing is locked while the function runs, so a recursive function can call itself through the cache
+            value = self.function(*args, **kwargs)
+            if key is not _MISSING:
+                self._store(key, value)
+        return value
+
+    def __get__(self, instance, owner=None):
+        # Used as a method, `this` becomes part of the key like any other argument
+        return self if instance is None else MethodType(self, instance)
+
+    def stats(self):
+        return CacheStats(self.hits, self.misses, self.evictions, self.expired, self.uncached, len(self.entries), self.limit)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = self.expired = self.uncached = 0
+
+    def __repr__(self):
+        return f"<memo fn {self.__name__}>"
+
+
+class MemoizedAsync(Memoized):
+    """An `async fn` whose awaited results are cached; every call still returns something to await."""
+
+    async def __call__(self, *args, **kwargs):
+        key, value = self._find(args, kwargs)
+        if value is _MISSING:
+            value = await self.function(*args, **kwargs)
+            if key is not _MISSING:
+                self._store(key, value)
+        return value
+
+
+def memo(function=None, size=128, ttl=None):
+    """Caches `function`'s results; used bare (``@memo``) or with settings (``@memo(size=..., ttl=...)``)."""
+    if function is None:
+        return lambda function: memo(function, size, ttl)
+    return (MemoizedAsync if iscoroutinefunction(function) else Memoized)(function, size, ttl)
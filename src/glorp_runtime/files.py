@@ -0,0 +1,217 @@
+"""File builtins that do not hold a whole file in memory, next to `readfile` and `writefile`.
+
+* ``readlines(file)``: the lines of a text file, without their line endings, read one at a time;
+* ``readchunks(file, size)``: the file in pieces of `size` characters (or bytes with ``binary: true``);
+* ``mapfile(file)``: a read-only memory-mapped view of the file's bytes, for random access;
+* ``filewriter(file)``: a buffered writer, appending with ``append: true``;
+* ``writelines(file, lines)``: writes any iterable of lines, one after the other.
+
+``readlines`` and ``readchunks`` return objects that open the file each time they are iterated and
+close it when the iteration ends, so ``each line in readlines("big.log") => ...`` and ``each`` loops
+can go over the same file more than once. Writers still open when the program ends are flushed and
+closed then.
+"""
+import atexit
+import mmap
+import weakref
+
+__all__ = ["readlines", "readchunks", "mapfile", "filewriter", "writelines", "FileLines", "FileChunks", "MappedFile", "FileWriter"]
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_BUFFER_SIZE = 256 * 1024
+_LINE_BLOCK_SIZE = 256 * 1024
+
+_open_writers = weakref.WeakSet()
+
+
+def _whole(value):
+    # Glorp numbers may arrive as floats
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+class FileLines:
+    __slots__ = ('filename', 'encoding')
+
+    def __init__(self, filename, encoding):
+        self.filename, self.encoding = filename, encoding
+
+    def __iter__(self):
+        # Splitting large blocks is much faster than reading line by line
+        with open(self.filename, 'r', encoding=self.encoding, newline=None) as f:
+            rest = ''
+            while block := f.read(_LINE_BLOCK_SIZE):
+                lines = (rest + block).split('\n')
+                rest = lines.pop()
+                yield from lines
+            if rest:
+                yield rest
+
+    def __repr__(self):
+        return f"readlines({self.filename!r})"
+
+
+class FileChunks:
+    __slots__ = ('filename', 'size', 'binary', 'encoding')
+
+    def __init__(self, filename, size, binary, encoding):
+        if size <= 0:
+            raise ValueError("readchunks() size must be positive")
+        self.filename, self.size, self.binary, self.encoding = filename, size, binary, encoding
+
+    def __iter__(self):
+        # Text is decoded incrementally, so a character split between two reads still comes out whole
+        with (open(self.filename, 'rb') if self.binary else open(self.filename, 'r', encoding=self.encoding, newline='')) as f:
+            while chunk := f.read(self.size):
+                yield chunk
+
+    def __repr__(self):
+        return f"readchunks({self.filename!r}, {self.size})"
+
+
+class MappedFile:
+    """The bytes of a file mapped into memory, read-only. Indexing gives a byte as a number, read() and
+    slicing give bytes, and only the pages that are touched are read from disk."""
+    __slots__ = ('filename', '_file', '_map')
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        try:
+            # An empty file cannot be mapped, and has nothing to read anyway
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._file.seek(0, 2) else b''
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __len__(self):
+        return len(self._map)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            index = slice(_whole(index.start), _whole(index.stop), _whole(index.step))
+        else:
+            index = _whole(index)
+        return self._map[index]
+
+    def find(self, needle, start=0, end=None):
+        """Position of the first occurrence of needle (bytes or str) from start, or -1."""
+        if isinstance(needle, str):
+            needle = needle.encode('utf8')
+        return self._map.find(needle, _whole(start), len(self._map) if end is None else _whole(end))
+
+    def count(self, needle):
+        if isinstance(needle, str):
+            needle = needle.encode('utf8')
+        count = position = 0
+        while (position := self._map.find(needle, position)) != -1:
+            count += 1
+            position += len(needle) or 1
+        return count
+
+    def read(self, start=0, end=None):
+        """The bytes from start up to end (the end of the file by default)."""
+        return self[start:end]
+
+    def text(self, start=0, end=None, encoding='utf8'):
+        return self[start:end].decode(encoding, errors='replace')
+
+    def lines(self, encoding='utf8'):
+        """The lines of the file without their endings, decoded one at a time."""
+        position, size = 0, len(self._map)
+        while position < size:
+            end = self._map.find(b'\n', position)
+            end = size if end == -1 else end
+            line = self._map[position:end]
+            yield (line[:-1] if line.endswith(b'\r') else line).decode(encoding, errors='replace')
+            position = end + 1
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"mapfile({self.filename!r}, {len(self)} bytes)"
+
+
+class FileWriter:
+    """A file opened for writing with a large buffer. write() takes any values, like `out`; text
+    values are written as UTF-8 unless the writer is binary, which takes bytes."""
+    __slots__ = ('filename', 'binary', '_file', '__weakref__')
+
+    def __init__(self, filename, append, binary, buffer_size, encoding):
+        mode = ('a' if append else 'w') + ('b' if binary else '')
+        self.filename, self.binary = filename, binary
+        self._file = open(filename, mode, buffering=buffer_size) if binary else open(filename, mode, buffering=buffer_size, encoding=encoding, newline='')
+        _open_writers.add(self)
+
+    def write(self, *values):
+        if self.binary:
+            for value in values:
+                self._file.write(value)
+        else:
+            self._file.write(''.join(map(str, values)))
+
+    def writeline(self, *values):
+        self.write(*values, b'\n' if self.binary else '\n')
+
+    def writelines(self, lines):
+        newline = b'\n' if self.binary else '\n'
+        write = self._file.write
+        for line in lines:
+            write(line if self.binary else str(line))
+            write(newline)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+        _open_writers.discard(self)
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"filewriter({self.filename!r})"
+
+
+def readlines(filename, encoding='utf8'):
+    return FileLines(filename, encoding)
+
+
+def readchunks(filename, size=DEFAULT_CHUNK_SIZE, binary=False, encoding='utf8'):
+    return FileChunks(filename, _whole(size), binary, encoding)
+
+
+def mapfile(filename):
+    return MappedFile(filename)
+
+
+def filewriter(filename, append=False, binary=False, buffer_size=DEFAULT_BUFFER_SIZE, encoding='utf8'):
+    return FileWriter(filename, append, binary, _whole(buffer_size), encoding)
+
+
+def writelines(filename, lines, append=False, binary=False, encoding='utf8'):
+    with FileWriter(filename, append, binary, DEFAULT_BUFFER_SIZE, encoding) as writer:
+        writer.writelines(lines)
+
+
+def _close_writers():
+    for writer in list(_open_writers):
+        writer.close()
+
+atexit.register(_close_writers)
@@ -0,0 +1,123 @@
+"""The output layer behind `out()`.
+
+Text is collected in memory and written to the sink in large chunks instead of being flushed on every
+call. Modes:
+
+* ``"buffered"``: write once `buffer_size` characters are pending,
+* ``"line"``: write whenever a line is completed,
+* ``"unbuffered"``: write and flush on every call, as `out` always used to,
+* ``"auto"`` (the default): line-buffered when the sink is a terminal, buffered otherwise.
+
+Pending output is always written before reading input, when the program ends (including on errors),
+and on `flush_output()`.
+"""
+import atexit
+import sys
+
+__all__ = ["output_mode", "output_to", "flush_output"]
+
+MODES = ("auto", "buffered", "line", "unbuffered")
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class _Output:
+    def __init__(self):
+        self.mode = "auto"
+        self.buffer_size = DEFAULT_BUFFER_SIZE
+        self.sink = None
+        self.chunks = []
+        self.pending = 0
+        self.resolved = None
+
+    def target(self):
+        # sys.stdout is looked up on every flush, so redirecting it keeps working
+        return sys.stdout if self.sink is None else self.sink
+
+    def effective_mode(self):
+        if self.resolved is None:
+            if self.mode != "auto":
+                self.resolved = self.mode
+            else:
+                isatty = getattr(self.target(), "isatty", None)
+                try:
+                    self.resolved = "line" if isatty is not None and isatty() else "buffered"
+                except ValueError:
+                    self.resolved = "buffered"
+        return self.resolved
+
+    def write(self, text):
+        mode = self.resolved or self.effective_mode()
+        if mode == "buffered":
+            self.chunks.append(text)
+            self.pending += len(text)
+            if self.pending >= self.buffer_size:
+                self.flush()
+        elif mode == "line" and "\n" not in text:
+            self.chunks.append(text)
+            self.pending += len(text)
+        else:
+            if self.chunks:
+                self.chunks.append(text)
+                text = "".join(self.chunks)
+                self.chunks.clear()
+                self.pending = 0
+            target = self.target()
+            target.write(text)
+            flush = getattr(target, "flush", None)
+            if flush is not None:
+                flush()
+
+    def flush(self):
+        target = self.target()
+        if self.chunks:
+            # Swapped rather than cleared, so text appended by another thread meanwhile is not lost
+            chunks, self.chunks = self.chunks, []
+            self.pending = 0
+            target.write("".join(chunks))
+        flush = getattr(target, "flush", None)
+        if flush is not None:
+            flush()
+
+    def flush_at_exit(self):
+        try:
+            self.flush()
+        except (BrokenPipeError, ValueError):
+            # The reader went away or the sink was already closed; there is nobody left to write to
+            self.chunks.clear()
+
+
+_output = _Output()
+atexit.register(_output.flush_at_exit)
+
+
+def output_mode(mode=None, buffer_size=None):
+    """Returns the `out` buffering mode, first switching to `mode` and/or `buffer_size` (in characters) if given."""
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"output mode must be one of {', '.join(MODES)}, not {mode!r}")
+        _output.flush()
+        _output.mode = mode
+        _output.resolved = None
+    if buffer_size is not None:
+        if buffer_size < 1:
+            raise ValueError("output buffer size must be positive")
+        _output.buffer_size = int(buffer_size)
+    return _output.mode
+
+
+def output_to(sink=None):
+    """Sends `out` to any object with a ``write`` method (``None`` or null goes back to sys.stdout); returns the previous sink."""
+    if not callable(getattr(sink, "write", None)) and not sink:
+        # None, or Glorp's null
+        sink = None
+    if sink is not None and not callable(getattr(sink, "write", None)):
+        raise TypeError(f"output sink must have a write() method, got {type(sink).__name__}")
+    _output.flush()
+    previous, _output.sink = _output.sink, sink
+    _output.resolved = None
+    return previous
+
+
+def flush_output():
+    """Writes everything `out` is still holding to the sink."""
+    _output.flush()
@@ -0,0 +1,87 @@
+"""Runtime behind `par each`.
+
+``par each x in items -> f(x)`` becomes ``par_map(lambda x: f(x), items)``. On a process pool the
+lambda (and a `where` filter) cannot be pickled, so they are registered here before the pool is forked:
+every worker inherits them, together with the program's functions, classes and globals as they were at
+that moment, and only a task number and the items travel through the pool. Results come back pickled,
+which works for numbers, strings, lists and instances of classes defined at the top of a Glorp file.
+"""
+import itertools
+import os
+import sys
+from collections.abc import Sized
+from functools import partial
+
+from .output import _output
+
+__all__ = ["par_map"]
+
+POOLS = ("process", "thread")
+
+_tasks = {}
+_task_ids = itertools.count()
+_in_worker = False
+
+
+def _start_worker():
+    global _in_worker
+    _in_worker = True
+
+
+def _apply(task_id, item):
+    function, where = _tasks[task_id]
+    try:
+        if where is not None and not where(item):
+            return False, None
+        return True, function(item)
+    finally:
+        # Pool processes leave without running exit hooks, so their out() text is written per item
+        if _in_worker and _output.chunks:
+            _output.flush()
+
+
+def _can_fork():
+    import multiprocessing
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def par_map(function, items, where=None, workers=None, chunk=None, ordered=True, pool="process"):
+    """Maps `function` over `items` on a pool of `workers` (default: one per core) and returns the results as a list.
+
+    Items are handed out `chunk` at a time (default: about four chunks per worker). With ``ordered=False``
+    results come back as soon as they are ready instead of in the order of `items`. ``pool="thread"``
+    runs on threads, which only helps when `function` waits on I/O; it is also used where processes
+    cannot be forked (Windows).
+    """
+    workers = (os.cpu_count() or 1) if workers is None else int(workers)
+    if workers < 1:
+        raise ValueError(f"par needs at least one worker, not {workers}")
+    if pool not in POOLS:
+        raise ValueError(f"par pool must be one of {', '.join(POOLS)}, not {pool!r}")
+    if chunk is not None and int(chunk) < 1:
+        raise ValueError(f"par chunk size must be positive, not {chunk}")
+    if not isinstance(items, Sized):
+        items = list(items)
+
+    # A worker cannot start a pool of its own, so nested par loops run serially inside it
+    if workers == 1 or len(items) < 2 or _in_worker:
+        return [function(item) for item in items if where is None or where(item)]
+
+    chunk = int(chunk) if chunk is not None else max(1, len(items) // (workers * 4))
+    task_id = next(_task_ids)
+    _tasks[task_id] = (function, where)
+    try:
+        if pool == "process" and _can_fork():
+            import multiprocessing
+            # Forked workers would otherwise inherit, and print again, whatever is still buffered
+            _output.flush()
+            sys.stderr.flush()
+            executor = multiprocessing.get_context("fork").Pool(workers, initializer=_start_worker)
+        else:
+            from multiprocessing.pool import ThreadPool
+            executor = ThreadPool(workers)
+        with executor:
+            results = (executor.imap if ordered else executor.imap_unordered)(partial(_apply, task_id), items, chunk)
+            return [value for kept, value in results if kept]
+    finally:
+        del _tasks[task_id]
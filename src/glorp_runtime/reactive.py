@@ -0,0 +1,239 @@
+"""Runtime behind Glorp's `watch` variables.
+
+A `Watched` value calls its handler with ``(old, new)`` when an assignment changes it. A `Derived`
+value is computed from other watched values, remembers which ones it read, and recomputes only after
+one of them changed. Notifications are delivered by a single engine which can:
+
+* coalesce every write made inside `batch()` into one notification per watcher, carrying the value
+  from before the batch and the final one,
+* deliver immediately (``"sync"``, the default), on `flush_watchers()` / at exit (``"deferred"``),
+  or from the running asyncio loop (``"async"``), see `watch_mode`.
+"""
+import atexit
+import sys
+from contextlib import contextmanager
+from types import CoroutineType
+
+__all__ = ["Watched", "Derived", "batch", "flush_watchers", "watch_mode"]
+
+MODES = ("sync", "deferred", "async")
+
+# A handler that keeps re-triggering itself (directly or through other watchers) would flush forever
+MAX_NOTIFICATIONS_PER_FLUSH = 100
+
+
+def _start(coroutine):
+    # A handler that awaits is a coroutine function; its coroutine runs on the event loop
+    from .asynchronous import start_handler
+    start_handler(coroutine)
+
+
+class _Engine:
+    def __init__(self):
+        self.mode = "sync"
+        self.depth = 0
+        self.pending = {}
+        self.tracking = []
+        self.flushing = False
+        self.scheduled = False
+        self.exit_hook = False
+        # True while a write can call its handler on the spot: sync mode, and no batch, flush or pending
+        # notification. It may be False when it need not be (the queue is always correct), never the reverse.
+        self.direct = True
+
+    def update(self):
+        self.direct = self.mode == "sync" and not (self.depth or self.flushing or self.pending)
+
+    def settle(self):
+        """Delivers or schedules pending notifications once no batch or flush is in progress."""
+        if self.pending and not self.depth and not self.flushing:
+            if self.mode == "sync":
+                self.flush()
+            else:
+                self.schedule()
+        self.update()
+
+    def schedule(self):
+        if self.scheduled:
+            return
+        # Without asyncio imported no loop can be running, and importing it here would only cost time
+        asyncio = sys.modules.get("asyncio")
+        if self.mode == "async" and asyncio is not None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                self.scheduled = True
+                loop.call_soon(self.flush)
+                return
+        if not self.exit_hook:
+            self.exit_hook = True
+            atexit.register(self.flush)
+
+    def flush(self):
+        self.scheduled = False
+        if self.flushing:
+            return
+        self.flushing, self.direct = True, False
+        delivered = {}
+        try:
+            while self.pending:
+                watcher = next(iter(self.pending))
+                old = self.pending.pop(watcher)
+                new = watcher.value
+                if old == new or watcher._handler is None:
+                    continue
+                delivered[watcher] = delivered.get(watcher, 0) + 1
+                if delivered[watcher] > MAX_NOTIFICATIONS_PER_FLUSH:
+                    self.pending.clear()
+                    raise RuntimeError("watch handlers keep changing each other's values")
+                result = watcher._handler(old, new)
+                if type(result) is CoroutineType:
+                    _start(result)
+        finally:
+            self.flushing = False
+            self.update()
+
+
+_engine = _Engine()
+
+
+class Watched:
+    """A variable declared with `watch`; assigning a different `.value` notifies its handler."""
+    __slots__ = ("_value", "_handler", "_dependents", "__weakref__")
+
+    def __init__(self, initial_value, handler=None):
+        self._value = initial_value
+        self._handler = handler
+        self._dependents = set()
+
+    @property
+    def value(self):
+        if _engine.tracking:
+            _engine.tracking[-1].add(self)
+        return self._value
+
+    @value.setter
+    def value(self, new):
+        old = self._value
+        if old == new:
+            return
+        self._value = new
+        engine = _engine
+        if engine.direct and not self._dependents:
+            # Nothing to coalesce or schedule: notify directly, queueing whatever the handler writes in turn
+            handler = self._handler
+            if handler is not None:
+                engine.flushing, engine.direct = True, False
+                try:
+                    result = handler(old, new)
+                    if result is not None and type(result) is CoroutineType:
+                        _start(result)
+                finally:
+                    engine.flushing = False
+                if engine.pending or engine.mode != "sync":
+                    engine.settle()
+                else:
+                    engine.direct = True
+            return
+        if self._handler is not None and self not in engine.pending:
+            engine.pending[self] = old
+        for dependent in tuple(self._dependents):
+            dependent._invalidate()
+        # Everything affected is queued before any handler runs, so no handler sees a stale derived value
+        engine.settle()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._value!r})"
+
+
+class Derived(Watched):
+    """A watched value computed from other watched values, e.g. ``watch total = a.value + b.value``.
+
+    It is recomputed lazily, and only after one of the values it read last time has changed. Assigning
+    to it works like any watched value until one of its inputs changes again.
+    """
+    __slots__ = ("_compute", "_sources", "_dirty")
+
+    def __init__(self, compute, handler=None):
+        super().__init__(None, handler)
+        self._compute = compute
+        self._sources = set()
+        self._dirty = True
+        self._refresh()
+
+    def _refresh(self):
+        read = set()
+        _engine.tracking.append(read)
+        try:
+            self._value = self._compute()
+        finally:
+            _engine.tracking.pop()
+        self._dirty = False
+        for source in self._sources - read:
+            source._dependents.discard(self)
+        for source in read - self._sources:
+            source._dependents.add(self)
+        self._sources = read
+
+    def _invalidate(self):
+        if self._dirty:
+            return
+        self._dirty = True
+        if self._handler is not None and self not in _engine.pending:
+            _engine.pending[self] = self._value
+        for dependent in tuple(self._dependents):
+            dependent._invalidate()
+
+    @property
+    def value(self):
+        if self._dirty:
+            self._refresh()
+        if _engine.tracking:
+            _engine.tracking[-1].add(self)
+        return self._value
+
+    @value.setter
+    def value(self, new):
+        if self._dirty:
+            self._refresh()
+        Watched.value.fset(self, new)
+
+
+@contextmanager
+def _batch():
+    _engine.depth += 1
+    _engine.direct = False
+    try:
+        yield
+    finally:
+        _engine.depth -= 1
+        _engine.settle()
+
+
+def batch(function=None, *args):
+    """Coalesces watch notifications: each watcher hears once, with its value from before the batch and the final one.
+
+    ``batch(update)`` runs ``update()`` inside a batch and returns its result; ``with batch():`` does the
+    same for a block of Python code.
+    """
+    if function is None:
+        return _batch()
+    with _batch():
+        return function(*args)
+
+
+def flush_watchers():
+    """Delivers the notifications that deferred or async mode is holding back."""
+    _engine.flush()
+
+
+def watch_mode(mode=None):
+    """Returns the delivery mode, switching to `mode` ("sync", "deferred" or "async") first if given."""
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"watch mode must be one of {', '.join(MODES)}, not {mode!r}")
+        _engine.mode = mode
+        _engine.settle()
+    return _engine.mode
@@ -0,0 +1,116 @@
+"""Runtime behind vectorized `each` comprehensions.
+
+At -O1 and above the transpiler lowers ``[each a in data where a > 0 => a * k + 1]``, and ``sum``,
+``min``, ``max``, ``any`` or ``all`` over an `each`, whose body and condition are element-wise
+arithmetic, comparisons, `if/else` and NumPy ufunc calls, to
+
+    vector_each(list, data, lambda: (k,), lambda a, _glorp_where, _glorp_v0: a * _glorp_v0 + 1,
+                lambda a, _glorp_where, _glorp_v0: a > 0,
+                lambda _glorp_items, _glorp_v0: list(<the comprehension, reading k as _glorp_v0>),
+                lambda _glorp_items: list(<the comprehension>))
+
+The body then runs once, on the whole array. That happens only when the data is a one-dimensional
+NumPy array of ints or floats (or a long range, in a program that has NumPy loaded), every other
+name in the expression is a number or a ufunc, and NumPy raises no floating-point error. Anything
+else runs the comprehension as Python does: those expressions cannot have side effects, so starting
+over loses nothing, and any error comes from the Python loop exactly as it would have without
+vectorizing.
+
+The result holds what the Python loop would have produced, down to the type: NumPy scalars over an
+array, Python floats over a range. Where that cannot be told from the array alone, because the two
+branches of an `if/else` differ in type or a range meets a ufunc, the Python loop runs instead.
+
+Operands are names, num literals and functions of imported modules (``np.sqrt``), none of which reads
+differently when read once. Once they have been evaluated for the array, the Python loop is given
+their values rather than evaluating them again. Data that is not an array, or an operand that raises,
+runs the comprehension exactly as written.
+"""
+import builtins
+import sys
+from numbers import Number
+
+from . import GlorpRange, pow as glorp_pow
+
+__all__ = ["vector_each"]
+
+# Below these sizes the Python loop is as fast as setting up the array expression
+MIN_ARRAY_SIZE = 32
+MIN_RANGE_SIZE = 10_000
+
+_COLLECTORS = {builtins.list: "list", builtins.sum: "sum", builtins.min: "min", builtins.max: "max", builtins.any: "any", builtins.all: "all"}
+
+
+def _array(iterable):
+    # Without NumPy loaded nothing can be an array, and importing it would cost more than any loop it saves.
+    # A list is left alone too: converting it costs about as much as the loop.
+    numpy = sys.modules.get("numpy")
+    if numpy is None:
+        return None
+    if isinstance(iterable, GlorpRange):
+        return iterable.array() if len(iterable) >= MIN_RANGE_SIZE else None
+    if type(iterable) is not numpy.ndarray:
+        return None
+    if iterable.ndim != 1 or iterable.dtype.kind not in "iuf" or len(iterable) < MIN_ARRAY_SIZE:
+        return None
+    return iterable
+
+
+def _elementwise(value, numpy):
+    if isinstance(value, (Number, numpy.bool_)) and not isinstance(value, complex):
+        return True
+    return isinstance(value, numpy.ufunc) or value is builtins.abs or value is glorp_pow
+
+
+def _where(condition, chosen, other):
+    # Each element of the loop's result is one branch's value as it is, which the combined array can only
+    # match when both branches are arrays of the same type
+    numpy = sys.modules["numpy"]
+    if type(chosen) is not numpy.ndarray or type(other) is not numpy.ndarray or chosen.dtype != other.dtype:
+        raise TypeError("the branches differ in type")
+    return numpy.where(condition, chosen, other)
+
+
+def vector_each(collect, iterable, operands, element, condition, loop, fallback):
+    kind = _COLLECTORS.get(collect)
+    values = _array(iterable) if kind is not None else None
+    if values is None:
+        return fallback(iterable)
+
+    numpy = sys.modules["numpy"]
+    try:
+        extra = operands()
+    except Exception:
+        # The loop may never have needed the operand that failed (it can sit behind a `where`)
+        return fallback(iterable)
+    # A range's elements are Python floats, which a ufunc would turn into NumPy scalars, element by element
+    python = isinstance(iterable, GlorpRange)
+    if not all(_elementwise(value, numpy) for value in extra) or (python and any(isinstance(value, numpy.ufunc) for value in extra)):
+        return loop(iterable, *extra)
+    try:
+        with numpy.errstate(divide="raise", over="raise", invalid="raise", under="ignore"):
+            if condition is not None:
+                mask = condition(values, _where, *extra)
+                if type(mask) is not numpy.ndarray or mask.dtype != bool or mask.shape != values.shape:
+                    return loop(iterable, *extra)
+                values = values[mask]
+            result = element(values, _where, *extra)
+    except Exception:
+        return loop(iterable, *extra)
+    if type(result) is not numpy.ndarray or result.shape != values.shape or result.dtype.kind not in "biuf":
+        return loop(iterable, *extra)
+
+    if kind == "list":
+        return result.tolist() if python else list(result)
+    if result.size == 0:
+        return loop(iterable, *extra)
+    if kind in ("any", "all"):
+        return bool(getattr(numpy, kind)(result))
+    if result.dtype.kind != "f":
+        # Exact for integers; sum() from 0 adds booleans as ints and other integers in their own type
+        total = numpy.sum(result, dtype=numpy.int64 if result.dtype == bool else result.dtype) if kind == "sum" else getattr(numpy, kind)(result)
+        return total.item() if python else total
+    if kind != "sum" or python:
+        # The builtin compares, and over Python floats sums with compensation, exactly as the Python loop would
+        return getattr(builtins, kind)(result.tolist() if python else list(result))
+    # sum() adds NumPy scalars one by one from 0, which is what cumsum does (+ 0.0 turns a lone -0.0 into 0.0 like 0 + -0.0)
+    return numpy.cumsum(result)[-1] + 0.0
@@ -1,24 +1,185 @@
 import sys
 import base64
+import hashlib
+import json
+import re
 import requests
 import os
+import time
+import urllib3
+import zlib
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn
 
-SERVER_URL = "https://lecsusoff.pythonanywhere.com/"
+SERVER_URL = os.environ.get("GLORPPKG_SERVER", "https://lecsusoff.pythonanywhere.com/")
+# Downloaded modules by the SHA-256 of their content, shared by every project on this machine
+CACHE_DIR = os.environ.get("GLORPPKG_CACHE", os.path.join(os.path.expanduser("~"), ".glorp", "packages"))
+LOCKFILE = "glorp.lock"
+# Optional list of the project's dependencies, {"dependencies": ["module", ...]}; without it install scans the sources
+MANIFEST = "glorp.json"
+MAX_DOWNLOADS = 8
+RETRIES = 3
+TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+# Smaller modules are uploaded as they are, gzip gains them next to nothing
+COMPRESS_MIN = 1024
+USAGE = ("[yellow]Usage:[/]\n  glorppkg upload <module> [--no-compress] [--legacy]\n  glorppkg get <module> [--update] [--force] [--offline]\n"
+         "  glorppkg install [<module> ...] [--jobs=N] [--update] [--force] [--offline]")
 console = Console()
+_sessions = {}
+_pool_sizes = {}
 
-def upload_file(module_name: str):
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def cache_path(digest: str) -> str:
+    return os.path.join(CACHE_DIR, digest[:2], digest)
+
+
+def write_atomic(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def cache_get(digest: str):
+    """Returns the cached content with this hash, or None if it is not cached (or the copy is damaged)."""
+    try:
+        with open(cache_path(digest), 'rb') as f:
+            content = f.read()
+    except OSError:
+        return None
+    return content if content_hash(content) == digest else None
+
+
+def cache_put(content: bytes) -> str:
+    digest = content_hash(content)
+    if cache_get(digest) is None:
+        write_atomic(cache_path(digest), content)
+    return digest
+
+
+def read_lock(path: str = LOCKFILE) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            lock = json.load(f)
+    except FileNotFoundError:
+        lock = {}
+    lock.setdefault("lockfile_version", 1)
+    lock.setdefault("modules", {})
+    return lock
+
+
+def write_lock(lock: dict, path: str = LOCKFILE):
+    write_atomic(path, (json.dumps(lock, indent=2, sort_keys=True) + "\n").encode('utf-8'))
+
+
+def pin(module_name: str, content: bytes, path: str = LOCKFILE):
+    lock = read_lock(path)
+    lock["modules"][module_name] = {"sha256": content_hash(content), "size": len(content)}
+    write_lock(lock, path)
+
+
+def http(retry: bool = True, connections: int = MAX_DOWNLOADS) -> requests.Session:
+    """The sessions every request goes through, so connections to the registry are kept alive and reused.
+
+    Failed connections and 429/5xx answers are retried with backoff. The pool holds at least connections
+    connections, and install asks for one per download it runs at once; a larger pool replaces the session.
+    A streamed upload cannot be replayed by the adapter, so uploads use a session without retries and
+    resume themselves instead.
+    """
+    session = _sessions.get(retry)
+    if session is None or _pool_sizes[retry] < connections:
+        if session is not None:
+            session.close()
+        retries = Retry(total=RETRIES, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False) if retry else 0
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections, max_retries=retries)
+        session = _sessions[retry] = requests.Session()
+        _pool_sizes[retry] = connections
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    return session
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def upload_body(path: str, compress: bool, offset: int = 0, sent=None):
+    """The body of a streamed upload: the file, gzip-compressed if asked, from offset bytes into that stream.
+    sent(n) is told how many bytes of the file have been handed to the connection so far."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    position = done = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(CHUNK_SIZE)
+            data = block if compressor is None else compressor.compress(block) if block else compressor.flush()
+            if position + len(data) > offset:
+                yield data[max(0, offset - position):]
+            position += len(data)
+            done += len(block)
+            if sent:
+                sent(done)
+            if not block:
+                return
+
+
+def stream_upload(module_name: str, path: str, compress: bool, sent=None):
+    """PUTs a module to /modules/<name>.glorp as a binary stream, resuming an interrupted upload from the
+    offset the server reports for it. Returns the response, or None if the server only has the legacy protocol."""
+    url = f"{SERVER_URL}/modules/{module_name}.glorp"
+    headers = {"Content-Type": "application/octet-stream", "X-Glorp-SHA256": file_hash(path)}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    offset = 0
+    for attempt in range(RETRIES + 1):
+        if attempt:
+            time.sleep(0.2 * 2 ** (attempt - 1))
+            try:
+                answer = http().head(url, headers=headers, timeout=TIMEOUT)
+                offset = int(answer.headers.get("Upload-Offset", 0)) if answer.ok else 0
+            except requests.RequestException:
+                offset = 0
+        try:
+            response = http(retry=False).put(url, data=upload_body(path, compress, offset, sent),
+                                             headers={**headers, "Upload-Offset": str(offset)}, timeout=TIMEOUT)
+        except requests.ConnectionError:
+            if attempt == RETRIES:
+                raise
+            continue
+        if response.status_code in (404, 405, 501):
+            return None
+        if response.status_code < 500 or attempt == RETRIES:
+            return response
+
+
+def legacy_upload(module_name: str, path: str):
+    """The original protocol: the whole module base64-encoded in a JSON body, POSTed to /upload."""
+    with open(path, 'rb') as f:
+        content_b64 = base64.b64encode(f.read()).decode()
+    return http().post(f"{SERVER_URL}/upload", json={
+        "filename": f"{module_name}.glorp",
+        "content": content_b64
+    }, timeout=TIMEOUT)
+
+
+def upload_file(module_name: str, compress: bool = True, legacy: bool = False):
     filename = f"{module_name}.glorp"
     if not os.path.isfile(filename):
         console.print(f"[bold red][!] File '{filename}' not found.[/]")
         return
 
-    with open(filename, 'rb') as f:
-        content = f.read()
-
-    content_b64 = base64.b64encode(content).decode()
-
+    size = os.path.getsize(filename)
     with Progress(
         SpinnerColumn(),
         "[progress.description]{task.description}",
@@ -26,67 +187,294 @@ def upload_file(module_name: str):
         TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
         console=console,
     ) as progress:
-        task = progress.add_task("[cyan]Uploading...", total=len(content))
-
-        # Fake progress bar (for UX), since upload is one request
-        for i in range(0, len(content), max(1, len(content)//50)):
-            progress.update(task, advance=i)
-        response = requests.post(f"{SERVER_URL}/upload", json={
-            "filename": filename,
-            "content": content_b64
-        })
-        progress.update(task, completed=len(content))
+        task = progress.add_task("[cyan]Uploading...", total=size)
+        try:
+            response = None if legacy else stream_upload(module_name, filename, compress and size >= COMPRESS_MIN,
+                                                         lambda done: progress.update(task, completed=done))
+            if response is None:
+                response = legacy_upload(module_name, filename)
+        except requests.RequestException as e:
+            console.print(f"[bold red][!] Could not upload '{filename}': {e}[/]")
+            return
+        progress.update(task, completed=size)
 
     if response.ok:
+        # What we published is what this project should keep using
+        with open(filename, 'rb') as f:
+            content = f.read()
+        cache_put(content)
+        pin(module_name, content)
         console.print(f"[bold green][+] {response.json().get('message', 'Upload complete')}[/]")
     else:
         console.print(f"[bold red][!] {response.json().get('error', 'Upload failed')}[/]")
 
 
-def download_file(module_name: str):
+def transfer(module_name: str, received=None):
+    """Streams a module from the registry, returning its content, or None after reporting the error.
+
+    The registry may send it gzip-compressed. What has arrived is kept in a partial file in the cache,
+    so a transfer cut off midway, in this run or an earlier one, continues with a Range request as long
+    as the server's ETag for the module has not changed. received(done, total) follows the bytes on the wire.
+    """
     filename = f"{module_name}.glorp"
-    url = f"{SERVER_URL}/get/{filename}"
+    partial = os.path.join(CACHE_DIR, "partial", filename)
+    try:
+        with open(f"{partial}.json", encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
 
-    with console.status(f"[cyan]Downloading {filename}..."):
-        response = requests.get(url, stream=True)
+    error = None
+    for attempt in range(RETRIES + 1):
+        if attempt:
+            time.sleep(0.2 * 2 ** (attempt - 1))
+        done = os.path.getsize(partial) if meta.get("etag") and os.path.isfile(partial) else 0
+        headers = {"Accept-Encoding": "gzip"}
+        if done:
+            headers.update({"Range": f"bytes={done}-", "If-Range": meta["etag"]})
+        try:
+            with http().get(f"{SERVER_URL}/get/{filename}", headers=headers, stream=True, timeout=TIMEOUT) as response:
+                if response.status_code == 416:
+                    meta = {}
+                    continue
+                if response.status_code not in (200, 206):
+                    console.print(f"[bold red][!] Error: {response.text}[/]")
+                    return None
+                if response.status_code == 200:
+                    done = 0
+                meta = {"etag": response.headers.get("ETag"), "encoding": response.headers.get("Content-Encoding", "identity")}
+                length = response.headers.get("Content-Length")
+                total = done + int(length) if length else None
+                os.makedirs(os.path.dirname(partial), exist_ok=True)
+                if meta["etag"]:
+                    write_atomic(f"{partial}.json", json.dumps(meta).encode('utf-8'))
+                with open(partial, 'ab' if done else 'wb') as f:
+                    if received:
+                        received(done, total)
+                    for chunk in response.raw.stream(CHUNK_SIZE, decode_content=False):
+                        f.write(chunk)
+                        done += len(chunk)
+                        if received:
+                            received(done, total)
+            break
+        except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+            error = e
+    else:
+        console.print(f"[bold red][!] Could not download '{filename}': {error}[/]")
+        return None
 
-    if response.status_code != 200:
-        console.print(f"[bold red][!] Error: {response.text}[/]")
-        return
+    with open(partial, 'rb') as f:
+        content = f.read()
+    for path in (partial, f"{partial}.json"):
+        if os.path.exists(path):
+            os.remove(path)
+    try:
+        return zlib.decompress(content, 47) if meta["encoding"] == "gzip" else content
+    except zlib.error as e:
+        console.print(f"[bold red][!] '{filename}' arrived damaged: {e}[/]")
+        return None
 
-    total_size = int(response.headers.get("Content-Length", 0))
-    chunk_size = 1024
 
-    with open(filename, 'w', encoding='utf-8') as f, Progress(
+def download_file(module_name: str):
+    """Fetches a module from the server with a progress bar, returning its content, or None after reporting the error."""
+    with Progress(
         SpinnerColumn(),
         "[progress.description]{task.description}",
         BarColumn(),
         TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
         console=console,
     ) as progress:
-        task = progress.add_task("[cyan]Downloading...", total=total_size)
+        task = progress.add_task("[cyan]Downloading...", total=None)
+        return transfer(module_name, lambda done, total: progress.update(task, completed=done, total=total))
+
+
+def fetch_module(module_name: str):
+    """download_file without the progress display, for install, which shows one for all its downloads."""
+    return transfer(module_name)
+
+
+def obtain(module_name: str, pinned, update: bool = False, offline: bool = False, fetch=download_file):
+    """The content to install for a module and whether it was downloaded, or (None, False) after reporting why
+    there is none. A pinned module comes from the cache when it is there; a download must match its pin."""
+    filename = f"{module_name}.glorp"
+    content = cache_get(pinned["sha256"]) if pinned and not update else None
+    if content is not None:
+        return content, False
+
+    if offline:
+        console.print(f"[bold red][!] '{filename}' is not in the cache and --offline forbids downloading it.[/]")
+        return None, False
+    content = fetch(module_name)
+    if content is None:
+        return None, False
+    if pinned and not update and content_hash(content) != pinned["sha256"]:
+        console.print(f"[bold red][!] '{filename}' on the server does not match the hash pinned in {LOCKFILE}. "
+                      f"Use --update to accept the new version.[/]")
+        return None, False
+    cache_put(content)
+    return content, True
+
+
+def place(module_name: str, content: bytes, pinned, force: bool = False):
+    """Writes the working copy of a module. Returns False if it was already up to date, None if it was
+    refused (a pinned copy with local changes, without force), and True once written."""
+    filename = f"{module_name}.glorp"
+    if os.path.isfile(filename):
+        with open(filename, 'rb') as f:
+            current = f.read()
+        if current == content:
+            return False
+        if pinned and content_hash(current) != pinned["sha256"] and not force:
+            console.print(f"[bold red][!] '{filename}' has local changes. Use --force to replace it.[/]")
+            return None
+
+    write_atomic(filename, content)
+    return True
+
+
+def get_module(module_name: str, update: bool = False, force: bool = False, offline: bool = False) -> bool:
+    """Installs a module into the current directory, from the cache when glorp.lock pins a copy we already have.
+
+    Without a pin (or with update) the module is downloaded, cached and pinned. A download that does not
+    match its pin is refused, and so is replacing a pinned working copy that was edited locally.
+    """
+    filename = f"{module_name}.glorp"
+    pinned = read_lock()["modules"].get(module_name)
+    content, downloaded = obtain(module_name, pinned, update, offline)
+    if content is None:
+        return False
+
+    written = place(module_name, content, pinned, force)
+    if written is None:
+        return False
+    pin(module_name, content)
+    if written:
+        console.print(f"[bold green][+] File '{filename}' {'downloaded' if downloaded else 'installed from the cache'} successfully.[/]")
+    else:
+        console.print(f"[bold green][+] '{filename}' is up to date.[/]")
+    return True
+
+
+# `use name`, `use alias = name` and `use alias for name`, but not `use py.name`, which imports Python
+USE_PATTERN = re.compile(r'^[ \t]*use[ \t]+(?:\w+[ \t]*(?:=|[ \t]for)[ \t]*)?(?!py\.)([\w.]+)', re.MULTILINE)
+
+
+def module_imports(source: str) -> list:
+    """The Glorp modules a source file uses. Dotted names are packages of the project, which the registry does not hold."""
+    return [name for name in USE_PATTERN.findall(source) if "." not in name]
+
+
+def project_dependencies() -> list:
+    """The modules the project asks for: the dependencies listed in glorp.json, or else the modules the
+    project's .glorp files use that are not part of the project (pinned ones count as installed, not local)."""
+    if os.path.isfile(MANIFEST):
+        with open(MANIFEST, encoding='utf-8') as f:
+            return list(json.load(f).get("dependencies", []))
+
+    pinned = read_lock()["modules"]
+    dependencies = []
+    for directory, subdirectories, files in os.walk("."):
+        subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+        for name in files:
+            if name.endswith(".glorp") and not (directory == "." and name[:-len(".glorp")] in pinned):
+                with open(os.path.join(directory, name), encoding='utf-8', errors='replace') as f:
+                    dependencies += module_imports(f.read())
+    return [name for name in dict.fromkeys(dependencies) if name in pinned or not os.path.isfile(f"{name}.glorp")]
+
+
+def install(modules=None, update: bool = False, force: bool = False, offline: bool = False, jobs: int = MAX_DOWNLOADS) -> bool:
+    """Installs modules (by default the project's dependencies) and every module they use, transitively.
+
+    A module's dependencies are scheduled as soon as its content arrives, so up to jobs downloads run at
+    once over the shared session. glorp.lock is written once at the end, pinning everything installed.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    lock = read_lock()
+    pinned = lock["modules"]
+    modules = project_dependencies() if modules is None else modules
+    contents, seen, failed = {}, set(), []
+    downloaded = 0
+    # Every download thread keeps a connection of its own, which a smaller pool would discard after each request
+    http(connections=jobs)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor, Progress(
+        SpinnerColumn(),
+        "[progress.description]{task.description}",
+        BarColumn(),
+        TextColumn("{task.completed}/{task.total}"),
+        console=console,
+    ) as progress:
+        task = progress.add_task("[cyan]Installing...", total=0)
+        futures = {}
 
-        for chunk in response.iter_content(chunk_size=chunk_size):
-            if chunk:
-                f.write(chunk.decode("utf-8"))
-                progress.update(task, advance=len(chunk))
+        def schedule(names):
+            for name in names:
+                # A module of the project itself is never replaced by one from the registry
+                if name in seen or (name not in pinned and os.path.isfile(f"{name}.glorp") and name not in modules):
+                    continue
+                seen.add(name)
+                futures[executor.submit(obtain, name, pinned.get(name), update, offline, fetch_module)] = name
+            progress.update(task, total=len(seen))
 
-    console.print(f"[bold green][+] File '{filename}' downloaded successfully.[/]")
+        schedule(modules)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                content, fetched = future.result()
+                progress.advance(task)
+                if content is None:
+                    failed.append(name)
+                    continue
+                contents[name] = content
+                downloaded += fetched
+                schedule(module_imports(content.decode('utf-8', errors='replace')))
+
+    written = 0
+    for name in sorted(contents):
+        result = place(name, contents[name], pinned.get(name), force)
+        if result is None:
+            failed.append(name)
+            continue
+        written += result
+        pinned[name] = {"sha256": content_hash(contents[name]), "size": len(contents[name])}
+    write_lock(lock)
+
+    console.print(f"[bold green][+] {len(contents)} modules resolved ({downloaded} downloaded, "
+                  f"{len(contents) - downloaded} from the cache), {written} written.[/]")
+    if failed:
+        console.print(f"[bold red][!] Not installed: {', '.join(sorted(failed))}[/]")
+    return not failed
 
 
 def main():
-    if len(sys.argv) != 3:
-        console.print("[yellow]Usage:[/]\n  glorppkg upload <module>\n  glorppkg get <module>")
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    flags = {arg.partition("=")[0]: arg.partition("=")[2] for arg in sys.argv[1:] if arg.startswith("--")}
+    options = {"update": "--update" in flags, "force": "--force" in flags, "offline": "--offline" in flags}
+    if args[:1] == ["install"]:
+        jobs = flags.get("--jobs") or str(MAX_DOWNLOADS)
+        if not jobs.isdigit() or int(jobs) < 1:
+            console.print(f"[bold red][!] --jobs takes a whole number of downloads, at least 1, not '{jobs}'.[/]")
+            console.print(USAGE)
+            sys.exit(1)
+        if not install(args[1:] or None, jobs=int(jobs), **options):
+            sys.exit(1)
+        return
+
+    if len(args) != 2:
+        console.print(USAGE)
         return
 
-    command, module_name = sys.argv[1], sys.argv[2]
+    command, module_name = args
 
     if command == "upload":
-        upload_file(module_name)
+        upload_file(module_name, compress="--no-compress" not in flags, legacy="--legacy" in flags)
     elif command == "get":
-        download_file(module_name)
+        if not get_module(module_name, **options):
+            sys.exit(1)
     else:
-        console.print("[bold red]Unknown command. Use 'upload' or 'get'.")
+        console.print("[bold red]Unknown command. Use 'upload', 'get' or 'install'.")
 
 
 if __name__ == "__main__":
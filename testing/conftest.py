@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+GLORP = os.path.join(SRC, 'glorp.py')
+
+
+@pytest.fixture
+def glorp(tmp_path):
+    """Runs `glorp <args>` in tmp_path, returning the CompletedProcess with text output."""
+    def run(*args, cwd=tmp_path, **kwargs):
+        return subprocess.run([sys.executable, GLORP, *args], cwd=cwd, capture_output=True, text=True, timeout=60, **kwargs)
+    return run
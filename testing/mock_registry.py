@@ -0,0 +1,217 @@
+"""A local stand-in for the glorppkg registry, used by the glorppkg tests and benchmarks.
+
+Serves the same endpoints as the real server from a dict of modules:
+- GET /get/<module>.glorp, gzip-compressed when the client accepts it, with an ETag and Range support;
+- PUT /modules/<module>.glorp with the raw (or gzip) body, resumable from the Upload-Offset that
+  HEAD on the same URL reports;
+- POST /upload with a JSON body holding the file name and base64 content (the legacy protocol).
+
+Options imitate a slow registry (a delay per request and a bandwidth limit), a share of downloads
+answered with 503 to exercise retries, transfers cut off midway, and an old server that only knows
+the legacy protocol. It counts the requests it answered and the body bytes it sent and received.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Registry(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, modules=None, latency=0.0, failure_rate=0.0, bandwidth=None, compress=True, legacy=False):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.modules = dict(modules or {})
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.bandwidth = bandwidth
+        self.compress = compress and not legacy
+        self.legacy = legacy
+        self.failures = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        # How many of the next transfers to cut off, and after how many body bytes
+        self.interruptions = 0
+        self.interrupt_after = 0
+        self.uploads = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def interrupt(self, transfers, after):
+        self.interruptions, self.interrupt_after = transfers, after
+
+    def take_interruption(self):
+        with self.lock:
+            if self.interruptions:
+                self.interruptions -= 1
+                return True
+        return False
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _begin(self):
+        with self.server.lock:
+            self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def _throttle(self, size):
+        if self.server.bandwidth:
+            time.sleep(size / self.server.bandwidth)
+
+    def _count(self, sent=0, received=0):
+        with self.server.lock:
+            self.server.bytes_sent += sent
+            self.server.bytes_received += received
+
+    def _send(self, status, body, content_type='application/octet-stream', headers=(), cut=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        for start in range(0, len(body), 64 * 1024):
+            block = body[start:start + 64 * 1024]
+            if cut is not None and start + len(block) > cut:
+                block = block[:cut - start]
+                self.wfile.write(block)
+                self._count(sent=len(block))
+                self._drop()
+                return
+            self._throttle(len(block))
+            self.wfile.write(block)
+            self._count(sent=len(block))
+
+    def _drop(self):
+        self.wfile.flush()
+        self.connection.shutdown(socket.SHUT_RDWR)
+        self.close_connection = True
+
+    def _body(self, limit=None):
+        """Yields the request body as it arrives, plain or chunked, stopping after limit bytes."""
+        remaining = limit if limit is not None else float('inf')
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            sizes = iter(lambda: int(self.rfile.readline().split(b';')[0], 16), 0)
+        else:
+            sizes = iter([int(self.headers.get('Content-Length', 0))])
+        for size in sizes:
+            while size and remaining:
+                block = self.rfile.read(min(size, remaining, 64 * 1024))
+                if not block:
+                    return
+                self._throttle(len(block))
+                self._count(received=len(block))
+                size -= len(block)
+                remaining -= len(block)
+                yield block
+            if not remaining:
+                return
+            if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                self.rfile.readline()
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while self.rfile.readline().strip():
+                pass
+
+    def do_GET(self):
+        self._begin()
+        filename = self.path.lstrip('/').removeprefix('get/')
+        content = self.server.modules.get(filename.removesuffix('.glorp'))
+        if random.random() < self.server.failure_rate:
+            with self.server.lock:
+                self.server.failures += 1
+            self._send(503, b'Try again later', 'text/plain')
+            return
+        if content is None:
+            self._send(404, f"Module '{filename}' not found".encode(), 'text/plain')
+            return
+        if self.server.legacy:
+            self._send(200, content)
+            return
+
+        headers = []
+        if self.server.compress and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = gzip.compress(content, mtime=0)
+            headers.append(('Content-Encoding', 'gzip'))
+        etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+        headers.append(('ETag', etag))
+        start = 0
+        requested = self.headers.get('Range', '')
+        if requested.startswith('bytes=') and self.headers.get('If-Range', etag) == etag:
+            start = int(requested[len('bytes='):].split('-')[0])
+            if start >= len(content):
+                self._send(416, b'', 'text/plain', [('Content-Range', f'bytes */{len(content)}')])
+                return
+            headers.append(('Content-Range', f'bytes {start}-{len(content) - 1}/{len(content)}'))
+        cut = self.server.interrupt_after if self.server.take_interruption() else None
+        self._send(206 if start else 200, content[start:], headers=headers, cut=cut)
+
+    def _upload(self):
+        digest = self.headers.get('X-Glorp-SHA256', '')
+        return self.server.uploads.setdefault((digest, self.headers.get('Content-Encoding', 'identity')), bytearray())
+
+    def do_HEAD(self):
+        self._begin()
+        if self.server.legacy:
+            self.send_error(405)
+            return
+        self.send_response(200)
+        self.send_header('Upload-Offset', str(len(self._upload())))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_PUT(self):
+        self._begin()
+        if self.server.legacy:
+            self.send_error(405)
+            return
+        upload = self._upload()
+        if int(self.headers.get('Upload-Offset', 0)) != len(upload):
+            del upload[:]
+            self._send(409, json.dumps({'error': 'Upload offset does not match, start again'}).encode(), 'application/json')
+            return
+        cut = self.server.interrupt_after if self.server.take_interruption() else None
+        for block in self._body(cut):
+            upload.extend(block)
+        if cut is not None:
+            self._drop()
+            return
+
+        digest, encoding = self.headers.get('X-Glorp-SHA256', ''), self.headers.get('Content-Encoding', 'identity')
+        body = bytes(self.server.uploads.pop((digest, encoding)))
+        content = zlib.decompress(body, 47) if encoding == 'gzip' else body
+        if hashlib.sha256(content).hexdigest() != digest:
+            self._send(400, json.dumps({'error': 'Upload does not match its hash'}).encode(), 'application/json')
+            return
+        self.server.modules[self.path.lstrip('/').removeprefix('modules/').removesuffix('.glorp')] = content
+        self._send(201, json.dumps({'message': 'Upload complete'}).encode(), 'application/json')
+
+    def do_POST(self):
+        self._begin()
+        body = json.loads(b''.join(self._body()))
+        self.server.modules[body['filename'].removesuffix('.glorp')] = base64.b64decode(body['content'])
+        self._send(200, json.dumps({'message': 'Upload complete'}).encode(), 'application/json')
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SRC
+
+sys.path.insert(0, os.path.join(SRC, 'glorppkg'))
+import glorppkg as package  # noqa: E402
+from mock_registry import Registry  # noqa: E402
+from rich.console import Console  # noqa: E402
+
+GLORPPKG = os.path.join(SRC, 'glorppkg', 'glorppkg.py')
+FIRST = b'fn version() => 1\n'
+SECOND = b'fn version() => 2\n'
+
+
+@pytest.fixture
+def glorppkg(tmp_path):
+    """Runs `glorppkg <args>` in tmp_path/project against server_url, with its own cache in tmp_path/cache."""
+    project = tmp_path / 'project'
+    project.mkdir()
+
+    def run(*args, server_url, cache=tmp_path / 'cache'):
+        env = dict(os.environ, GLORPPKG_SERVER=server_url, GLORPPKG_CACHE=str(cache))
+        return subprocess.run([sys.executable, GLORPPKG, *args], cwd=project, env=env, capture_output=True, text=True, timeout=60)
+    run.project = project
+    return run
+
+
+def pinned_hash(project):
+    return json.loads((project / 'glorp.lock').read_text(encoding='utf8'))['modules']['lib']['sha256']
+
+
+def test_a_pinned_module_installs_from_the_cache(glorppkg):
+    with Registry({'lib': FIRST}) as registry:
+        assert glorppkg('get', 'lib', server_url=registry.url).returncode == 0
+        assert registry.requests == 1
+        (glorppkg.project / 'lib.glorp').unlink()
+
+        result = glorppkg('get', 'lib', server_url=registry.url)
+        assert result.returncode == 0, result.stdout
+        assert 'from the cache' in result.stdout
+        assert registry.requests == 1
+    assert (glorppkg.project / 'lib.glorp').read_bytes() == FIRST
+
+
+def test_the_lockfile_keeps_the_pinned_version_until_update(glorppkg):
+    with Registry({'lib': FIRST}) as registry:
+        assert glorppkg('get', 'lib', server_url=registry.url).returncode == 0
+        assert pinned_hash(glorppkg.project) == hashlib.sha256(FIRST).hexdigest()
+
+        registry.modules['lib'] = SECOND
+        assert glorppkg('get', 'lib', server_url=registry.url).returncode == 0
+        assert (glorppkg.project / 'lib.glorp').read_bytes() == FIRST
+
+        assert glorppkg('get', 'lib', '--update', server_url=registry.url).returncode == 0
+    assert (glorppkg.project / 'lib.glorp').read_bytes() == SECOND
+    assert pinned_hash(glorppkg.project) == hashlib.sha256(SECOND).hexdigest()
+
+
+def test_get_works_offline_once_the_server_is_gone(glorppkg):
+    with Registry({'lib': FIRST}) as registry:
+        assert glorppkg('get', 'lib', server_url=registry.url).returncode == 0
+        url = registry.url
+    (glorppkg.project / 'lib.glorp').unlink()
+
+    for flags in (['--offline'], []):
+        result = glorppkg('get', 'lib', *flags, server_url=url)
+        assert result.returncode == 0, result.stdout
+        assert (glorppkg.project / 'lib.glorp').read_bytes() == FIRST
+
+    assert glorppkg('get', 'other', '--offline', server_url=url).returncode == 1
+
+
+def test_a_download_that_does_not_match_its_pin_is_refused(glorppkg, tmp_path):
+    with Registry({'lib': FIRST}) as registry:
+        assert glorppkg('get', 'lib', server_url=registry.url).returncode == 0
+        (glorppkg.project / 'lib.glorp').unlink()
+        registry.modules['lib'] = SECOND
+
+        # A fresh cache has no copy of the pinned module, so it has to come from the server
+        result = glorppkg('get', 'lib', server_url=registry.url, cache=tmp_path / 'empty-cache')
+    assert result.returncode == 1
+    assert 'does not match' in result.stdout
+    assert not (glorppkg.project / 'lib.glorp').exists()
+    assert pinned_hash(glorppkg.project) == hashlib.sha256(FIRST).hexdigest()
+
+
+def test_install_keeps_a_connection_per_job(tmp_path, monkeypatch, caplog):
+    modules = {f'lib{i}': f'fn f{i}() => {i}\n'.encode() for i in range(40)}
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(package, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(package, 'console', Console(quiet=True))
+    with Registry(modules, latency=0.05) as registry:
+        monkeypatch.setattr(package, 'SERVER_URL', registry.url)
+        assert package.install(list(modules), jobs=16)
+    # urllib3 drops each connection a full pool cannot take back, and says so in its log
+    assert 'Connection pool is full' not in caplog.text
+    assert len(list(tmp_path.glob('lib*.glorp'))) == 40
+
+
+@pytest.mark.parametrize('jobs', ['abc', '0', '-2'])
+def test_install_rejects_a_bad_job_count(glorppkg, jobs):
+    result = glorppkg('install', 'lib', f'--jobs={jobs}', server_url='http://127.0.0.1:9/')
+    assert result.returncode == 1
+    assert 'Traceback' not in result.stderr
+    assert 'Usage:' in result.stdout
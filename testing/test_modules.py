@@ -0,0 +1,53 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def test_a_python_import_is_not_taken_by_a_plain_directory(glorp, tmp_path):
+    (tmp_path / 'json').mkdir()
+    (tmp_path / 'prog.glorp').write_text('use py.json\n\nfn Main() {\n    out(json.dumps(1))\n}\n', encoding='utf8')
+    result = glorp('run', 'prog.glorp', '--no-cache')
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "1.0"
+
+
+def test_a_directory_of_modules_is_a_package(glorp, tmp_path):
+    (tmp_path / 'lib' / 'text').mkdir(parents=True)
+    (tmp_path / 'lib' / 'text' / 'shout.glorp').write_text('fn loud(s) => s + "!"\n', encoding='utf8')
+    (tmp_path / 'prog.glorp').write_text('use lib.text.shout\n\nfn Main() {\n    out(shout.loud("hi"))\n}\n', encoding='utf8')
+    for _ in range(2):  # the second run loads the program from the cache
+        result = glorp('run', 'prog.glorp')
+        assert result.returncode == 0, result.stderr
+        assert result.stdout == "hi!"
+
+
+
+def test_a_module_named_like_a_loaded_python_module(glorp, tmp_path):
+    # glorp.py has imported Python's string (and re, os, json, ...) long before the program runs
+    (tmp_path / 'string.glorp').write_text('fn shout(s) => s + "!"\n', encoding='utf8')
+    (tmp_path / 'prog.glorp').write_text('use string\n\nfn Main() {\n    out(string.shout("hi"))\n}\n', encoding='utf8')
+    for args in (['run', 'prog.glorp', '--no-cache'], ['run', 'prog.glorp'], ['run', 'prog.glorp']):
+        result = glorp(*args)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout == "hi!"
+
+
+def test_a_built_program_imports_its_modules(glorp, tmp_path):
+    (tmp_path / 'lib').mkdir()
+    (tmp_path / 'lib' / 'json.glorp').write_text('fn wrap(s) => "[" + s + "]"\n', encoding='utf8')
+    (tmp_path / 'prog.glorp').write_text('use lib.json\n\nfn Main() {\n    out(json.wrap("hi"))\n}\n', encoding='utf8')
+    assert glorp('build', 'prog.glorp').returncode == 0
+    result = subprocess.run([sys.executable, str(tmp_path / 'build' / 'prog.pyc')], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "[hi]"
+
+
+@pytest.mark.parametrize('jobs', ['-j=abc', '--jobs=0', '-j=-2'])
+def test_a_bad_job_count_is_a_glorp_error(glorp, tmp_path, jobs):
+    (tmp_path / 'prog.glorp').write_text('fn Main() {\n    out("hi")\n}\n', encoding='utf8')
+    result = glorp('build', 'prog.glorp', jobs)
+    assert result.returncode == 1
+    assert result.stderr.startswith("--- Glorp Error ---")
+    assert "Traceback" not in result.stderr
+    assert not (tmp_path / 'build').exists()
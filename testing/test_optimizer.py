@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+
+FORMATTING = '''
+fn Main() {
+    n = 5
+    fmt = "%s of 10\\n"
+    out("%s items\\n" % 5)
+    out(fmt % 3, fmt % n)
+    out("%d%%\\n" % 50)
+    out(7 % 3, " ", n % 2, " ", 2 * 3 % 4, "\\n")
+}
+'''
+
+
+def test_string_formatting_prints_the_same_at_every_level(glorp, tmp_path):
+    (tmp_path / 'fmt.glorp').write_text(FORMATTING, encoding='utf8')
+    outputs = {level: glorp('run', 'fmt.glorp', level, '--no-cache') for level in ('-O0', '-O1', '-O2')}
+    for result in outputs.values():
+        assert result.returncode == 0, result.stderr
+    assert outputs['-O0'].stdout == "5 items\n3 of 10\n5 of 10\n50%\n1.0 1.0 2.0\n"
+    assert outputs['-O1'].stdout == outputs['-O0'].stdout
+    assert outputs['-O2'].stdout == outputs['-O0'].stdout
+
+
+VECTORIZED = '''
+use np for py.numpy
+
+fn Main() {
+    ints = np.arange(40)
+    floats = np.arange(40.0) * 0.25
+    k = 3
+    out([each a in ints => a * 2 + 1], "\\n")
+    out([each a in ints where a > 30 => a else => a * 2], "\\n")
+    out([each a in floats where a > 5 => a else => 0], "\\n")
+    out([each a in ints => a > k], "\\n")
+    out([sum(each a in ints => a * k), sum(each a in ints => a > 20), min(each a in floats => a - k), max(each a in ints => a + k), any(each a in ints => a > 38)], "\\n")
+    ys = [each a in floats => np.sqrt(a)]
+    out([ys[3]], "\\n")
+    r = [1, ..., 20000]
+    rs = [each a in r => a * 2]
+    qs = [each a in r => np.sqrt(a)]
+    out([rs[0], rs[19999], qs[3], sum(each a in r => a / 2), sum(each a in r => a > 100), max(each a in r => a - k)], "\\n")
+}
+'''
+
+COUNTER = '''
+class Scale:
+    reads = 0
+
+    @property
+    def factor(self):
+        Scale.reads += 1
+        return 2.0
+
+scale = Scale()
+'''
+
+PROPERTY = '''
+use np for py.numpy
+use counter for py.counter
+
+fn Main() {
+    data = np.arange(100.0)
+    doubled = [each a in data => a * counter.scale.factor]
+    out(doubled[3], " ", counter.Scale.reads, "\\n")
+}
+'''
+
+
+def outputs_at_each_level(glorp, filename, **kwargs):
+    outputs = {level: glorp('run', filename, level, '--no-cache', **kwargs) for level in ('-O0', '-O1', '-O2')}
+    for result in outputs.values():
+        assert result.returncode == 0, result.stderr
+    return outputs
+
+
+def test_vectorized_comprehensions_print_the_same_at_every_level(glorp, tmp_path):
+    pytest.importorskip('numpy')
+    (tmp_path / 'vec.glorp').write_text(VECTORIZED, encoding='utf8')
+    outputs = outputs_at_each_level(glorp, 'vec.glorp')
+    assert outputs['-O0'].stdout.startswith("[np.float64(1.0), np.float64(3.0), ")
+    assert outputs['-O1'].stdout == outputs['-O0'].stdout
+    assert outputs['-O2'].stdout == outputs['-O0'].stdout
+
+
+def test_a_property_is_read_on_every_element_at_every_level(glorp, tmp_path):
+    pytest.importorskip('numpy')
+    (tmp_path / 'counter.py').write_text(COUNTER, encoding='utf8')
+    (tmp_path / 'prop.glorp').write_text(PROPERTY, encoding='utf8')
+    outputs = outputs_at_each_level(glorp, 'prop.glorp', env=dict(os.environ, PYTHONPATH=str(tmp_path)))
+    assert outputs['-O0'].stdout == "6.0 100\n"
+    assert outputs['-O1'].stdout == outputs['-O0'].stdout
+    assert outputs['-O2'].stdout == outputs['-O0'].stdout
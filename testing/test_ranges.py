@@ -0,0 +1,5 @@
+def test_a_range_prints_every_element(glorp, tmp_path):
+    (tmp_path / 'ranges.glorp').write_text('fn Main() {\n    out([1, ..., 5], "\\n")\n    out([0, 0.1, ..., 0.5], "\\n")\n}\n', encoding='utf8')
+    result = glorp('run', 'ranges.glorp', '--no-cache')
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "[1.0, 2.0, 3.0, 4.0, 5.0]\n[0.0, 0.1, 0.2, 0.3, 0.4, 0.5]\n"
@@ -0,0 +1,37 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from conftest import GLORP, SRC
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX') or not hasattr(os, 'fork'), reason="glorp serve needs Unix sockets and fork()")
+
+
+@pytest.fixture
+def server(tmp_path):
+    """A `glorp serve` started outside the client's directory, returning the environment that points a client at it."""
+    home = tmp_path / 'server'
+    home.mkdir()
+    env = dict(os.environ, GLORP_SOCKET=str(home / 'serve.sock'), GLORP_CACHE_DIR=str(home / 'cache'))
+    process = subprocess.Popen([sys.executable, GLORP, 'serve'], cwd=home, env=env, stdout=subprocess.PIPE, text=True)
+    try:
+        assert 'listening' in process.stdout.readline()
+        yield env
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def test_a_served_program_uses_modules_from_the_client_directory(server, tmp_path):
+    project = tmp_path / 'project'
+    (project / 'sub').mkdir(parents=True)
+    (project / 'util.glorp').write_text('fn greet() => "hello from util"\n', encoding='utf8')
+    (project / 'sub' / 'prog.glorp').write_text('use util\n\nfn Main() {\n    out(util.greet())\n}\n', encoding='utf8')
+    result = subprocess.run([sys.executable, os.path.join(SRC, 'glorp_client.py'), 'run', 'sub/prog.glorp'],
+                            cwd=project, env=server, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    # The server preloads rio, whose exit hook may write a show-cursor escape after the output
+    assert result.stdout.startswith("hello from util")